@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import auth, dataset, evaluate, model, watermark, system
+from . import auth, dataset, evaluate, metrics, model, watermark, system
 
 api_router = APIRouter()
 
@@ -39,3 +39,8 @@ api_router.include_router(
 	prefix="/model",
 	tags=["model"]
 )
+
+api_router.include_router(
+	metrics.router,
+	tags=["metrics"]
+)
@@ -1,18 +1,34 @@
+import json
 import os
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from datasets import Dataset as HFDataset
 from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, UploadFile
+from pydantic import BaseModel, Field
 
-from app.core import tasks
-from app.dataset.dataset import import_hf_dataset, process_uploaded_dataset
+from app.core import cfg, tasks
+from app.dataset.dataset import (
+	import_hf_dataset, process_uploaded_dataset, shard_checkpoint_dir, watermark_dataset
+)
 from app.dbModels.dataset import Dataset, DatasetPydantic
+from app.watermarks import watermark_pool
 
 router = APIRouter()
 
 
+class WatermarkDatasetRequest(BaseModel):
+	algorithm: str
+	params: Dict[str, Any] = {}
+	prompt_column: str = "text"
+	output_column: str = "watermarked_text"
+	name: Optional[str] = None  # 新数据集名称，默认为"源数据集名称_watermarked"
+	description: Optional[str] = None
+	shard_size: Optional[int] = Field(default=None, gt=0)  # 每个检查点分片的行数，默认为WATERMARK_SHARD_SIZE
+
+
+@tasks.instrumented("upload_dataset")
 async def process_upload_dataset_task(task_id: str):
 	with tasks.task_lock:
 		task = tasks.tasks.get(task_id)
@@ -55,6 +71,7 @@ async def process_upload_dataset_task(task_id: str):
 			)
 
 
+@tasks.instrumented("import_dataset")
 async def process_import_from_hf_task(task_id: str):
 	with tasks.task_lock:
 		task = tasks.tasks.get(task_id)
@@ -98,6 +115,163 @@ async def process_import_from_hf_task(task_id: str):
 			)
 
 
+@tasks.instrumented("watermark_dataset")
+async def process_watermark_dataset_task(task_id: str):
+	with tasks.task_lock:
+		task = tasks.tasks.get(task_id)
+		if not task:
+			return
+		task["status"] = tasks.TaskStatus.PROCESSING
+	
+	request_data = task["request"]
+	try:
+		source = await Dataset.get(id=request_data["source_dataset_id"])
+		dataset = await Dataset.get(id=request_data["dataset_id"])
+		watermark = watermark_pool.get(request_data["algorithm"], **request_data["params"])
+		
+		def update_progress(completed: int, total: int):
+			with tasks.task_lock:
+				tasks.tasks[task_id]["progress"] = {"completed": completed, "total": total}
+		
+		# 分片生成，每个分片保存检查点
+		hf_dataset = await watermark_dataset(
+			source.storage_path,
+			dataset.storage_path,
+			request_data["prompt_column"],
+			request_data["output_column"],
+			watermark,
+			request_data["shard_size"],
+			update_progress
+		)
+		
+		# 更新数据集信息
+		features = {k: str(v) for k, v in hf_dataset.features.items()}
+		await dataset.update_from_dict(
+			{
+				"features": features,
+				"num_rows": len(hf_dataset),
+				"status": "completed"
+			}
+		)
+		await dataset.save()
+		
+		with tasks.task_lock:
+			tasks.tasks[task_id].update(
+				{
+					"status": tasks.TaskStatus.COMPLETED,
+					"result": {
+						"message": "Dataset watermarked",
+						"dataset_id": request_data["dataset_id"],
+						"num_rows": len(hf_dataset)
+					},
+					"completed_at": datetime.now()
+				}
+			)
+	
+	except Exception as e:
+		# 已完成的分片保留在检查点目录中，可通过resume接口继续
+		await Dataset.filter(id=request_data["dataset_id"]).update(status="failed")
+		error_msg = f"Dataset watermarking failed: {str(e)}"
+		with tasks.task_lock:
+			tasks.tasks[task_id].update(
+				{
+					"status": tasks.TaskStatus.FAILED,
+					"error": error_msg,
+					"completed_at": datetime.now()
+				}
+			)
+
+
+def _start_watermark_dataset_task(background_tasks: BackgroundTasks, job: Dict[str, Any]) -> Dict[str, Any]:
+	"""登记并在后台启动批量水印任务"""
+	task_id = str(uuid.uuid4())
+	created_at = datetime.now()
+	
+	with tasks.task_lock:
+		tasks.tasks[task_id] = {
+			"status": tasks.TaskStatus.PENDING,
+			"created_at": created_at,
+			"request": job,
+			"result": None,
+			"progress": None,
+			"error": None,
+			"completed_at": None
+		}
+	
+	background_tasks.add_task(process_watermark_dataset_task, task_id)
+	
+	return {
+		"task_id": task_id,
+		"status": tasks.TaskStatus.PENDING,
+		"created_at": created_at
+	}
+
+
+@router.post("/datasets/{dataset_id}/watermark", response_model=tasks.TaskResponse)
+async def watermark_stored_dataset(
+	dataset_id: uuid.UUID,
+	request: WatermarkDatasetRequest,
+	background_tasks: BackgroundTasks
+):
+	"""
+	为已存储的数据集批量嵌入水印，结果保存为追加了水印文本列的新数据集
+	"""
+	source = await Dataset.get_or_none(id=dataset_id)
+	if not source:
+		raise HTTPException(status_code=404, detail="Dataset not found")
+	if source.status != "completed":
+		raise HTTPException(status_code=400, detail=f"Dataset is {source.status}, not ready for watermarking")
+	
+	# 创建新数据集记录
+	new_dataset_id = uuid.uuid4()
+	await Dataset.create(
+		id=new_dataset_id,
+		name=request.name or f"{source.name}_watermarked",
+		description=request.description,
+		source="watermarked",
+		storage_path=f"datasets/{new_dataset_id}",
+		status="processing"
+	)
+	
+	job = {
+		"source_dataset_id": str(dataset_id),
+		"dataset_id": str(new_dataset_id),
+		"algorithm": request.algorithm,
+		"params": request.params,
+		"prompt_column": request.prompt_column,
+		"output_column": request.output_column,
+		"shard_size": request.shard_size or cfg.WATERMARK_SHARD_SIZE
+	}
+	# 保存任务参数，中断后可据此继续
+	checkpoint_dir = shard_checkpoint_dir(f"datasets/{new_dataset_id}")
+	os.makedirs(checkpoint_dir, exist_ok=True)
+	with open(os.path.join(checkpoint_dir, "job.json"), "w") as f:
+		json.dump(job, f)
+	
+	return _start_watermark_dataset_task(background_tasks, job)
+
+
+@router.post("/datasets/{dataset_id}/watermark/resume", response_model=tasks.TaskResponse)
+async def resume_watermark_dataset(dataset_id: uuid.UUID, background_tasks: BackgroundTasks):
+	"""
+	继续被中断的批量水印任务（dataset_id为新数据集），跳过已完成的分片
+	"""
+	dataset = await Dataset.get_or_none(id=dataset_id)
+	if not dataset:
+		raise HTTPException(status_code=404, detail="Dataset not found")
+	
+	job_path = os.path.join(shard_checkpoint_dir(dataset.storage_path), "job.json")
+	if dataset.status == "completed" or not os.path.exists(job_path):
+		raise HTTPException(status_code=400, detail="No interrupted watermarking job for this dataset")
+	with open(job_path) as f:
+		job = json.load(f)
+	
+	dataset.status = "processing"
+	await dataset.save()
+	
+	return _start_watermark_dataset_task(background_tasks, job)
+
+
 @router.post("/datasets/upload", response_model=tasks.TaskResponse)
 async def upload_dataset(
 	background_tasks: BackgroundTasks,
@@ -286,6 +460,11 @@ async def delete_dataset(dataset_id: uuid.UUID):
 	if os.path.exists(dataset.storage_path):
 		import shutil
 		shutil.rmtree(dataset.storage_path)
+	# 删除未完成的批量水印任务的分片检查点
+	checkpoint_dir = shard_checkpoint_dir(dataset.storage_path)
+	if os.path.exists(checkpoint_dir):
+		import shutil
+		shutil.rmtree(checkpoint_dir)
 	
 	# 删除数据库记录
 	await dataset.delete()
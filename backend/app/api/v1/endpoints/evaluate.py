@@ -1,18 +1,23 @@
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
+import numpy as np
 from datasets import load_from_disk
-from fastapi import APIRouter, BackgroundTasks
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, confloat
 
 from app.core import tasks
+from app.core.artifacts import artifact_path, read_artifact_columns
 from app.dbModels import Dataset
-from app.evaluation.attacker import ATTACKERS, get_attacker
+from app.core.Configurable import thaw_config
+from app.evaluation.attacker import ATTACKER_METADATA, get_attacker
+from app.evaluation.calibration import calibrate
 from app.evaluation.detectability import evaluation_detectability
 from app.evaluation.quality import evaluation_quality
 from app.evaluation.robustness import evaluation_robustness
-from app.watermarks import get_watermark_algorithm
+from app.watermarks import watermark_pool
 
 router = APIRouter()
 
@@ -26,6 +31,14 @@ class EvaluationRequest(BaseModel):
 	dataset_id: str
 
 
+class CalibrationRequest(BaseModel):
+	task_id: str  # 可检测性评估任务，或keep_quantiles=True的批量检测任务
+	gammas: List[confloat(gt=0, lt=1)]
+	z_thresholds: List[float] = []
+	target_fprs: List[confloat(ge=0, le=1)] = [0.01, 0.05]
+	labels: Optional[List[bool]] = None  # 批量检测任务的标签（是否含水印），按结果行的index对应
+
+
 class EvaluationResponse(BaseModel):
 	metrics: List[Any]
 
@@ -36,6 +49,50 @@ class AttackResponse(BaseModel):
 	details: Dict[str, Any]
 
 
+def _quantile_artifact_path(task_id: str) -> str:
+	"""可检测性评估保存逐token分位数的Parquet文件路径"""
+	return artifact_path(f"{task_id}-quantiles", "parquet")
+
+
+def _load_calibration_data(request: CalibrationRequest) -> Tuple[List[np.ndarray], List[bool]]:
+	"""从任务的结果文件中读取逐token分位数与标签"""
+	with tasks.task_lock:
+		task = tasks.tasks.get(request.task_id)
+		if task is None:
+			raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+		result = task["result"] if task["status"] == tasks.TaskStatus.COMPLETED else None
+		task_request = task["request"]
+	if result is None:
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Task has not completed")
+	
+	if "metrics" in result:
+		# 可检测性评估：结果文件自带标签
+		if not any(metric["type"] == "detectability" and metric["content"].get("quantile_artifact")
+				   for metric in result["metrics"]):
+			raise HTTPException(
+				status_code=status.HTTP_400_BAD_REQUEST,
+				detail="Evaluation task has no per-token quantiles"
+			)
+		columns = read_artifact_columns(_quantile_artifact_path(request.task_id), "parquet", ["quantiles", "label"])
+		labels = columns["label"]
+	elif task_request.get("keep_quantiles"):
+		# 批量检测：标签由请求提供
+		columns = read_artifact_columns(result["artifact_path"], result["format"], ["quantiles", "index"])
+		if request.labels is None or len(request.labels) != len(columns["index"]):
+			raise HTTPException(
+				status_code=status.HTTP_400_BAD_REQUEST,
+				detail="Labels are required for every text of a bulk detection task"
+			)
+		labels = [request.labels[index] for index in columns["index"]]
+	else:
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail="Task has no per-token quantiles"
+		)
+	return [np.asarray(quantiles, dtype=np.float32) for quantiles in columns["quantiles"]], labels
+
+
+@tasks.instrumented("evaluate")
 async def process_evaluate_watermark_task(task_id: str):
 	with tasks.task_lock:
 		task = tasks.tasks.get(task_id)
@@ -49,7 +106,7 @@ async def process_evaluate_watermark_task(task_id: str):
 		metrics_results = []
 		dataset_record = await Dataset.get(id=request_data["dataset_id"])
 		dataset = load_from_disk(dataset_record.storage_path)
-		watermark = get_watermark_algorithm(
+		watermark = watermark_pool.get(
 			request_data["algorithm"],
 			**request_data["watermark_params"]
 		)
@@ -86,6 +143,7 @@ async def process_evaluate_watermark_task(task_id: str):
 					 "content": evaluation_detectability(
 						 watermark=watermark,
 						 dataset=dataset,
+						 quantile_artifact=_quantile_artifact_path(task_id),
 					 )
 					 }
 				)
@@ -141,19 +199,25 @@ async def evaluate_watermark(
 	}
 
 
+@router.post("/calibrate")
+async def calibrate_thresholds(request: CalibrationRequest) -> Any:
+	"""
+	在已保存的逐token分位数上扫描gamma与z_threshold，返回ROC/AUC、固定FPR下的TPR与最佳阈值，
+	不重新生成、不重新哈希
+	"""
+	quantiles, labels = await run_in_threadpool(_load_calibration_data, request)
+	try:
+		return await run_in_threadpool(
+			calibrate, quantiles, labels, request.gammas, request.z_thresholds, request.target_fprs
+		)
+	except ValueError as e:
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.post("/attackers")
 async def list_attackers() -> Any:
     """
     获取所有支持的攻击算法
     """
-    attackers_results = []
-    for name, attacker_class in ATTACKERS.items():
-        attacker = attacker_class()
-        attackers_results.append(
-            {
-                "name": name,
-                "description": attacker.__doc__ or "No description available",
-                "params":  attacker.to_config()
-            }
-        )
-    return attackers_results
+    # 元数据在导入时预先计算，不实例化攻击器
+    return [thaw_config(metadata) for metadata in ATTACKER_METADATA.values()]
@@ -0,0 +1,56 @@
+from collections import Counter
+from typing import Dict, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core import tasks
+from app.core.metrics import registry
+from app.models.llm import llm_service
+from app.watermarks import detection_cache, detection_sessions, dip_cache_stats, watermark_pool
+
+router = APIRouter()
+
+
+def _task_store_size() -> Dict[Tuple[str, ...], float]:
+	"""内存任务存储中各状态的任务数"""
+	with tasks.task_lock:
+		counts = Counter(task["status"] for task in tasks.tasks.values())
+	return {(status.value,): counts.get(status, 0) for status in tasks.TaskStatus}
+
+
+def _cache_hit_rates() -> Dict[Tuple[str, ...], float]:
+	detection_stats = detection_cache.stats()
+	pool_stats = watermark_pool.stats()
+	pool_lookups = pool_stats["hits"] + pool_stats["misses"]
+	# DiP的种子与置换缓存由进程内所有实例共享，无需按实例汇总
+	dip_stats = dip_cache_stats()
+	return {
+		("detection",): detection_stats["hit_rate"],
+		("detection_memory",): detection_stats["memory"]["hit_rate"],
+		("watermark_pool",): pool_stats["hits"] / pool_lookups if pool_lookups else 0.0,
+		("dip_seed",): dip_stats["seed"]["hit_rate"],
+		("dip_permutation",): dip_stats["permutation"]["hit_rate"]
+	}
+
+
+# 采集时才读取的仪表：任务存储、缓存命中率、会话与调度队列
+registry.gauge("watermark_task_store_size", "Tasks held in the in-memory task store", ("status",), _task_store_size)
+registry.gauge("watermark_cache_hit_rate", "Hit rate of the result caches, the watermark pool and the DiP seed/permutation caches", ("cache",), _cache_hit_rates)
+registry.gauge(
+	"watermark_detection_sessions", "Open incremental detection sessions", (),
+	lambda: {(): detection_sessions.stats()["sessions"]}
+)
+registry.gauge(
+	"watermark_generation_queue_size", "Generation requests waiting in the scheduler", (),
+	lambda: {(): llm_service.scheduler.pending()}
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+	"""
+	以Prometheus文本格式导出进程内指标：任务排队/运行时间与失败次数、生成与检测吞吐量、
+	任务存储大小、缓存命中率与模型加载耗时
+	"""
+	return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
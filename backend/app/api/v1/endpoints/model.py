@@ -33,6 +33,7 @@ async def init_models():
 	llm_service.model = None
 	llm_service.tokenizer = None
 	llm_service.is_active = False
+	llm_service.notify_model_changed()
 
 
 class HuggingfaceModelCreate(BaseModel):
@@ -63,6 +64,7 @@ class TextGenerationRequest(BaseModel):
 	top_p: float = 0.9
 
 
+@tasks.instrumented("create_model")
 async def process_create_model_task(task_id: str):
 	"""执行模型创建的后台任务"""
 	with tasks.task_lock:
@@ -123,6 +125,7 @@ async def process_create_model_task(task_id: str):
 			)
 
 
+@tasks.instrumented("load_model")
 async def process_load_model_task(task_id: str):
 	"""实际执行模型加载的后台任务"""
 	with tasks.task_lock:
@@ -170,6 +173,7 @@ async def process_load_model_task(task_id: str):
 			)
 
 
+@tasks.instrumented("generate_text")
 async def process_generate_text_task(task_id: str):
 	with tasks.task_lock:
 		task = tasks.tasks.get(task_id)
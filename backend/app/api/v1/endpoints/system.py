@@ -1,10 +1,10 @@
-from typing import Dict, Any
-import psutil
-import torch
-import platform
-from fastapi import APIRouter, Depends
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
 
+from app.core.system_metrics import system_metrics
+from app.watermarks import detection_cache, detection_sessions, dip_cache_stats, watermark_pool
+
 router = APIRouter()
 
 class SystemInfo(BaseModel):
@@ -15,42 +15,27 @@ class SystemInfo(BaseModel):
     gpu_usage: float
     gpu_memory_usage: float
 
-def get_system_info() -> Dict[str, Any]:
-    # 获取系统类型
-    system_type = platform.system()
-    
-    # 获取PyTorch设备信息
-    if torch.cuda.is_available():
-        torch_device = f"CUDA ({torch.cuda.get_device_name(0)})"
-    else:
-        torch_device = "CPU"
-    
-    # 获取CPU使用率
-    cpu_usage = psutil.cpu_percent(interval=1)
-    
-    # 获取内存使用率
-    memory = psutil.virtual_memory()
-    memory_usage = memory.percent
-    
-    # 获取GPU使用率和显存使用率
-    gpu_usage = 0.0
-    gpu_memory_usage = 0.0
-    
-    if torch.cuda.is_available():
-        gpu_usage = torch.cuda.utilization()
-        gpu_memory = torch.cuda.memory_allocated(0) / torch.cuda.max_memory_allocated(0) * 100
-        gpu_memory_usage = float(gpu_memory)
-    
+@router.get("/system/overview", response_model=SystemInfo)
+async def get_system_overview():
+    """获取系统概览信息（后台采样器的最近一次快照）"""
+    return system_metrics.latest()
+
+
+@router.get("/system/metrics/history")
+async def get_system_metrics_history(limit: Optional[int] = Query(None, ge=1)) -> Dict[str, Any]:
+    """获取最近的系统指标快照，按时间顺序排列，用于绘制趋势图"""
     return {
-        "system_type": system_type,
-        "torch_device": torch_device,
-        "cpu_usage": cpu_usage,
-        "memory_usage": memory_usage,
-        "gpu_usage": gpu_usage,
-        "gpu_memory_usage": gpu_memory_usage
+        "interval": system_metrics.interval,
+        "samples": system_metrics.history(limit)
     }
 
-@router.get("/system/overview", response_model=SystemInfo)
-async def get_system_overview():
-    """获取系统概览信息"""
-    return get_system_info() 
\ No newline at end of file
+
+@router.get("/system/cache")
+async def get_cache_stats() -> Dict[str, Any]:
+    """获取检测结果缓存、水印实例池、DiP种子/置换缓存与增量检测会话的命中情况"""
+    return {
+        "detection_cache": detection_cache.stats(),
+        "watermark_pool": watermark_pool.stats(),
+        "dip": dip_cache_stats(),
+        "detection_sessions": detection_sessions.stats()
+    }
@@ -1,16 +1,30 @@
+import asyncio
+import json
 import logging
 from datetime import datetime
-from typing import Any, Dict, List
-from uuid import uuid4
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from datasets import load_from_disk
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from transformers import StoppingCriteriaList, TextIteratorStreamer
 
 from ..deps import get_auth_user
-from app.core import tasks
+from app.core import cfg, tasks
+from app.core.artifacts import ARTIFACT_FORMATS, artifact_path, ResultArtifactWriter
+from app.core.profiling import run_profiled
+from app.core.Configurable import thaw_config
+from app.dbModels import Dataset
 from app.dbModels.user import User
-from app.watermarks import get_watermark_algorithm, LogitsWatermark, WATERMARK_ALGORITHMS
+from app.models.detection_pool import detection_executor, to_detection_result
+from app.models.llm import CancellationCriteria, llm_service
+from app.watermarks import (
+	detection_cache, detection_cache_key, detection_sessions, LogitsWatermark, WATERMARK_METADATA,
+	watermark_pool
+)
 
 router = APIRouter()
 
@@ -19,6 +33,14 @@ class WatermarkRequest(BaseModel):
 	text: str
 	algorithm: str
 	params: Dict[str, Any] = {}
+	# 性能分析模式: "timing"（分阶段计时）、"torch"（另写torch.profiler trace）、"cprofile"（另写cProfile统计）
+	profile: Optional[str] = None
+
+
+class BatchWatermarkRequest(BaseModel):
+	texts: List[str]
+	algorithm: str
+	params: Dict[str, Any] = {}
 
 
 class WatermarkResponse(BaseModel):
@@ -37,6 +59,35 @@ class DetectionResponse(BaseModel):
 	confidence: float
 
 
+class BulkDetectionRequest(BaseModel):
+	algorithm: str
+	params: Dict[str, Any] = {}
+	texts: Optional[List[str]] = None  # 直接提交的文本列表
+	dataset_id: Optional[UUID] = None  # 或已上传数据集的ID
+	column: str = "text"  # 数据集中待检测文本所在的列
+	output_format: str = "jsonl"  # 结果文件格式: "jsonl" 或 "parquet"
+	keep_quantiles: bool = False  # 是否在结果文件中保留逐token分位数，供/evaluate/calibrate使用
+
+
+class DetectionSessionRequest(BaseModel):
+	algorithm: str
+	params: Dict[str, Any] = {}
+	text: str = ""
+
+
+class DetectionSessionUpdate(BaseModel):
+	text: str
+
+
+class DetectionSessionResponse(BaseModel):
+	session_id: str
+	detected: bool
+	confidence: float
+	num_tokens: int
+	reused_tokens: int
+	scored_tokens: int
+
+
 class AlgorithmInfo(BaseModel):
 	name: str
 	description: str
@@ -44,6 +95,7 @@ class AlgorithmInfo(BaseModel):
 	params: Dict[str, Any]
 
 
+@tasks.instrumented("embed")
 async def process_embed_watermark_task(task_id: str):
 	with tasks.task_lock:
 		task = tasks.tasks.get(task_id)
@@ -53,11 +105,19 @@ async def process_embed_watermark_task(task_id: str):
 	
 	try:
 		request = WatermarkRequest(**task["request"])
-		watermark = get_watermark_algorithm(request.algorithm, **request.params)
+		watermark = watermark_pool.get(request.algorithm, **request.params)
 		
-		# 使用线程池处理CPU密集型操作
-		if isinstance(watermark, LogitsWatermark):
-			watermarked_text = await run_in_threadpool(watermark.embed, request.text)
+		if request.profile and isinstance(watermark, LogitsWatermark):
+			# 性能分析的请求单独生成，不与其他请求合批，分阶段耗时附在结果元数据中
+			watermarked_text, profile = await run_in_threadpool(
+				run_profiled, request.profile, task_id, watermark.embed_profiled, request.text
+			)
+			metadata = {"type": "logits", "profile": profile}
+		# 交给生成调度器，与相同水印配置的并发请求合并为一次批量生成
+		elif isinstance(watermark, LogitsWatermark):
+			watermarked_text = await asyncio.wrap_future(
+				llm_service.scheduler.submit(watermark, watermark.embed_batch, request.text)
+			)
 			metadata = {"type": "logits"}
 		else:
 			watermarked_text = ""  # 语义水印实现
@@ -86,6 +146,59 @@ async def process_embed_watermark_task(task_id: str):
 			)
 
 
+@tasks.instrumented("embed_batch")
+async def process_embed_batch_watermark_task(task_id: str):
+	with tasks.task_lock:
+		task = tasks.tasks.get(task_id)
+		if not task:
+			return
+		task["status"] = tasks.TaskStatus.PROCESSING
+	
+	try:
+		request = BatchWatermarkRequest(**task["request"])
+		watermark = watermark_pool.get(request.algorithm, **request.params)
+		
+		# 一次任务内按token预算分批生成
+		if isinstance(watermark, LogitsWatermark):
+			watermarked_texts = await run_in_threadpool(watermark.embed_batch, request.texts)
+			metadata = {"type": "logits", "count": len(watermarked_texts)}
+		else:
+			watermarked_texts = []  # 语义水印实现
+			metadata = dict()
+		
+		with tasks.task_lock:
+			tasks.tasks[task_id].update(
+				{
+					"status": tasks.TaskStatus.COMPLETED,
+					"result": {
+						"watermarked_texts": watermarked_texts,
+						"metadata": metadata
+					},
+					"completed_at": datetime.now()
+				}
+			)
+	
+	except Exception as e:
+		with tasks.task_lock:
+			tasks.tasks[task_id].update(
+				{
+					"status": tasks.TaskStatus.FAILED,
+					"error": str(e),
+					"completed_at": datetime.now()
+				}
+			)
+
+
+def _use_detection_executor(watermark) -> bool:
+	"""只需分词器即可检测的logits水印交给无模型检测进程池"""
+	return (
+		detection_executor.enabled
+		and isinstance(watermark, LogitsWatermark)
+		and not watermark.detection_requires_model
+	)
+
+
+@tasks.instrumented("detect")
 async def process_detect_watermark_task(task_id: str):
 	with tasks.task_lock:
 		task = tasks.tasks.get(task_id)
@@ -102,32 +215,173 @@ async def process_detect_watermark_task(task_id: str):
 			params=request_data["params"]
 		)
 		
-		# 执行检测逻辑
-		watermark = get_watermark_algorithm(
+		# 相同文本与配置的检测结果直接从缓存读取
+		cache_key = detection_cache_key(
+			"detect",
+			detection_request.text,
 			detection_request.algorithm,
-			**detection_request.params
+			detection_request.params
 		)
+		result = detection_cache.get(cache_key) if cache_key else None
+		
+		if result is None:
+			# 执行检测逻辑
+			watermark = watermark_pool.get(
+				detection_request.algorithm,
+				**detection_request.params
+			)
+			if _use_detection_executor(watermark):
+				# logits水印的检测只需分词器和密钥，交给无模型检测进程池
+				detection_result = await asyncio.wrap_future(
+					detection_executor.submit(
+						detection_request.algorithm,
+						detection_request.params,
+						detection_request.text
+					)
+				)
+			else:
+				# 使用线程池处理同步方法
+				detection_result = await run_in_threadpool(
+					watermark.detect,
+					detection_request.text
+				)
+			result = to_detection_result(detection_result)
+			if cache_key:
+				detection_cache.put(cache_key, result)
 		
-		# 使用线程池处理同步方法
-		detection_result = await run_in_threadpool(
-			watermark.detect,
-			detection_request.text
+		with tasks.task_lock:
+			tasks.tasks[task_id].update(
+				{
+					"status": tasks.TaskStatus.COMPLETED,
+					"result": result,
+					"completed_at": datetime.now()
+				}
+			)
+	
+	except Exception as e:
+		error_msg = f"Detection failed: {str(e)}"
+		logging.error(error_msg)
+		with tasks.task_lock:
+			tasks.tasks[task_id].update(
+				{
+					"status": tasks.TaskStatus.FAILED,
+					"error": error_msg,
+					"completed_at": datetime.now()
+				}
+			)
+
+
+async def _load_bulk_detection_texts(request: BulkDetectionRequest) -> Tuple[int, Iterator[List[str]]]:
+	"""返回待检测文本总数与按BULK_DETECTION_CHUNK_SIZE分块的文本迭代器"""
+	chunk_size = cfg.BULK_DETECTION_CHUNK_SIZE
+	if request.texts is not None:
+		texts = request.texts
+		return len(texts), (texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size))
+	
+	# 数据集可能在排队期间被删除，执行时再检查一次
+	dataset_record = await Dataset.get_or_none(id=request.dataset_id)
+	if dataset_record is None or dataset_record.status != "completed":
+		raise ValueError(f"Dataset {request.dataset_id} is not available for detection")
+	dataset = await run_in_threadpool(load_from_disk, dataset_record.storage_path)
+	if request.column not in dataset.column_names:
+		raise ValueError(f"Column {request.column} not found in dataset")
+	# 按块从Arrow文件中读取，不把整列载入内存
+	column = dataset.select_columns([request.column])
+	return len(column), (batch[request.column] for batch in column.iter(batch_size=chunk_size))
+
+
+async def _detect_bulk_chunk(request: BulkDetectionRequest, texts: List[str]) -> List[Dict[str, Any]]:
+	"""检测一块文本，logits水印交给检测进程池，否则在线程池中执行"""
+	watermark = watermark_pool.get(request.algorithm, **request.params)
+	if _use_detection_executor(watermark):
+		results = await asyncio.wrap_future(
+			detection_executor.submit_batch(request.algorithm, request.params, texts, request.keep_quantiles)
 		)
+	else:
+		kwargs = {"keep_quantiles": True} if request.keep_quantiles else {}
+		results = await run_in_threadpool(watermark.detect_batch, texts, **kwargs)
+	return results
+
+
+@tasks.instrumented("bulk_detect")
+async def process_bulk_detect_watermark_task(task_id: str):
+	with tasks.task_lock:
+		task = tasks.tasks.get(task_id)
+		if not task:
+			return
+		task["status"] = tasks.TaskStatus.PROCESSING
+	
+	try:
+		request = BulkDetectionRequest(**task["request"])
+		if request.keep_quantiles and not watermark_pool.get(request.algorithm, **request.params).provides_token_quantiles:
+			raise ValueError(f"Algorithm {request.algorithm} does not provide per-token quantiles")
+		total, chunks = await _load_bulk_detection_texts(request)
+		with tasks.task_lock:
+			tasks.tasks[task_id]["progress"] = {"completed": 0, "total": total}
+		
+		path = artifact_path(task_id, request.output_format)
+		# 同时进行中的子任务数，限制内存中待写出的结果
+		max_in_flight = max(2 * cfg.DETECTION_WORKERS, 2)
+		pending: Dict[asyncio.Future, int] = {}
+		finished: Dict[int, List[Dict[str, Any]]] = {}
+		chunk_offsets: Dict[int, int] = {}
+		next_chunk, completed, detected_count = 0, 0, 0
+		
+		with ResultArtifactWriter(path, request.output_format) as writer:
+			async def drain(return_when):
+				nonlocal next_chunk, completed, detected_count
+				done, _ = await asyncio.wait(pending, return_when=return_when)
+				for future in done:
+					finished[pending.pop(future)] = future.result()
+				# 按原始顺序写出已完成的连续块
+				while next_chunk in finished:
+					rows = [
+						{
+							"index": chunk_offsets[next_chunk] + i,
+							"detected": bool(result["detected"]),
+							"confidence": float(result["confidence"]),
+							"num_tokens": int(result.get("num_tokens", 0)),
+							**({"quantiles": [float(q) for q in result["quantiles"]]} if request.keep_quantiles else {})
+						}
+						for i, result in enumerate(finished.pop(next_chunk))
+					]
+					writer.write_rows(rows)
+					completed += len(rows)
+					detected_count += sum(row["detected"] for row in rows)
+					next_chunk += 1
+				with tasks.task_lock:
+					tasks.tasks[task_id]["progress"] = {"completed": completed, "total": total}
+			
+			try:
+				offset = 0
+				for chunk_index, texts in enumerate(chunks):
+					chunk_offsets[chunk_index] = offset
+					offset += len(texts)
+					pending[asyncio.ensure_future(_detect_bulk_chunk(request, texts))] = chunk_index
+					if len(pending) >= max_in_flight:
+						await drain(asyncio.FIRST_COMPLETED)
+				while pending:
+					await drain(asyncio.FIRST_COMPLETED)
+			finally:
+				for future in pending:
+					future.cancel()
 		
 		with tasks.task_lock:
 			tasks.tasks[task_id].update(
 				{
 					"status": tasks.TaskStatus.COMPLETED,
 					"result": {
-						"detected": detection_result["detected"],
-						"confidence": detection_result["confidence"]
+						"artifact_path": path,
+						"format": request.output_format,
+						"count": completed,
+						"detected_count": detected_count
 					},
 					"completed_at": datetime.now()
 				}
 			)
 	
 	except Exception as e:
-		error_msg = f"Detection failed: {str(e)}"
+		error_msg = f"Bulk detection failed: {str(e)}"
 		logging.error(error_msg)
 		with tasks.task_lock:
 			tasks.tasks[task_id].update(
@@ -144,19 +398,8 @@ async def list_algorithms() -> Any:
 	"""
 	获取所有支持的水印算法
 	"""
-	# 水印列表
-	algorithms = []
-	for name, algo_class in WATERMARK_ALGORITHMS.items():
-		algo = algo_class() # 遍历水印包获取水印算法
-		algorithms.append(
-			{
-				"name": name,
-				"description": algo.__doc__ or "No description available",
-				"type": "logits" if hasattr(algo,"get_processor") else "semantic",
-				"params":algo.to_config()
-			}
-		)
-	return algorithms
+	# 元数据在导入时预先计算，不实例化算法
+	return [thaw_config(metadata) for metadata in WATERMARK_METADATA.values()]
 
 
 @router.post("/embed", response_model=tasks.TaskResponse)
@@ -186,6 +429,108 @@ async def embed_watermark(
 	}
 
 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+	"""格式化一条Server-Sent Events消息"""
+	return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/embed/stream")
+async def embed_watermark_stream(request: WatermarkRequest, http_request: Request) -> Any:
+	"""
+	流式嵌入水印：通过Server-Sent Events逐段推送生成的水印文本，
+	结束时推送完整文本与检测结果；客户端断开后停止生成
+	"""
+	try:
+		watermark = watermark_pool.get(request.algorithm, **request.params)
+	except (ValueError, TypeError) as e:
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+	if not isinstance(watermark, LogitsWatermark):
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail="Streaming is only supported for logits watermarks"
+		)
+	if llm_service.tokenizer is None:
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail="Model not loaded"
+		)
+	
+	async def event_stream():
+		streamer = TextIteratorStreamer(llm_service.tokenizer, skip_prompt=True, skip_special_tokens=True)
+		cancellation = CancellationCriteria()
+		# 生成在线程池中进行，token经由streamer回传
+		embed_task = asyncio.ensure_future(
+			run_in_threadpool(watermark.embed, request.text, streamer, StoppingCriteriaList([cancellation]))
+		)
+		# 生成失败时结束流，避免一直等待下一个token
+		embed_task.add_done_callback(
+			lambda task: (task.cancelled() or task.exception() is not None) and streamer.end()
+		)
+		try:
+			while True:
+				chunk = await run_in_threadpool(next, streamer, None)
+				if chunk is None:
+					break
+				if await http_request.is_disconnected():
+					logging.info("Streaming client disconnected, stopping generation")
+					return
+				if chunk:
+					yield _sse_event("token", {"text": chunk})
+			
+			watermarked_text = await embed_task
+			detection_result = await run_in_threadpool(watermark.detect, watermarked_text)
+			yield _sse_event(
+				"done",
+				{
+					"watermarked_text": watermarked_text,
+					"metadata": {"type": "logits"},
+					"detection": {
+						"detected": bool(detection_result["detected"]),
+						"confidence": detection_result["confidence"]
+					}
+				}
+			)
+		except Exception as e:
+			logging.error(f"Streaming embed failed: {str(e)}")
+			yield _sse_event("error", {"error": str(e)})
+		finally:
+			# 客户端断开或流被关闭时生成线程不再有人读取，让generate在下一步结束
+			if not embed_task.done():
+				cancellation.cancel()
+	
+	return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@router.post("/embed/batch", response_model=tasks.TaskResponse)
+async def embed_watermark_batch(
+	request: BatchWatermarkRequest,
+	background_tasks: BackgroundTasks,
+) -> Any:
+	"""
+	批量嵌入水印，多个prompt作为一个任务
+	"""
+	task_id = str(uuid4())
+	created_at = datetime.now()
+	
+	with tasks.task_lock:
+		tasks.tasks[task_id] = {
+			"status": tasks.TaskStatus.PENDING,
+			"created_at": created_at,
+			"request": request.model_dump(),
+			"result": None,
+			"error": None,
+			"completed_at": None
+		}
+	
+	background_tasks.add_task(process_embed_batch_watermark_task, task_id)
+	
+	return {
+		"task_id": task_id,
+		"status": tasks.TaskStatus.PENDING,
+		"created_at": created_at
+	}
+
+
 @router.post("/detect", response_model=tasks.TaskResponse)
 async def detect_watermark(
 	request: DetectionRequest,
@@ -217,20 +562,108 @@ async def detect_watermark(
 	}
 
 
+@router.post("/detect/bulk", response_model=tasks.TaskResponse)
+async def detect_watermark_bulk(
+	request: BulkDetectionRequest,
+	background_tasks: BackgroundTasks,
+	current_user: User = Depends(get_auth_user),
+) -> Any:
+	"""
+	批量检测水印：检测文本列表或数据集的一列，逐行结果写入JSONL/Parquet结果文件，
+	进度记录在任务的progress中
+	"""
+	if (request.texts is None) == (request.dataset_id is None):
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail="Exactly one of texts or dataset_id must be provided"
+		)
+	if request.output_format not in ARTIFACT_FORMATS:
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail=f"Unsupported output format: {request.output_format}"
+		)
+	if request.dataset_id is not None:
+		# 与数据集接口相同的检查：数据集须存在且已处理完成
+		dataset = await Dataset.get_or_none(id=request.dataset_id)
+		if not dataset:
+			raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+		if dataset.status != "completed":
+			raise HTTPException(
+				status_code=status.HTTP_400_BAD_REQUEST,
+				detail=f"Dataset is {dataset.status}, not ready for detection"
+			)
+	
+	task_id = str(uuid4())
+	created_at = datetime.now()
+	
+	with tasks.task_lock:
+		tasks.tasks[task_id] = {
+			"status": tasks.TaskStatus.PENDING,
+			"created_at": created_at,
+			"request": {
+				**request.model_dump(mode="json"),
+				"user_id": current_user.id
+			},
+			"result": None,
+			"progress": None,
+			"error": None,
+			"completed_at": None
+		}
+	
+	background_tasks.add_task(process_bulk_detect_watermark_task, task_id)
+	
+	return {
+		"task_id": task_id,
+		"status": tasks.TaskStatus.PENDING,
+		"created_at": created_at
+	}
+
+
+@router.get("/detect/bulk/{task_id}/results")
+async def get_bulk_detection_results(
+	task_id: str,
+	current_user: User = Depends(get_auth_user)
+) -> Any:
+	"""
+	下载批量检测的逐行结果文件
+	"""
+	with tasks.task_lock:
+		task = tasks.tasks.get(task_id)
+	if not task or not task["result"] or "artifact_path" not in task["result"]:
+		raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bulk detection results not found")
+	
+	result = task["result"]
+	media_type = "application/x-ndjson" if result["format"] == "jsonl" else "application/vnd.apache.parquet"
+	return FileResponse(
+		result["artifact_path"],
+		media_type=media_type,
+		filename=f"detection_{task_id}.{result['format']}"
+	)
+
+
 @router.post("/visualize")
 async def visualize_watermark(
 	request: DetectionRequest,
 	current_user: User = Depends(get_auth_user)
 ) -> Any:
 	"""
-	可视化水印检测结果
+	可视化水印检测结果，同时返回检测结果（detected、confidence）
 	"""
 	try:
+		cache_key = detection_cache_key("analyze", request.text, request.algorithm, request.params)
+		visualization_data = detection_cache.get(cache_key) if cache_key else None
+		if visualization_data is not None:
+			return visualization_data
+		
 		# 获取水印算法实例
-		watermark = get_watermark_algorithm(request.algorithm, **request.params)
+		watermark = watermark_pool.get(request.algorithm, **request.params)
 		
-		# 生成可视化数据
-		visualization_data = watermark.visualize(request.text)
+		# 一次打分生成检测结果与可视化数据，在线程池中执行以免长文本阻塞事件循环
+		visualization_data = await run_in_threadpool(watermark.analyze, request.text)
+		visualization_data["detected"] = bool(visualization_data["detected"])
+		visualization_data["confidence"] = float(visualization_data["confidence"])
+		if cache_key:
+			detection_cache.put(cache_key, visualization_data)
 		
 		return visualization_data
 	
@@ -239,3 +672,70 @@ async def visualize_watermark(
 			status_code=status.HTTP_400_BAD_REQUEST,
 			detail=str(e)
 		)
+
+
+def _get_detection_session(session_id: str):
+	try:
+		return detection_sessions.get(session_id)
+	except KeyError:
+		raise HTTPException(
+			status_code=status.HTTP_404_NOT_FOUND,
+			detail="Detection session not found or expired"
+		)
+
+
+@router.post("/detect/sessions", response_model=DetectionSessionResponse)
+async def create_detection_session(
+	request: DetectionSessionRequest,
+	current_user: User = Depends(get_auth_user)
+) -> Any:
+	"""
+	创建增量检测会话：保存文本前缀的逐token得分与历史，后续更新只为新增token打分
+	"""
+	try:
+		watermark = watermark_pool.get(request.algorithm, **request.params)
+	except Exception as e:
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+	if not hasattr(watermark, "create_detection_session"):
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail=f"Incremental detection is not supported for {request.algorithm}"
+		)
+	
+	try:
+		session = watermark.create_detection_session()
+	except ValueError as e:
+		raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+	result = await run_in_threadpool(watermark.update_detection_session, session, request.text)
+	session_id = detection_sessions.create(session)
+	return {"session_id": session_id, **result}
+
+
+@router.put("/detect/sessions/{session_id}", response_model=DetectionSessionResponse)
+async def update_detection_session(
+	session_id: str,
+	request: DetectionSessionUpdate,
+	current_user: User = Depends(get_auth_user)
+) -> Any:
+	"""
+	提交会话的最新全文，只重新计算与上次文本最长公共前缀之后的token
+	"""
+	session = _get_detection_session(session_id)
+	result = await run_in_threadpool(session.watermark.update_detection_session, session, request.text)
+	return {"session_id": session_id, **result}
+
+
+@router.delete("/detect/sessions/{session_id}")
+async def delete_detection_session(
+	session_id: str,
+	current_user: User = Depends(get_auth_user)
+) -> Any:
+	"""
+	删除增量检测会话
+	"""
+	if not detection_sessions.delete(session_id):
+		raise HTTPException(
+			status_code=status.HTTP_404_NOT_FOUND,
+			detail="Detection session not found or expired"
+		)
+	return {"session_id": session_id, "deleted": True}
@@ -1,5 +1,6 @@
 import json
-from typing import Any, Dict, List, Optional, Type, TypeVar, Union, get_type_hints
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Type, TypeVar, Union, get_type_hints
 import inspect
 
 T = TypeVar('T')
@@ -11,8 +12,29 @@ class ConfigurableMixin:
     @classmethod
     def get_config_fields(cls) -> List[str]:
         """获取需要包含在配置中的字段"""
-        # 默认情况下，使用所有非私有属性
-        return [attr for attr in dir(cls) if not attr.startswith('_') and not callable(getattr(cls, attr))]
+        # 只收集ConfigField描述符声明的字段，property等只读属性不是构造参数
+        return [
+            attr for attr in dir(cls)
+            if not attr.startswith('_')
+            and isinstance(getattr(cls, attr, None), ConfigField)
+            and getattr(cls, attr).include_in_config
+        ]
+
+    @classmethod
+    def default_config(cls) -> Dict[str, Any]:
+        """从类定义推导默认配置：沿MRO读取__init__参数的默认值，无需实例化"""
+        defaults = {}
+        for klass in cls.__mro__:
+            init = klass.__dict__.get('__init__')
+            if init is None:
+                continue
+            for name, param in inspect.signature(init).parameters.items():
+                if param.default is not inspect.Parameter.empty and name not in defaults:
+                    defaults[name] = param.default
+        return {
+            field: cls._convert_value_to_config(defaults.get(field))
+            for field in cls.get_config_fields()
+        }
 
     def to_config(self) -> Dict[str, Any]:
         """将实例转换为配置字典"""
@@ -23,7 +45,8 @@ class ConfigurableMixin:
                 config[field] = self._convert_value_to_config(value)
         return config
 
-    def _convert_value_to_config(self, value: Any) -> Any:
+    @classmethod
+    def _convert_value_to_config(cls, value: Any) -> Any:
         """将值转换为配置格式"""
         # 处理嵌套的可配置对象
         if isinstance(value, ConfigurableMixin):
@@ -35,12 +58,12 @@ class ConfigurableMixin:
         # 处理列表中的可配置对象或BaseModel
         elif isinstance(value, list):
             return [
-                self._convert_value_to_config(item) for item in value
+                cls._convert_value_to_config(item) for item in value
             ]
         # 处理字典中的可配置对象或BaseModel
         elif isinstance(value, dict):
             return {
-                k: self._convert_value_to_config(v) for k, v in value.items()
+                k: cls._convert_value_to_config(v) for k, v in value.items()
             }
         else:
             # 只包含可JSON序列化的值
@@ -61,6 +84,44 @@ def configurable(cls):
     return cls
 
 
+def freeze_config(value: Any) -> Any:
+    """递归地将配置转换为不可变结构（dict -> MappingProxyType, list -> tuple）"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze_config(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_config(item) for item in value)
+    return value
+
+
+def thaw_config(value: Any) -> Any:
+    """freeze_config的逆操作，返回可供序列化/修改的副本"""
+    if isinstance(value, Mapping):
+        return {k: thaw_config(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw_config(item) for item in value]
+    return value
+
+
+def build_metadata_registry(classes: Mapping[str, type], **extra: Mapping[str, Any]) -> Mapping[str, Mapping[str, Any]]:
+    """
+    为一组可配置类预先计算不可变的元数据（名称、描述、默认参数），不实例化任何类
+    Args:
+        classes: 名称 -> 类
+        **extra: 额外字段，字段名 -> (名称 -> 值)
+    Returns:
+        名称 -> 只读元数据
+    """
+    return MappingProxyType({
+        name: freeze_config({
+            "name": name,
+            "description": cls.__doc__ or "No description available",
+            **{field: values[name] for field, values in extra.items()},
+            "params": cls.default_config(),
+        })
+        for name, cls in classes.items()
+    })
+
+
 # 可以使用配置字段注解来更精确地控制配置
 class ConfigField:
     """用于标记配置字段的描述符"""
@@ -0,0 +1,94 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.config import cfg
+
+# 支持的结果文件格式
+ARTIFACT_FORMATS = ("jsonl", "parquet")
+
+
+def artifact_path(name: str, format: str) -> str:
+	"""返回结果文件在ARTIFACT_DIR下的路径"""
+	os.makedirs(cfg.ARTIFACT_DIR, exist_ok=True)
+	return os.path.join(cfg.ARTIFACT_DIR, f"{name}.{format}")
+
+
+class ResultArtifactWriter:
+	"""
+	逐批写入的行式结果文件，支持JSONL与Parquet
+	结果按批追加写入，不需要在内存中保留全部行
+	"""
+	
+	def __init__(self, path: str, format: str = "jsonl", schema: Optional[pa.Schema] = None):
+		"""
+		Args:
+			path: 结果文件路径
+			format: 结果文件格式
+			schema: Parquet的列类型，为空时按首批结果推断
+		"""
+		if format not in ARTIFACT_FORMATS:
+			raise ValueError(f"Unsupported artifact format: {format}")
+		self.path = path
+		self.format = format
+		self.rows_written = 0
+		self._file = open(path, "w", encoding="utf-8") if format == "jsonl" else None
+		self._parquet_writer = pq.ParquetWriter(path, schema) if format == "parquet" and schema is not None else None
+	
+	def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+		"""追加一批结果行"""
+		if not rows:
+			return
+		if self.format == "jsonl":
+			self._file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+		else:
+			table = pa.Table.from_pylist(rows, schema=self._parquet_writer.schema if self._parquet_writer else None)
+			if self._parquet_writer is None:
+				# 以首批结果的列推断Parquet schema
+				self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+			self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+		self.rows_written += len(rows)
+	
+	def close(self) -> None:
+		if self._file is not None:
+			self._file.close()
+		if self._parquet_writer is not None:
+			self._parquet_writer.close()
+		elif self.format == "parquet" and self.rows_written == 0:
+			# 没有结果行时也写出一个空文件，保证结果文件存在
+			pq.write_table(pa.table({}), self.path)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+def read_artifact_columns(path: str, format: str, columns: List[str]) -> Dict[str, List[Any]]:
+	"""
+	按列读取结果文件
+	Raises:
+		KeyError: 如果结果文件中缺少某一列
+	"""
+	if format not in ARTIFACT_FORMATS:
+		raise ValueError(f"Unsupported artifact format: {format}")
+	if format == "parquet":
+		table = pq.read_table(path)
+		missing = [column for column in columns if column not in table.column_names]
+		if missing:
+			raise KeyError(f"Artifact has no column {missing[0]}")
+		return {column: table.column(column).to_pylist() for column in columns}
+	
+	result = {column: [] for column in columns}
+	with open(path, encoding="utf-8") as file:
+		for line in file:
+			row = json.loads(line)
+			for column in columns:
+				if column not in row:
+					raise KeyError(f"Artifact has no column {column}")
+				result[column].append(row[column])
+	return result
@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+	"""线程安全的LRU缓存，按字节预算淘汰最久未使用的条目"""
+
+	def __init__(self, max_bytes: int, sizeof: Optional[Callable[[Hashable, Any], int]] = None):
+		"""
+		Args:
+			max_bytes: 缓存可占用的字节预算，<=0 时不缓存任何条目
+			sizeof: 估算单个条目(key, value)所占字节数的函数，默认使用sys.getsizeof
+		"""
+		self.max_bytes = max_bytes
+		self.sizeof = sizeof or (lambda key, value: sys.getsizeof(key) + sys.getsizeof(value))
+		self._entries: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+		self._lock = Lock()
+		self.current_bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		"""读取条目并将其标记为最近使用"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return default
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, key: Hashable, value: Any) -> None:
+		"""写入条目，超出字节预算时淘汰最久未使用的条目"""
+		size = self.sizeof(key, value)
+		if size > self.max_bytes:
+			return
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self.current_bytes -= old[1]
+			self._entries[key] = (value, size)
+			self.current_bytes += size
+			while self.current_bytes > self.max_bytes:
+				_, (_, evicted_size) = self._entries.popitem(last=False)
+				self.current_bytes -= evicted_size
+				self.evictions += 1
+
+	def clear(self) -> None:
+		"""清空缓存（保留命中统计）"""
+		with self._lock:
+			self._entries.clear()
+			self.current_bytes = 0
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def stats(self) -> Dict[str, Any]:
+		"""返回命中/未命中计数与容量信息，用于确定缓存大小"""
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": self.hits / lookups if lookups else 0.0,
+				"evictions": self.evictions,
+				"entries": len(self._entries),
+				"bytes": self.current_bytes,
+				"max_bytes": self.max_bytes
+			}
+
+
+class TieredCache:
+	"""
+	两级结果缓存：内存LRU层 + 可选的SQLite磁盘层
+	值须可JSON序列化；磁盘层命中时回填内存层，磁盘层中的结果在重启后仍然可用
+	磁盘写入先缓冲，攒够一批或超过间隔后在一个事务中提交；进程异常退出时最多丢失一批未提交的结果
+	"""
+	
+	def __init__(self, max_bytes: int, db_path: Optional[str] = None, max_entries: int = 0,
+				 ttl_seconds: float = 0, commit_size: int = 64, commit_seconds: float = 1.0):
+		"""
+		Args:
+			max_bytes: 内存层的字节预算
+			db_path: SQLite数据库文件路径，为空时不启用磁盘层
+			max_entries: 磁盘层最多保留的条目数，超出时淘汰最早写入的条目，<=0 时不限制
+			ttl_seconds: 磁盘层条目的存活时间（秒），过期条目不再命中并在提交时删除，<=0 时不过期
+			commit_size: 缓冲的写入达到该条数时提交
+			commit_seconds: 距上次提交超过该时间（秒）后，下一次写入时提交
+		"""
+		self.memory = LRUCache(max_bytes, lambda key, value: len(key) + len(value))
+		self.db_path = db_path or None
+		self.max_entries = max_entries
+		self.ttl_seconds = ttl_seconds
+		self.commit_size = commit_size
+		self.commit_seconds = commit_seconds
+		self._db = None
+		self._db_lock = Lock()
+		# 尚未写入磁盘层的条目：key -> (value, created_at)
+		self._pending: Dict[str, tuple] = {}
+		self._last_commit = time.monotonic()
+		self.disk_hits = 0
+		self.disk_misses = 0
+		self.disk_evictions = 0
+		if self.db_path:
+			os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+			self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+			self._db.execute(
+				"CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+			)
+			self._db.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+			self._db.commit()
+	
+	def get(self, key: str, default: Any = None) -> Any:
+		"""依次查询内存层与磁盘层"""
+		# 内存层保存序列化后的字符串，避免调用方修改缓存中的结果
+		value = self.memory.get(key)
+		if value is None and self._db is not None:
+			with self._db_lock:
+				if key in self._pending:
+					row = self._pending[key][:1]
+				else:
+					row = self._db.execute(
+						"SELECT value FROM results WHERE key = ? AND created_at >= ?", (key, self._expiry())
+					).fetchone()
+				if row is None:
+					self.disk_misses += 1
+				else:
+					self.disk_hits += 1
+			if row is not None:
+				value = row[0]
+				self.memory.put(key, value)
+		return default if value is None else json.loads(value)
+	
+	def put(self, key: str, value: Any) -> None:
+		"""写入内存层，并缓冲到磁盘层的下一次提交"""
+		serialized = json.dumps(value)
+		self.memory.put(key, serialized)
+		if self._db is not None:
+			with self._db_lock:
+				self._pending[key] = (serialized, time.time())
+				if len(self._pending) >= self.commit_size or time.monotonic() - self._last_commit >= self.commit_seconds:
+					self._commit()
+	
+	def flush(self) -> None:
+		"""立即提交所有缓冲的写入（如在进程退出前）"""
+		if self._db is not None:
+			with self._db_lock:
+				self._commit()
+	
+	def _commit(self) -> None:
+		"""在一个事务中写入缓冲的条目并淘汰过期与超额的条目，调用方须持有_db_lock"""
+		self._db.executemany(
+			"INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+			[(key, value, created_at) for key, (value, created_at) in self._pending.items()]
+		)
+		self._pending.clear()
+		evicted = 0
+		if self.ttl_seconds > 0:
+			evicted += self._db.execute("DELETE FROM results WHERE created_at < ?", (self._expiry(),)).rowcount
+		if self.max_entries > 0:
+			evicted += self._db.execute(
+				"DELETE FROM results WHERE key IN "
+				"(SELECT key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+				(self.max_entries,)
+			).rowcount
+		self._db.commit()
+		self.disk_evictions += evicted
+		self._last_commit = time.monotonic()
+	
+	def _expiry(self) -> float:
+		"""早于该时间写入的磁盘层条目已过期"""
+		return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else float("-inf")
+	
+	def clear(self) -> None:
+		"""清空两级缓存"""
+		self.memory.clear()
+		if self._db is not None:
+			with self._db_lock:
+				self._pending.clear()
+				self._db.execute("DELETE FROM results")
+				self._db.commit()
+	
+	def stats(self) -> Dict[str, Any]:
+		"""返回各层命中情况"""
+		memory_stats = self.memory.stats()
+		lookups = memory_stats["hits"] + memory_stats["misses"]
+		with self._db_lock:
+			disk_stats = {
+				"enabled": self._db is not None,
+				"path": self.db_path,
+				"hits": self.disk_hits,
+				"misses": self.disk_misses,
+				"evictions": self.disk_evictions,
+				"entries": self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0] if self._db else 0,
+				"pending": len(self._pending),
+				"max_entries": self.max_entries,
+				"ttl_seconds": self.ttl_seconds
+			}
+		return {
+			"memory": memory_stats,
+			"disk": disk_stats,
+			# 任一层命中即视为命中
+			"hit_rate": (memory_stats["hits"] + self.disk_hits) / lookups if lookups else 0.0
+		}
@@ -27,9 +27,46 @@ class Settings(BaseSettings):
 	SQL_PASSWORD: SecretStr
 	SQL_DBNAME: str
 	UPLOAD_DIR: str = "static/uploads"
+	# 批量任务结果文件（JSONL/Parquet）目录
+	ARTIFACT_DIR: str = "static/artifacts"
 	# 模型配置
 	DEFAULT_MODEL: str = "facebook/opt-1.3b"
 	MODEL_CACHE_DIR: str = ".cache/models"
+	# 水印缓存配置（字节预算），由进程内所有DiP实例共享，每个检测工作进程各有一份
+	DIP_SEED_CACHE_BYTES: int = 8 * 1024 * 1024
+	DIP_PERMUTATION_CACHE_BYTES: int = 256 * 1024 * 1024
+	# DiP每步重加权的实现: "reference"（原实现）、"fused"（融合并复用缓冲区）、"compiled"（torch.compile编译的融合实现）
+	DIP_REWEIGHT_IMPL: str = "reference"
+	# 水印实例池大小（按算法、参数与模型缓存的实例数）
+	WATERMARK_POOL_SIZE: int = 16
+	# 批量嵌入时单次generate允许的token预算（行数 × 序列长度）
+	EMBED_TOKEN_BUDGET: int = 16384
+	# 生成请求调度器：单个微批次的最大请求数与凑批最长等待时间（毫秒）
+	GENERATION_MAX_BATCH_SIZE: int = 8
+	GENERATION_MAX_WAIT_MS: float = 20
+	# 增量检测会话：空闲过期时间（秒）与最大会话数
+	DETECTION_SESSION_TTL_SECONDS: int = 600
+	DETECTION_SESSION_MAX: int = 1024
+	# 检测结果缓存：内存层字节预算与SQLite磁盘层路径（为空时不启用磁盘层）
+	DETECTION_CACHE_BYTES: int = 64 * 1024 * 1024
+	DETECTION_CACHE_DB: str = ""
+	# 磁盘层最多保留的条目数与条目存活时间（秒），0表示不限制；写入每攒够一批或每隔若干秒提交一次
+	DETECTION_CACHE_DB_MAX_ENTRIES: int = 100000
+	DETECTION_CACHE_DB_TTL_SECONDS: int = 7 * 24 * 3600
+	DETECTION_CACHE_DB_COMMIT_SIZE: int = 64
+	DETECTION_CACHE_DB_COMMIT_SECONDS: float = 1.0
+	# 检测进程池的工作进程数，0表示在API进程的线程池中检测（默认）
+	# 每个工作进程只加载分词器，但仍会导入torch与transformers，启动较慢且各占数百MB内存
+	DETECTION_WORKERS: int = 0
+	# 批量检测时每个子任务包含的文本数
+	BULK_DETECTION_CHUNK_SIZE: int = 64
+	# 数据集批量嵌入水印时每个检查点分片的行数
+	WATERMARK_SHARD_SIZE: int = 256
+	# 后台系统指标采样：采样间隔（秒）与保留的历史快照数
+	SYSTEM_METRICS_INTERVAL_SECONDS: float = 2.0
+	SYSTEM_METRICS_HISTORY: int = 300
+	# 性能分析trace（torch.profiler/cProfile）的输出目录
+	PROFILE_DIR: str = "static/profiles"
 	
 	class Config:
 		case_sensitive = True
@@ -0,0 +1,232 @@
+import bisect
+import math
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 延迟类直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 吞吐量直方图的分桶（token/秒）
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+
+def _escape(value: str) -> str:
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+	pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+	if math.isinf(value):
+		return "+Inf" if value > 0 else "-Inf"
+	return repr(float(value))
+
+
+class _Metric:
+	"""指标基类：按标签值分组保存样本，加锁保证线程安全"""
+	type_name = ""
+
+	def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = tuple(labelnames)
+		self._lock = Lock()
+
+	def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+		if set(labels) != set(self.labelnames):
+			raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+		return tuple(str(labels[name]) for name in self.labelnames)
+
+	def samples(self) -> List[str]:
+		"""返回Prometheus文本格式的样本行"""
+		raise NotImplementedError
+
+	def render(self) -> List[str]:
+		return [
+			f"# HELP {self.name} {self.documentation}",
+			f"# TYPE {self.name} {self.type_name}",
+			*self.samples()
+		]
+
+
+class Counter(_Metric):
+	"""单调递增计数器"""
+	type_name = "counter"
+
+	def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, documentation, labelnames)
+		self._values: Dict[Tuple[str, ...], float] = {}
+
+	def inc(self, amount: float = 1, **labels):
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def samples(self) -> List[str]:
+		with self._lock:
+			values = list(self._values.items())
+		return [
+			f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+			for key, value in values
+		]
+
+
+class Histogram(_Metric):
+	"""固定分桶直方图，观测一次只需一次二分查找"""
+	type_name = "histogram"
+
+	def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+				 buckets: Sequence[float] = LATENCY_BUCKETS):
+		super().__init__(name, documentation, labelnames)
+		self.buckets = tuple(sorted(buckets))
+		# 标签值 -> [各分桶计数（非累计，最后一项为+Inf）, 总和, 次数]
+		self._values: Dict[Tuple[str, ...], list] = {}
+
+	def observe(self, value: float, **labels):
+		key = self._key(labels)
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			entry = self._values.get(key)
+			if entry is None:
+				entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+			entry[0][index] += 1
+			entry[1] += value
+			entry[2] += 1
+
+	def samples(self) -> List[str]:
+		with self._lock:
+			values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+		lines = []
+		for key, counts, total, count in values:
+			cumulative = 0
+			for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+				cumulative += bucket_count
+				labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+				lines.append(f"{self.name}_bucket{labels} {cumulative}")
+			labels = _format_labels(self.labelnames, key)
+			lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+			lines.append(f"{self.name}_count{labels} {count}")
+		return lines
+
+
+class CallbackGauge(_Metric):
+	"""采集时才计算取值的仪表，回调返回 {标签值元组: 取值}"""
+	type_name = "gauge"
+
+	def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+				 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+		super().__init__(name, documentation, labelnames)
+		self.callback = callback
+
+	def samples(self) -> List[str]:
+		return [
+			f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+			for key, value in self.callback().items()
+		]
+
+
+class MetricsRegistry:
+	"""进程内指标注册表，无需外部采集器即可导出Prometheus文本格式"""
+
+	def __init__(self):
+		self._metrics: Dict[str, _Metric] = {}
+		self._lock = Lock()
+
+	def register(self, metric: _Metric) -> _Metric:
+		with self._lock:
+			if metric.name in self._metrics:
+				raise ValueError(f"Metric {metric.name} is already registered")
+			self._metrics[metric.name] = metric
+		return metric
+
+	def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+		return self.register(Counter(name, documentation, labelnames))
+
+	def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+				  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+		return self.register(Histogram(name, documentation, labelnames, buckets))
+
+	def gauge(self, name: str, documentation: str, labelnames: Sequence[str],
+			  callback: Callable[[], Dict[Tuple[str, ...], float]]) -> CallbackGauge:
+		return self.register(CallbackGauge(name, documentation, labelnames, callback))
+
+	def unregister(self, name: str) -> Optional[_Metric]:
+		with self._lock:
+			return self._metrics.pop(name, None)
+
+	def render(self) -> str:
+		"""导出全部指标（Prometheus文本格式0.0.4）"""
+		with self._lock:
+			metrics = list(self._metrics.values())
+		lines = []
+		for metric in metrics:
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+# 后台任务
+TASK_QUEUE_WAIT = registry.histogram(
+	"watermark_task_queue_wait_seconds", "Time a task spent pending before it started", ("type",)
+)
+TASK_RUN_TIME = registry.histogram(
+	"watermark_task_run_seconds", "Time a task spent running", ("type", "status")
+)
+TASK_FAILURES = registry.counter(
+	"watermark_task_failures_total", "Tasks that ended in the failed state", ("type",)
+)
+
+# 生成与检测吞吐量
+GENERATED_TOKENS = registry.counter(
+	"watermark_generated_tokens_total", "Tokens produced by model generate calls"
+)
+GENERATION_SECONDS = registry.counter(
+	"watermark_generation_seconds_total", "Wall time spent in model generate calls"
+)
+GENERATION_THROUGHPUT = registry.histogram(
+	"watermark_generation_tokens_per_second", "Tokens per second of each generate call",
+	buckets=THROUGHPUT_BUCKETS
+)
+DETECTED_TOKENS = registry.counter(
+	"watermark_detected_tokens_total", "Tokens scored by watermark detection", ("mode",)
+)
+DETECTION_SECONDS = registry.counter(
+	"watermark_detection_seconds_total", "Wall time spent in watermark detection", ("mode",)
+)
+DETECTION_THROUGHPUT = registry.histogram(
+	"watermark_detection_tokens_per_second", "Tokens per second of each detection scoring call", ("mode",),
+	buckets=THROUGHPUT_BUCKETS
+)
+
+# 模型加载
+MODEL_LOAD_TIME = registry.histogram(
+	"watermark_model_load_seconds", "Duration of model loads", ("status",),
+	buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+)
+
+
+def record_generation(tokens: int, seconds: float):
+	"""记录一次generate调用产生的token数与耗时"""
+	GENERATED_TOKENS.inc(tokens)
+	GENERATION_SECONDS.inc(seconds)
+	if seconds > 0:
+		GENERATION_THROUGHPUT.observe(tokens / seconds)
+
+
+def record_detection(mode: str, tokens: int, seconds: float):
+	"""
+	记录一次检测的token数与耗时，由DiP检测引擎在每次打分时调用，检测进程池在主进程中为工作进程补记
+	Args:
+		mode: 检测方式："full"（整段打分）、"sequential"（序贯检测）、"incremental"（增量检测会话）、
+			"worker"（检测进程池，耗时含进程间通信）
+	"""
+	DETECTED_TOKENS.inc(tokens, mode=mode)
+	DETECTION_SECONDS.inc(seconds, mode=mode)
+	if seconds > 0:
+		DETECTION_THROUGHPUT.observe(tokens / seconds, mode=mode)
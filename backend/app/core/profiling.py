@@ -0,0 +1,134 @@
+import cProfile
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import torch
+
+from app.core.config import cfg
+
+# 性能分析模式: 仅分阶段计时、附加torch.profiler trace、附加cProfile统计
+PROFILE_TIMING = "timing"
+PROFILE_TORCH = "torch"
+PROFILE_CPROFILE = "cprofile"
+PROFILE_MODES = (PROFILE_TIMING, PROFILE_TORCH, PROFILE_CPROFILE)
+
+
+class StageTimer:
+	"""
+	按阶段累计耗时与调用次数
+	阶段可以嵌套，外层阶段的耗时包含内层阶段
+	"""
+
+	def __init__(self, synchronize: bool = False, record_functions: bool = False):
+		"""
+		Args:
+			synchronize: 计时前后同步CUDA设备（CUDA算子异步执行，不同步时耗时会记到后续阶段）
+			record_functions: 同时以torch.profiler.record_function标注阶段，使阶段出现在torch trace中
+		"""
+		self.synchronize = synchronize
+		self.record_functions = record_functions
+		self.totals: Dict[str, float] = {}
+		self.counts: Dict[str, int] = {}
+
+	@contextmanager
+	def stage(self, name: str):
+		"""统计with块内的耗时"""
+		label = torch.profiler.record_function(name) if self.record_functions else nullcontext()
+		with label:
+			if self.synchronize:
+				torch.cuda.synchronize()
+			start = time.perf_counter()
+			try:
+				yield
+			finally:
+				if self.synchronize:
+					torch.cuda.synchronize()
+				self.record(name, time.perf_counter() - start)
+
+	def record(self, name: str, seconds: float):
+		"""直接记入一段耗时（如由其他阶段推算出的耗时）"""
+		self.totals[name] = self.totals.get(name, 0.0) + seconds
+		self.counts[name] = self.counts.get(name, 0) + 1
+
+	def total(self, name: str) -> float:
+		return self.totals.get(name, 0.0)
+
+	def breakdown(self) -> Dict[str, Dict[str, float]]:
+		"""各阶段的总耗时（秒）与调用次数"""
+		return {name: {"seconds": self.totals[name], "calls": self.counts[name]} for name in self.totals}
+
+
+class _NullStageTimer(StageTimer):
+	"""未开启性能分析时使用的计时器，不计时也不记录"""
+
+	def stage(self, name: str):
+		return _NULL_CONTEXT
+
+	def record(self, name: str, seconds: float):
+		pass
+
+
+_NULL_CONTEXT = nullcontext()
+# 共享的空计时器，热路径中默认使用，开销只有一次方法调用
+NULL_TIMER = _NullStageTimer()
+
+
+def _trace_path(name: str, extension: str) -> str:
+	os.makedirs(cfg.PROFILE_DIR, exist_ok=True)
+	return os.path.join(cfg.PROFILE_DIR, f"{name}.{extension}")
+
+
+def run_profiled(mode: str, name: str, func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+	"""
+	在性能分析模式下执行func，func须接受timer关键字参数
+	Args:
+		mode: 性能分析模式，见PROFILE_MODES
+		name: trace文件名（不含扩展名），写入PROFILE_DIR
+	Returns:
+		(func的返回值, {"mode", "stages": 分阶段耗时, "trace_path": trace文件路径或None})
+	Raises:
+		ValueError: 如果模式不存在
+	"""
+	if mode not in PROFILE_MODES:
+		raise ValueError(f"Unknown profile mode: {mode}")
+	timer = StageTimer(synchronize=torch.cuda.is_available(), record_functions=mode == PROFILE_TORCH)
+	trace_path: Optional[str] = None
+	elapsed = 0.0
+	
+	def call():
+		nonlocal elapsed
+		start = time.perf_counter()
+		try:
+			return func(*args, timer=timer, **kwargs)
+		finally:
+			elapsed = time.perf_counter() - start
+	
+	if mode == PROFILE_TORCH:
+		activities = [torch.profiler.ProfilerActivity.CPU]
+		if torch.cuda.is_available():
+			activities.append(torch.profiler.ProfilerActivity.CUDA)
+		with torch.profiler.profile(activities=activities) as profiler:
+			result = call()
+		# Chrome trace格式，可在chrome://tracing或Perfetto中查看
+		trace_path = _trace_path(name, "json")
+		profiler.export_chrome_trace(trace_path)
+	elif mode == PROFILE_CPROFILE:
+		profiler = cProfile.Profile()
+		profiler.enable()
+		try:
+			result = call()
+		finally:
+			profiler.disable()
+		# pstats格式，可用python -m pstats或snakeviz查看
+		trace_path = _trace_path(name, "prof")
+		profiler.dump_stats(trace_path)
+	else:
+		result = call()
+	return result, {
+		"mode": mode,
+		"total_seconds": elapsed,
+		"stages": timer.breakdown(),
+		"trace_path": trace_path
+	}
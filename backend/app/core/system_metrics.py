@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import platform
+import time
+from collections import deque
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import psutil
+import torch
+
+from app.core.config import cfg
+
+
+class SystemMetricsSampler:
+	"""
+	后台系统指标采样器
+	按固定间隔在后台采集CPU、内存、torch设备与本进程的指标，存入定长环形缓冲区；
+	接口直接读取最近一次快照，不在事件循环中阻塞等待采样
+	"""
+
+	def __init__(self, interval: float, history_size: int):
+		"""
+		Args:
+			interval: 采样间隔（秒）
+			history_size: 环形缓冲区保留的快照数
+		"""
+		self.interval = interval
+		self._samples: "deque[Dict[str, Any]]" = deque(maxlen=history_size)
+		self._lock = Lock()
+		self._task: Optional[asyncio.Task] = None
+		self._process = psutil.Process(os.getpid())
+		self.system_type = platform.system()
+		if torch.cuda.is_available():
+			self.torch_device = f"CUDA ({torch.cuda.get_device_name(0)})"
+		else:
+			self.torch_device = "CPU"
+		# cpu_percent(interval=None)返回距上次调用的平均值，首次调用只建立基准
+		psutil.cpu_percent(interval=None)
+		self._process.cpu_percent(interval=None)
+
+	def start(self):
+		"""在当前事件循环中启动采样任务"""
+		if self._task is None:
+			self._task = asyncio.create_task(self._run())
+
+	async def stop(self):
+		"""停止采样任务"""
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+
+	async def _run(self):
+		while True:
+			try:
+				# 读取GPU利用率可能较慢，放到线程中执行
+				await asyncio.to_thread(self.sample)
+			except Exception as e:
+				logging.error(f"System metrics sampling failed: {str(e)}")
+			await asyncio.sleep(self.interval)
+
+	def sample(self) -> Dict[str, Any]:
+		"""采集一次快照并写入环形缓冲区"""
+		memory = psutil.virtual_memory()
+		with self._process.oneshot():
+			process = {
+				"cpu_percent": self._process.cpu_percent(interval=None),
+				"memory_rss": self._process.memory_info().rss,
+				"num_threads": self._process.num_threads()
+			}
+
+		gpu_usage = 0.0
+		gpu_memory_usage = 0.0
+		gpu_memory_allocated = 0
+		gpu_memory_reserved = 0
+		if torch.cuda.is_available():
+			try:
+				gpu_usage = float(torch.cuda.utilization())
+			except Exception:
+				# 未安装pynvml时无法读取利用率
+				pass
+			gpu_memory_allocated = torch.cuda.memory_allocated(0)
+			gpu_memory_reserved = torch.cuda.memory_reserved(0)
+			total_memory = torch.cuda.get_device_properties(0).total_memory
+			gpu_memory_usage = gpu_memory_allocated / total_memory * 100
+
+		snapshot = {
+			"timestamp": time.time(),
+			"system_type": self.system_type,
+			"torch_device": self.torch_device,
+			"cpu_usage": psutil.cpu_percent(interval=None),
+			"memory_usage": memory.percent,
+			"memory_used": memory.used,
+			"gpu_usage": gpu_usage,
+			"gpu_memory_usage": gpu_memory_usage,
+			"gpu_memory_allocated": gpu_memory_allocated,
+			"gpu_memory_reserved": gpu_memory_reserved,
+			"process": process
+		}
+		with self._lock:
+			self._samples.append(snapshot)
+		return snapshot
+
+	def latest(self) -> Dict[str, Any]:
+		"""最近一次快照，尚未采样时立即采样一次（不阻塞等待）"""
+		with self._lock:
+			if self._samples:
+				return self._samples[-1]
+		return self.sample()
+
+	def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+		"""按时间顺序返回最近的至多limit个快照"""
+		with self._lock:
+			samples = list(self._samples)
+		return samples[-limit:] if limit else samples
+
+
+# 全局系统指标采样器，由应用生命周期启动与停止
+system_metrics = SystemMetricsSampler(cfg.SYSTEM_METRICS_INTERVAL_SECONDS, cfg.SYSTEM_METRICS_HISTORY)
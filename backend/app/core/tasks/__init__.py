@@ -1 +1 @@
-from .tasks import (get_task_status, router, task_lock, TaskResponse, tasks, TaskStatus)
+from .tasks import (get_task_status, instrumented, router, task_lock, TaskResponse, tasks, TaskStatus)
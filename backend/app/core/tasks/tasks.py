@@ -1,11 +1,15 @@
+import functools
+import time
 from datetime import datetime
 from enum import Enum
 from threading import Lock
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, Optional
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app.core.metrics import TASK_FAILURES, TASK_QUEUE_WAIT, TASK_RUN_TIME
+
 
 class TaskStatus(str, Enum):
 	PENDING = "pending"  # 排队
@@ -18,6 +22,7 @@ class TaskResponse(BaseModel):
 	task_id: str
 	status: TaskStatus
 	result: Optional[Dict] = None
+	progress: Optional[Dict] = None  # 批量任务的进度，如{"completed": 10, "total": 100}
 	error: Optional[str] = None
 	created_at: datetime
 	completed_at: Optional[datetime] = None
@@ -32,6 +37,42 @@ router = APIRouter(
 )
 
 
+def instrumented(task_type: str) -> Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]]:
+	"""
+	为后台任务处理函数记录排队等待时间、运行时间与失败次数（按任务类型）
+	处理函数的第一个参数为task_id，任务记录的created_at与status由处理函数维护
+	Args:
+		task_type: 任务类型，作为指标的type标签
+	"""
+	def decorator(func):
+		@functools.wraps(func)
+		async def wrapper(task_id: str, *args, **kwargs):
+			with task_lock:
+				task = tasks.get(task_id)
+				created_at = task["created_at"] if task else None
+			if created_at is not None:
+				TASK_QUEUE_WAIT.observe(max((datetime.now() - created_at).total_seconds(), 0.0), type=task_type)
+			
+			start = time.perf_counter()
+			raised = False
+			try:
+				return await func(task_id, *args, **kwargs)
+			except BaseException:
+				raised = True
+				raise
+			finally:
+				with task_lock:
+					task = tasks.get(task_id)
+					task_status = task["status"] if task else None
+				if raised or task_status == TaskStatus.FAILED:
+					task_status = TaskStatus.FAILED
+					TASK_FAILURES.inc(type=task_type)
+				status_label = task_status.value if isinstance(task_status, TaskStatus) else "unknown"
+				TASK_RUN_TIME.observe(time.perf_counter() - start, type=task_type, status=status_label)
+		return wrapper
+	return decorator
+
+
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task_status(task_id: str):
 	with task_lock:
@@ -44,6 +85,7 @@ async def get_task_status(task_id: str):
 		"task_id": task_id,
 		"status": task["status"],
 		"result": task["result"],
+		"progress": task.get("progress"),
 		"error": task["error"],
 		"created_at": task["created_at"],
 		"completed_at": task["completed_at"]
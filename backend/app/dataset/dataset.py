@@ -1,10 +1,13 @@
 import os
+import shutil
 import uuid
-from typing import Optional
+from typing import Callable, Optional
 
-from datasets import Dataset as HFDataset, load_dataset
+from datasets import concatenate_datasets, Dataset as HFDataset, load_dataset
+from fastapi.concurrency import run_in_threadpool
 
 from app.dbModels.dataset import Dataset
+from app.watermarks import WatermarkBase
 
 
 async def process_uploaded_dataset(file_path: str, dataset_id: uuid.UUID, format_type: str):
@@ -136,3 +139,68 @@ async def import_hf_dataset(
 		
 		# 记录错误
 		print(f"Error importing dataset {dataset_id}: {str(e)}")
+
+
+async def watermark_dataset(
+	source_path: str,
+	output_path: str,
+	prompt_column: str,
+	output_column: str,
+	watermark: WatermarkBase,
+	shard_size: int,
+	on_progress: Optional[Callable[[int, int], None]] = None
+) -> HFDataset:
+	"""
+	对已存储的数据集分片批量嵌入水印，生成追加了水印文本列的新数据集
+	每个分片完成后立即保存为检查点，任务中断后重新执行时跳过已完成的分片
+	Args:
+		source_path: 源数据集路径（load_from_disk）
+		output_path: 新数据集的保存路径
+		prompt_column: 提示文本所在的列
+		output_column: 追加的水印文本列名
+		watermark: 水印算法实例
+		shard_size: 每个分片的行数
+		on_progress: 进度回调，参数为(已完成行数, 总行数)
+	Returns:
+		新数据集
+	"""
+	if shard_size <= 0:
+		raise ValueError("shard_size must be positive")
+	source = await run_in_threadpool(HFDataset.load_from_disk, source_path)
+	if prompt_column not in source.column_names:
+		raise ValueError(f"Column {prompt_column} not found in dataset")
+	
+	checkpoint_dir = shard_checkpoint_dir(output_path)
+	os.makedirs(checkpoint_dir, exist_ok=True)
+	total = len(source)
+	shard_paths = []
+	for shard_index, start in enumerate(range(0, total, shard_size)):
+		shard_path = os.path.join(checkpoint_dir, f"shard-{shard_index:05d}")
+		shard_paths.append(shard_path)
+		# 已完成的分片直接复用
+		if not os.path.exists(shard_path):
+			shard = source.select(range(start, min(start + shard_size, total)))
+			watermarked_texts = await run_in_threadpool(watermark.embed_batch, list(shard[prompt_column]))
+			shard = shard.add_column(output_column, watermarked_texts)
+			# 先写入临时目录再重命名，保证检查点要么完整要么不存在；上次中断时残留的临时目录先删除
+			shutil.rmtree(shard_path + ".tmp", ignore_errors=True)
+			await run_in_threadpool(shard.save_to_disk, shard_path + ".tmp")
+			os.replace(shard_path + ".tmp", shard_path)
+		if on_progress:
+			on_progress(min(start + shard_size, total), total)
+	
+	if shard_paths:
+		shards = [await run_in_threadpool(HFDataset.load_from_disk, shard_path) for shard_path in shard_paths]
+		watermarked_dataset = concatenate_datasets(shards)
+	else:
+		watermarked_dataset = source.add_column(output_column, [])
+	
+	os.makedirs(output_path, exist_ok=True)
+	await run_in_threadpool(watermarked_dataset.save_to_disk, output_path)
+	shutil.rmtree(checkpoint_dir)
+	return await run_in_threadpool(HFDataset.load_from_disk, output_path)
+
+
+def shard_checkpoint_dir(output_path: str) -> str:
+	"""批量水印任务的分片检查点目录"""
+	return f"{output_path.rstrip('/')}_shards"
@@ -1,3 +1,4 @@
+from app.core.Configurable import build_metadata_registry
 from .LLMParaphraserAttacker import LLMParaphraserAttacker
 from .SynonymSubstitutionAttacker import SynonymSubstitutionAttacker
 from .TextWatermarkAttacker import TextWatermarkAttacker
@@ -9,6 +10,8 @@ ATTACKERS = {
 	"WordDeletionAttacker": WordDeletionAttacker,
 	"SynonymSubstitutionAttacker": SynonymSubstitutionAttacker
 }
+# 导入时一次性计算的只读攻击器元数据，列举攻击器时无需实例化（避免下载nltk数据等副作用）
+ATTACKER_METADATA = build_metadata_registry(ATTACKERS)
 
 
 def get_attacker(name: str, **kwargs) -> TextWatermarkAttacker:
@@ -33,5 +36,6 @@ __all__ = [
 	"WordDeletionAttacker",
 	"SynonymSubstitutionAttacker",
 	"ATTACKERS",
+	"ATTACKER_METADATA",
 	"get_attacker"
 ]
@@ -0,0 +1,124 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+
+from app.watermarks.dip_engine import quantile_z_scores
+
+# Columns of the per-token quantile artifact written by evaluation_detectability
+QUANTILE_ARTIFACT_SCHEMA = pa.schema([
+    ("index", pa.int32()),
+    ("label", pa.bool_()),  # True for watermarked text, False for natural text
+    ("num_tokens", pa.int32()),
+    ("quantiles", pa.list_(pa.float32())),
+])
+
+
+def _rate(count: int, total: int) -> float:
+    return count / total if total else 0.0
+
+
+def roc_curve(positive_scores: np.ndarray, negative_scores: np.ndarray) -> Dict[str, np.ndarray]:
+    """ROC curve of the rule ``score > threshold``, one point per distinct score.
+
+    Thresholds run from the highest score (nothing detected) down to -inf (everything detected).
+    """
+    thresholds = np.r_[np.unique(np.r_[positive_scores, negative_scores])[::-1], -np.inf]
+    positives = np.sort(positive_scores)
+    negatives = np.sort(negative_scores)
+    # number of scores strictly above each threshold
+    tpr = (len(positives) - np.searchsorted(positives, thresholds, side="right")) / max(len(positives), 1)
+    fpr = (len(negatives) - np.searchsorted(negatives, thresholds, side="right")) / max(len(negatives), 1)
+    return {"fpr": fpr, "tpr": tpr, "thresholds": thresholds}
+
+
+def _threshold(value: float) -> Optional[float]:
+    """-inf (detect everything) has no JSON representation"""
+    return float(value) if np.isfinite(value) else None
+
+
+def _operating_point(roc: Dict[str, np.ndarray], index: int) -> Dict[str, Any]:
+    return {
+        "z_threshold": _threshold(roc["thresholds"][index]),
+        "tpr": float(roc["tpr"][index]),
+        "fpr": float(roc["fpr"][index]),
+    }
+
+
+def _confusion(positive_scores: np.ndarray, negative_scores: np.ndarray, z_threshold: float) -> Dict[str, Any]:
+    true_positives = int(np.count_nonzero(positive_scores > z_threshold))
+    false_positives = int(np.count_nonzero(negative_scores > z_threshold))
+    false_negatives = len(positive_scores) - true_positives
+    true_negatives = len(negative_scores) - false_positives
+    precision = _rate(true_positives, true_positives + false_positives)
+    recall = _rate(true_positives, len(positive_scores))
+    return {
+        "z_threshold": z_threshold,
+        "tpr": recall,
+        "fpr": _rate(false_positives, len(negative_scores)),
+        "accuracy": _rate(true_positives + true_negatives, len(positive_scores) + len(negative_scores)),
+        "precision": precision,
+        "f1_score": 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0,
+    }
+
+
+def calibrate(quantiles: Sequence[np.ndarray], labels: Sequence[bool], gammas: Sequence[float],
+              z_thresholds: Sequence[float] = (), target_fprs: Sequence[float] = (0.01, 0.05)) -> Dict[str, Any]:
+    """Sweep detection thresholds over stored per-token quantiles.
+
+    For every gamma the z-scores of all texts are recomputed from their quantiles, then the
+    ROC curve, its AUC, the best TPR at each target FPR, Youden's optimal z_threshold and the
+    confusion metrics of every z_threshold of the grid are reported. Nothing is re-hashed and
+    the model is never used.
+    """
+    labels = np.asarray(labels, dtype=bool)
+    if len(labels) != len(quantiles):
+        raise ValueError("Labels and quantiles must have the same length")
+    if labels.all() or not labels.any():
+        raise ValueError("Calibration needs both watermarked and natural texts")
+    if any(not 0 < gamma < 1 for gamma in gammas):
+        raise ValueError("Gammas must lie in (0, 1)")
+    if any(not 0 <= target <= 1 for target in target_fprs):
+        raise ValueError("Target FPRs must lie in [0, 1]")
+
+    # z-scores of shape (texts, gammas)
+    z_scores = np.stack([quantile_z_scores(np.asarray(q, dtype=np.float32), gammas) for q in quantiles])
+
+    results = []
+    best = None
+    for column, gamma in enumerate(gammas):
+        positive_scores, negative_scores = z_scores[labels, column], z_scores[~labels, column]
+        roc = roc_curve(positive_scores, negative_scores)
+        tpr_at_fpr = []
+        for target in target_fprs:
+            # thresholds decrease along the curve, so the last admissible point has the highest TPR
+            admissible = np.flatnonzero(roc["fpr"] <= target)
+            if len(admissible):
+                tpr_at_fpr.append({"target_fpr": target, **_operating_point(roc, int(admissible[-1]))})
+            else:
+                # no threshold keeps the FPR at the target
+                tpr_at_fpr.append({"target_fpr": target, "z_threshold": None, "tpr": None, "fpr": None})
+        grid = [_confusion(positive_scores, negative_scores, float(z)) for z in z_thresholds]
+        for point in grid:
+            if best is None or point["accuracy"] > best["accuracy"]:
+                best = {"gamma": gamma, **point}
+        results.append({
+            "gamma": gamma,
+            "auc": float(np.trapezoid(roc["tpr"], roc["fpr"])),
+            "tpr_at_fpr": tpr_at_fpr,
+            "youden": _operating_point(roc, int(np.argmax(roc["tpr"] - roc["fpr"]))),
+            "grid": grid,
+            "roc": {
+                "fpr": roc["fpr"].tolist(),
+                "tpr": roc["tpr"].tolist(),
+                "thresholds": [_threshold(value) for value in roc["thresholds"]],
+            },
+        })
+
+    return {
+        "num_watermarked": int(labels.sum()),
+        "num_natural": int((~labels).sum()),
+        "gammas": results,
+        # grid point with the highest accuracy over all gammas
+        "best": best,
+    }
@@ -1,13 +1,24 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from datasets import Dataset
 
+from app.core.artifacts import ResultArtifactWriter
 from app.evaluation.attacker import TextWatermarkAttacker
+from app.evaluation.calibration import QUANTILE_ARTIFACT_SCHEMA
 from app.watermarks import WatermarkBase
 
 
-def evaluation_detectability(watermark: WatermarkBase,  dataset: Dataset) -> Dict[
-    str, Any]:
+def evaluation_detectability(watermark: WatermarkBase,  dataset: Dataset,
+                             quantile_artifact: Optional[str] = None) -> Dict[str, Any]:
+    """
+    When quantile_artifact is given and the watermark provides per-token quantiles, the
+    quantiles of every detected text are written to that Parquet file, so thresholds can be
+    calibrated later (app.evaluation.calibration) without generating or detecting again.
+    """
+    keep_quantiles = quantile_artifact is not None and watermark.provides_token_quantiles
+    detect_kwargs = {"keep_quantiles": True} if keep_quantiles else {}
+    writer = ResultArtifactWriter(quantile_artifact, "parquet", QUANTILE_ARTIFACT_SCHEMA) if keep_quantiles else None
+
     true_positives = 0  # Watermark detected in watermarked text
     false_positives = 0  # Watermark detected in natural text (should be negative)
     true_negatives = 0  # No watermark detected in natural text
@@ -15,30 +26,45 @@ def evaluation_detectability(watermark: WatermarkBase,  dataset: Dataset) -> Dic
 
     total_examples = len(dataset)
 
-    for example in dataset:
-        prompt = example['prompt']
-        natural_text = example['natural_text']
+    try:
+        for index, example in enumerate(dataset):
+            prompt = example['prompt']
+            natural_text = example['natural_text']
+
+            # Generate watermarked text using the prompt
+            watermarked_text = watermark.embed(prompt)
 
-        # Generate watermarked text using the prompt
-        watermarked_text = watermark.embed(prompt)
+            # Detect watermark in the watermarked text
+            watermarked_detection = watermark.detect(watermarked_text, **detect_kwargs)
 
-        # Detect watermark in the watermarked text
-        watermarked_detection = watermark.detect(watermarked_text)
+            # Detect watermark in the natural text (should not have a watermark)
+            natural_detection = watermark.detect(natural_text, **detect_kwargs)
 
-        # Detect watermark in the natural text (should not have a watermark)
-        natural_detection = watermark.detect(natural_text)
+            if writer is not None:
+                writer.write_rows([
+                    {
+                        "index": index,
+                        "label": label,
+                        "num_tokens": len(detection["quantiles"]),
+                        "quantiles": detection["quantiles"].tolist(),
+                    }
+                    for label, detection in ((True, watermarked_detection), (False, natural_detection))
+                ])
 
-        # Check watermarked text detection results
-        if watermarked_detection['detected']:
-            true_positives += 1
-        else:
-            false_negatives += 1
+            # Check watermarked text detection results
+            if watermarked_detection['detected']:
+                true_positives += 1
+            else:
+                false_negatives += 1
 
-        # Check natural text detection results
-        if not natural_detection['detected']:
-            true_negatives += 1
-        else:
-            false_positives += 1
+            # Check natural text detection results
+            if not natural_detection['detected']:
+                true_negatives += 1
+            else:
+                false_positives += 1
+    finally:
+        if writer is not None:
+            writer.close()
 
     # Calculate standard classification metrics
     accuracy = (true_positives + true_negatives) / (total_examples * 2)
@@ -62,7 +88,8 @@ def evaluation_detectability(watermark: WatermarkBase,  dataset: Dataset) -> Dic
         "false_positives": false_positives,
         "true_negatives": true_negatives,
         "false_negatives": false_negatives,
-        "total_examples": total_examples
+        "total_examples": total_examples,
+        "quantile_artifact": keep_quantiles
     }
 
     return results
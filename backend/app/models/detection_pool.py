@@ -0,0 +1,165 @@
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import torch
+from transformers import AutoTokenizer
+
+from app.core.config import cfg
+from app.core.metrics import record_detection
+from app.models.llm import llm_service
+
+# 工作进程内的分词器，由_init_worker加载
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer_name: str):
+	"""工作进程初始化：只加载分词器，不加载模型权重"""
+	global _worker_tokenizer
+	# 每个进程单线程计算，避免多个进程争抢CPU核心
+	torch.set_num_threads(1)
+	_worker_tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, cache_dir=cfg.MODEL_CACHE_DIR)
+
+
+def _detect_in_worker(algorithm: str, params: Dict[str, Any], text: str) -> Dict[str, Any]:
+	"""在工作进程中执行检测，水印实例由进程内的实例池复用"""
+	from app.watermarks import watermark_pool
+	
+	watermark = watermark_pool.get(algorithm, **params)
+	detection_result = watermark.detect(text, tokenizer=_worker_tokenizer, device="cpu")
+	return to_detection_result(detection_result)
+
+
+def _detect_batch_in_worker(algorithm: str, params: Dict[str, Any], texts: List[str],
+						   keep_quantiles: bool = False) -> List[Dict[str, Any]]:
+	"""在工作进程中批量检测，一次批量分词"""
+	from app.watermarks import watermark_pool
+	
+	watermark = watermark_pool.get(algorithm, **params)
+	kwargs = {"keep_quantiles": True} if keep_quantiles else {}
+	detection_results = watermark.detect_batch(texts, tokenizer=_worker_tokenizer, device="cpu", **kwargs)
+	return [to_detection_result(detection_result) for detection_result in detection_results]
+
+
+def to_detection_result(detection_result: Dict[str, Any]) -> Dict[str, Any]:
+	"""转换为可跨进程传递、可JSON序列化的检测结果"""
+	result = {
+		"detected": bool(detection_result["detected"]),
+		"confidence": float(detection_result["confidence"])
+	}
+	if "num_tokens" in detection_result:
+		result["num_tokens"] = int(detection_result["num_tokens"])
+	# 序贯检测（SPRT）附带的提前停止信息
+	if "tokens_consumed" in detection_result:
+		result["tokens_consumed"] = int(detection_result["tokens_consumed"])
+		result["stopped_early"] = bool(detection_result["stopped_early"])
+		result["log_likelihood_ratio"] = float(detection_result["log_likelihood_ratio"])
+	# 逐token分位数，用于阈值校准
+	if "quantiles" in detection_result:
+		result["quantiles"] = [float(quantile) for quantile in detection_result["quantiles"]]
+	return result
+
+
+class DetectionExecutor:
+	"""
+	无模型检测进程池
+	检测只需要分词器和密钥，工作进程仅加载分词器，绕开GIL按CPU核心数扩展检测吞吐，
+	生成所用的模型仍只在主进程中
+	"""
+	
+	def __init__(self, max_workers: int):
+		"""
+		Args:
+			max_workers: 工作进程数，<=0 时不启用进程池
+		"""
+		self.max_workers = max_workers
+		self._pool: Optional[ProcessPoolExecutor] = None
+		self._tokenizer_name: Optional[str] = None
+		self._lock = Lock()
+	
+	@property
+	def enabled(self) -> bool:
+		return self.max_workers > 0
+	
+	def submit(self, algorithm: str, params: Dict[str, Any], text: str) -> Future:
+		"""
+		提交检测任务
+		Returns:
+			完成时携带检测结果{"detected", "confidence"}的Future
+		Raises:
+			RuntimeError: 如果进程池未启用或模型未加载
+		"""
+		if not self.enabled:
+			raise RuntimeError("Detection worker pool is disabled")
+		if llm_service.tokenizer is None:
+			raise RuntimeError("Model not loaded")
+		return self._recorded(self._get_pool(llm_service.tokenizer.name_or_path).submit(
+			_detect_in_worker, algorithm, params, text
+		))
+	
+	def submit_batch(self, algorithm: str, params: Dict[str, Any], texts: List[str],
+					 keep_quantiles: bool = False) -> Future:
+		"""
+		提交批量检测任务
+		Args:
+			keep_quantiles: 是否在结果中附带逐token分位数
+		Returns:
+			完成时携带与texts顺序一致的检测结果列表的Future
+		"""
+		if not self.enabled:
+			raise RuntimeError("Detection worker pool is disabled")
+		if llm_service.tokenizer is None:
+			raise RuntimeError("Model not loaded")
+		return self._recorded(self._get_pool(llm_service.tokenizer.name_or_path).submit(
+			_detect_batch_in_worker, algorithm, params, texts, keep_quantiles
+		))
+	
+	@staticmethod
+	def _recorded(future: Future) -> Future:
+		"""工作进程中记录的检测指标不会回到主进程，完成时在主进程中补记检测吞吐量"""
+		start = time.perf_counter()
+		
+		def record(done: Future):
+			if done.cancelled() or done.exception() is not None:
+				return
+			results = done.result()
+			# 序贯检测只计入实际打分的token
+			tokens = sum(
+				result.get("tokens_consumed", result.get("num_tokens", 0))
+				for result in (results if isinstance(results, list) else [results])
+			)
+			record_detection("worker", tokens, time.perf_counter() - start)
+		
+		future.add_done_callback(record)
+		return future
+	
+	def _get_pool(self, tokenizer_name: str) -> ProcessPoolExecutor:
+		"""获取与当前分词器对应的进程池，分词器变化时重建"""
+		with self._lock:
+			if self._pool is None or self._tokenizer_name != tokenizer_name:
+				if self._pool is not None:
+					self._pool.shutdown(wait=False, cancel_futures=True)
+				# 使用spawn启动，子进程不继承主进程中的模型与CUDA上下文
+				self._pool = ProcessPoolExecutor(
+					max_workers=self.max_workers,
+					mp_context=multiprocessing.get_context("spawn"),
+					initializer=_init_worker,
+					initargs=(tokenizer_name,)
+				)
+				self._tokenizer_name = tokenizer_name
+			return self._pool
+	
+	def shutdown(self):
+		"""关闭进程池（模型切换或服务关闭时调用）"""
+		with self._lock:
+			if self._pool is not None:
+				self._pool.shutdown(wait=False, cancel_futures=True)
+			self._pool = None
+			self._tokenizer_name = None
+
+
+# 全局检测进程池，模型切换时关闭，下次检测时按新分词器重建
+detection_executor = DetectionExecutor(cfg.DETECTION_WORKERS)
+llm_service.add_model_listener(detection_executor.shutdown)
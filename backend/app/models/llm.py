@@ -1,4 +1,6 @@
-from typing import Optional
+import time
+from threading import Event
+from typing import Callable, Optional
 
 import torch
 from transformers import (
@@ -6,10 +8,26 @@ from transformers import (
 	AutoTokenizer,
 	LogitsProcessor,
 	LogitsProcessorList,
+	StoppingCriteria,
 )
 from fastapi.concurrency import run_in_threadpool
 
 from app.core.config import cfg
+from app.core.metrics import MODEL_LOAD_TIME, record_generation
+from app.models.scheduler import GenerationScheduler
+
+
+class CancellationCriteria(StoppingCriteria):
+	"""可从其他线程取消生成的停止条件：cancel()后generate在下一步结束所有行"""
+	
+	def __init__(self):
+		self._cancelled = Event()
+	
+	def cancel(self):
+		self._cancelled.set()
+	
+	def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+		return torch.full((input_ids.shape[0],), self._cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
 
 
 class LLMService:
@@ -26,6 +44,13 @@ class LLMService:
 			self.model = None
 			self.tokenizer = None
 			self.processors = LogitsProcessorList()
+			self.model_version = 0  # 每次模型切换时递增，用于标识当前加载的模型
+			self._model_listeners = []
+			# 生成请求调度器：将兼容的生成请求合并为微批次
+			self.scheduler = GenerationScheduler(
+				cfg.GENERATION_MAX_BATCH_SIZE,
+				cfg.GENERATION_MAX_WAIT_MS
+			)
 			self.initialized = True
 			self.is_active = False  # 添加is_active属性，默认为False
 			# 获取可用设备
@@ -78,10 +103,12 @@ class LLMService:
 		self.model = None
 		self.tokenizer = None
 		self.is_active = False
+		self.notify_model_changed()
 		
 		# 加载新模型
 		model_name = model_name or cfg.DEFAULT_MODEL
 		
+		start = time.perf_counter()
 		try:
 			# 使用run_in_threadpool异步加载模型
 			self.model = await run_in_threadpool(
@@ -98,15 +125,49 @@ class LLMService:
 			)
 			
 			self.is_active = True  # 模型加载成功后设置is_active为True
+			self.notify_model_changed()
 		except Exception as e:
 			# 加载失败时确保状态一致
 			self.model = None
 			self.tokenizer = None
 			self.is_active = False
+			MODEL_LOAD_TIME.observe(time.perf_counter() - start, status="failed")
 			raise e
-			
+		MODEL_LOAD_TIME.observe(time.perf_counter() - start, status="completed")
+		
 		return self
 	
+	def model_generate(self, **kwargs) -> torch.LongTensor:
+		"""
+		调用model.generate并记录生成的token数与耗时（生成吞吐量指标）
+		Args:
+			**kwargs: 传给model.generate的参数，须包含input_ids
+		Returns:
+			包含输入部分的输出序列
+		"""
+		start = time.perf_counter()
+		outputs = self.model.generate(**kwargs)
+		elapsed = time.perf_counter() - start
+		new_tokens = outputs[:, kwargs["input_ids"].shape[-1]:]
+		pad_token_id = kwargs.get("pad_token_id", self.tokenizer.pad_token_id)
+		if pad_token_id is not None:
+			# 提前结束的行以pad补齐，不计入生成的token
+			generated = int((new_tokens != pad_token_id).sum())
+		else:
+			generated = new_tokens.numel()
+		record_generation(generated, elapsed)
+		return outputs
+	
+	def add_model_listener(self, listener: Callable[[], None]):
+		"""注册模型切换回调（如使水印实例池失效）"""
+		self._model_listeners.append(listener)
+	
+	def notify_model_changed(self):
+		"""模型被替换或卸载后调用，递增模型版本并通知所有回调"""
+		self.model_version += 1
+		for listener in self._model_listeners:
+			listener()
+	
 	def add_processor(self, processor: LogitsProcessor):
 		"""添加logits处理器"""
 		self.processors.append(processor)
@@ -138,7 +199,7 @@ class LLMService:
 			"do_sample": True,
 			**kwargs
 		}
-		outputs = self.model.generate(**inputs, **generation_config)
+		outputs = self.model_generate(**inputs, **generation_config)
 		return self.tokenizer.decode(
 			outputs[0],
 			skip_special_tokens=True
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class GenerationScheduler:
+	"""
+	连续批处理调度器
+	将排队的生成请求按兼容性分组（同一模型、同一水印配置），在很短的时间窗口内
+	合并为微批次，由单个工作线程调用一次批量生成，再把结果分发回各请求
+	"""
+
+	def __init__(self, max_batch_size: int, max_wait_ms: float):
+		"""
+		Args:
+			max_batch_size: 单个微批次的最大请求数
+			max_wait_ms: 请求在队列中等待凑批的最长时间（毫秒）
+		"""
+		self.max_batch_size = max_batch_size
+		self.max_wait = max_wait_ms / 1000
+		# 分组键 -> [(提交时间, 输入, Future)]
+		self._groups: Dict[Hashable, List[tuple]] = {}
+		self._runners = {}
+		self._condition = Condition()
+		self._worker: Optional[Thread] = None
+		self._stopped = False
+
+	def submit(self, group_key: Hashable, runner: Callable[[List[Any]], List[Any]], item: Any) -> Future:
+		"""
+		提交一个生成请求
+		Args:
+			group_key: 分组键，键相同的请求可以合并到同一批次
+			runner: 批量执行函数，输入列表、返回等长的结果列表
+			item: 本请求的输入
+		Returns:
+			完成时携带本请求结果的Future
+		"""
+		future = Future()
+		with self._condition:
+			if self._stopped:
+				raise RuntimeError("Generation scheduler has been stopped")
+			self._groups.setdefault(group_key, []).append((time.monotonic(), item, future))
+			self._runners[group_key] = runner
+			if self._worker is None:
+				self._worker = Thread(target=self._run, name="generation-scheduler", daemon=True)
+				self._worker.start()
+			self._condition.notify()
+		return future
+
+	def stop(self):
+		"""停止工作线程，未执行的请求以异常结束"""
+		with self._condition:
+			self._stopped = True
+			for entries in self._groups.values():
+				for _, _, future in entries:
+					if future.set_running_or_notify_cancel():
+						future.set_exception(RuntimeError("Generation scheduler has been stopped"))
+			self._groups.clear()
+			self._runners.clear()
+			self._condition.notify()
+
+	def pending(self) -> int:
+		"""排队中的请求数"""
+		with self._condition:
+			return sum(len(entries) for entries in self._groups.values())
+
+	def _run(self):
+		while True:
+			with self._condition:
+				batch = self._next_batch()
+				while batch is None:
+					if self._stopped:
+						return
+					self._condition.wait(timeout=self._time_until_ready())
+					batch = self._next_batch()
+			runner, items, futures = batch
+			try:
+				results = runner(items)
+			except Exception as e:
+				for future in futures:
+					future.set_exception(e)
+			else:
+				for future, result in zip(futures, results):
+					future.set_result(result)
+
+	def _next_batch(self):
+		"""
+		在就绪的分组（凑满批次或等待超时）中取出最早请求等待最久的分组的至多max_batch_size个请求
+		按最早请求而非分组的到达顺序选择，持续有请求的繁忙分组不会让其他分组一直等待
+		"""
+		now = time.monotonic()
+		ready = [
+			group_key for group_key, entries in self._groups.items()
+			if len(entries) >= self.max_batch_size or now - entries[0][0] >= self.max_wait
+		]
+		if not ready:
+			return None
+		group_key = min(ready, key=lambda key: self._groups[key][0][0])
+		entries = self._groups[group_key]
+		taken, remaining = entries[:self.max_batch_size], entries[self.max_batch_size:]
+		runner = self._runners[group_key]
+		if remaining:
+			self._groups[group_key] = remaining
+		else:
+			del self._groups[group_key]
+			del self._runners[group_key]
+		# 跳过已被取消的请求
+		taken = [(item, future) for _, item, future in taken if future.set_running_or_notify_cancel()]
+		if not taken:
+			return self._next_batch()
+		return runner, [item for item, _ in taken], [future for _, future in taken]
+
+	def _time_until_ready(self) -> Optional[float]:
+		"""距离最早的分组等待超时的时间，队列为空时返回None（无限等待）"""
+		if not self._groups:
+			return None
+		oldest = min(entries[0][0] for entries in self._groups.values())
+		return max(oldest + self.max_wait - time.monotonic(), 0)
@@ -1,5 +1,6 @@
+from app.core.Configurable import build_metadata_registry
 from .base import LogitsWatermark, SemanticWatermark, WatermarkBase
-from .dip import DIPWatermark
+from .dip import DIPWatermark, cache_stats as dip_cache_stats
 
 # 定义各算法的类型
 WATERMARK_TYPES = {
@@ -11,6 +12,14 @@ WATERMARK_ALGORITHMS = {
 	"dip": DIPWatermark,
 	# "semstamp": SemStampWatermark,
 }
+# 导入时一次性计算的只读算法元数据（描述、类型、默认参数），列举算法时无需实例化
+WATERMARK_METADATA = build_metadata_registry(
+	WATERMARK_ALGORITHMS,
+	type={
+		name: "logits" if issubclass(algo_class, LogitsWatermark) else "semantic"
+		for name, algo_class in WATERMARK_ALGORITHMS.items()
+	}
+)
 
 
 def get_watermark_algorithm(name: str, **kwargs) -> WatermarkBase:
@@ -29,11 +38,23 @@ def get_watermark_algorithm(name: str, **kwargs) -> WatermarkBase:
 	return WATERMARK_ALGORITHMS[name](**kwargs)
 
 
+from .registry import detection_cache, detection_cache_key, watermark_pool, WatermarkPool
+from .sessions import detection_sessions, DetectionSessionStore
+
+
 __all__ = [
 	"WatermarkBase",
 	"LogitsWatermark",
 	"SemanticWatermark",
 	"DIPWatermark",
+	"dip_cache_stats",
 	"get_watermark_algorithm",
-	"WATERMARK_ALGORITHMS"
+	"WATERMARK_ALGORITHMS",
+	"WATERMARK_METADATA",
+	"watermark_pool",
+	"WatermarkPool",
+	"detection_cache",
+	"detection_cache_key",
+	"detection_sessions",
+	"DetectionSessionStore"
 ]
@@ -1,13 +1,13 @@
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import torch
 from transformers import LogitsProcessor
 
 from app.core.Configurable import configurable, ConfigField
+from app.core.profiling import StageTimer
 from app.models.GenerationConfig import GenerationConfig
-from app.models.llm import llm_service
 
 
 @configurable
@@ -54,7 +54,8 @@ class WatermarkBase(ABC):
 			repetition_penalty=self.repetition_penalty,
 			length_penalty=self.length_penalty,
 			no_repeat_ngram_size=self.no_repeat_ngram_size,
-			logits_processor=llm_service.processors,
+			# logits处理器由每次embed调用单独传入，避免并发请求共享全局处理器列表
+			logits_processor=None,
 		)
 
 	@abstractmethod
@@ -69,6 +70,28 @@ class WatermarkBase(ABC):
 		"""
 		pass
 	
+	def embed_profiled(self, prompt: Any, timer: StageTimer) -> str:
+		"""
+		嵌入水印并把各阶段耗时记入timer，默认只记录整体耗时，可细分阶段的算法可重写
+		Args:
+			prompt: 输入文本提示
+			timer: 分阶段计时器
+		Returns:
+			包含处理后的文本
+		"""
+		with timer.stage("embed"):
+			return self.embed(prompt)
+	
+	def embed_batch(self, prompts: List[Any]) -> List[str]:
+		"""
+		批量嵌入水印，默认逐条调用embed，支持批量生成的算法可重写
+		Args:
+			prompts: 输入文本提示列表
+		Returns:
+			与输入顺序一致的处理后文本列表
+		"""
+		return [self.embed(prompt) for prompt in prompts]
+	
 	@abstractmethod
 	def detect(self, text: str,  **kwargs) -> Dict[str, Any]:
 		"""
@@ -82,6 +105,31 @@ class WatermarkBase(ABC):
 		"""
 		pass
 	
+	@property
+	def detection_requires_model(self) -> bool:
+		"""
+		检测是否需要模型权重（而不仅是分词器），为True时不能交给无模型检测进程
+		"""
+		return False
+	
+	@property
+	def provides_token_quantiles(self) -> bool:
+		"""
+		为True时detect/detect_batch支持keep_quantiles参数，在结果中附带逐token分位数（用于阈值校准）
+		"""
+		return False
+	
+	def detect_batch(self, texts: List[str], **kwargs) -> List[Dict[str, Any]]:
+		"""
+		批量检测水印，默认逐条调用detect，支持批量分词的算法可重写
+		Args:
+			texts: 待检测文本列表
+			**kwargs: 传给detect的其他参数
+		Returns:
+			与输入顺序一致的检测结果列表
+		"""
+		return [self.detect(text, **kwargs) for text in texts]
+	
 	@abstractmethod
 	def visualize(self, text: str) -> Dict[str, Any]:
 		"""
@@ -94,6 +142,14 @@ class WatermarkBase(ABC):
 		"""
 		pass
 
+	
+	def analyze(self, text: str) -> Dict[str, Any]:
+		"""
+		同时返回检测结果与可视化数据，默认分别调用detect与visualize，
+		能在一次打分中得到两者的算法可重写
+		"""
+		return {**self.detect(text), **self.visualize(text)}
+
 
 
 
@@ -0,0 +1,82 @@
+"""Keyed pseudo-random permutations of the DiP ciphers.
+
+v1 is the original ``torch.randperm`` cipher (kept in ``DIPWatermark.from_random``).
+v2 is a 4-round Feistel network over an even-bit domain, restricted to the vocab by
+cycle walking, so a token's rank costs O(1) without materializing the permutation.
+Only operators shared by NumPy arrays and torch tensors are used: detection ranks
+tokens in pure NumPy and embedding shuffles a whole vocab on device with the same code.
+"""
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+CIPHER_V1 = "v1"
+CIPHER_V2 = "v2"
+CIPHER_VERSIONS = (CIPHER_V1, CIPHER_V2)
+
+FEISTEL_ROUNDS = 4
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_ROUND_MULTIPLIER = 0x045D9F3B
+
+
+def round_keys(seed: int) -> List[int]:
+    """Derive the 32-bit round keys of a seed with splitmix64."""
+    keys = []
+    state = seed
+    for _ in range(FEISTEL_ROUNDS):
+        state = (state + 0x9E3779B97F4A7C15) & _MASK64
+        z = state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        z ^= z >> 31
+        keys.append(z & _MASK32)
+    return keys
+
+
+def stack_round_keys(seeds: Iterable[int]) -> np.ndarray:
+    """Round keys of many seeds as an int64 array of shape (FEISTEL_ROUNDS, len(seeds))."""
+    return np.array([round_keys(seed) for seed in seeds], dtype=np.int64).reshape(-1, FEISTEL_ROUNDS).T
+
+
+def half_bits(domain_size: int) -> int:
+    """Bit width of one Feistel half for a domain of ``domain_size`` elements."""
+    bits = max(2, (domain_size - 1).bit_length())
+    return (bits + 1) // 2
+
+
+def _round_function(x, key, half_mask: int):
+    """Integer mixing function; every intermediate stays below 2**59 so int64 never overflows."""
+    x = (x ^ key) & _MASK32
+    x = (x * _ROUND_MULTIPLIER) & _MASK32
+    x = x ^ (x >> 16)
+    x = (x * _ROUND_MULTIPLIER) & _MASK32
+    x = x ^ (x >> 16)
+    return x & half_mask
+
+
+def _feistel(x, keys: Sequence, bits: int):
+    half_mask = (1 << bits) - 1
+    left, right = x >> bits, x & half_mask
+    for key in keys:
+        left, right = right, left ^ _round_function(right, key, half_mask)
+    return (left << bits) | right
+
+
+def _cycle_walk(x, keys: Sequence, domain_size: int):
+    bits = half_bits(domain_size)
+    y = _feistel(x, keys, bits)
+    outside = y >= domain_size
+    while outside.any():
+        y = y + outside * (_feistel(y, keys, bits) - y)
+        outside = y >= domain_size
+    return y
+
+
+def rank(tokens, keys: Sequence, domain_size: int):
+    """Rank (position in the shuffled order) of each token; O(1) expected per token.
+
+    ``keys`` is a per-round sequence of ints or arrays broadcastable against ``tokens``,
+    e.g. one column of :func:`stack_round_keys` per token.
+    """
+    return _cycle_walk(tokens, keys, domain_size)
@@ -1,46 +1,289 @@
 import torch
 import hashlib
+import numpy as np
 import torch.nn.functional as F
 from math import sqrt
-from typing import Any, Dict, Union, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Union, Tuple
 from pydantic import BaseModel, Field
-from transformers import LogitsProcessor
+from transformers import LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList, TopPLogitsWarper
+from transformers.generation.streamers import BaseStreamer
 
+from app.core.cache import LRUCache
+from app.core.config import cfg
 from app.core.Configurable import ConfigField
+from app.core.profiling import NULL_TIMER, StageTimer
 from app.models.llm import llm_service
 from app.models.GenerationConfig import GenerationConfig
-from app.watermarks import LogitsWatermark
+from app.watermarks import LogitsWatermark, cipher
+from app.watermarks.dip_engine import (
+    CONTEXT_CODING_ROLLING, CONTEXT_CODINGS, DipDetectionEngine, DipDetectionSession, quantile_z_scores,
+    ROLLING_DIGEST_INIT, rolling_digest
+)
+
+# vocab size the DiP permutations are drawn over during detection
+DETECTION_VOCAB_SIZE = 50272
+
+# how detection re-derives the entropy gate of entropy-gated watermarks
+ENTROPY_SCORER_MODEL = "model"
+ENTROPY_SCORER_NONE = "none"
+ENTROPY_SCORERS = (ENTROPY_SCORER_MODEL, ENTROPY_SCORER_NONE)
+
+# reweight_logits implementations selectable through cfg.DIP_REWEIGHT_IMPL
+REWEIGHT_REFERENCE = "reference"
+REWEIGHT_FUSED = "fused"
+REWEIGHT_COMPILED = "compiled"
+REWEIGHT_IMPLS = (REWEIGHT_REFERENCE, REWEIGHT_FUSED, REWEIGHT_COMPILED)
+
+
+def fused_reweight(p_logits: torch.FloatTensor, shuffle: torch.LongTensor, alpha: float,
+                   buffers: Tuple[torch.Tensor, ...] = None) -> torch.FloatTensor:
+    """Same reweighting as ``DIPWatermark.reweight_logits`` with far fewer vocab-sized temporaries.
+
+    The share of a token's probability mass lying right of a threshold ``a`` is
+    ``clamp((c - a) / p, 0, 1)`` with ``p`` its probability and ``c`` the cumulative sum up to
+    it in shuffled order, which replaces both boundary searches and their scatters. The result
+    is scattered back through ``shuffle``, so the inverse permutation is not needed.
+    ``buffers`` are four tensors shaped like ``p_logits`` that are overwritten in place;
+    without them fresh tensors are allocated (the form used under ``torch.compile``).
+    """
+    s_logits, s_p, s_cumsum, s_portion = buffers or (None, None, None, None)
+    s_logits = torch.gather(p_logits, -1, shuffle, out=s_logits)
+    s_p = torch.sub(s_logits, torch.logsumexp(s_logits, dim=-1, keepdim=True), out=s_p).exp_()
+    s_cumsum = torch.cumsum(s_p, dim=-1, out=s_cumsum)
+
+    # tokens without mass never straddle a threshold: 0/0 -> 0, +-x/0 -> 1 or 0 after clamping
+    s_portion = torch.sub(s_cumsum, alpha, out=s_portion).div_(s_p).nan_to_num_(0.0).clamp_(0, 1)
+    s_portion_2 = s_cumsum.sub_(1 - alpha).div_(s_p).nan_to_num_(0.0).clamp_(0, 1)
+    s_shift_logits = s_portion.add_(s_portion_2).mul_(0.5).log_()
+
+    return torch.empty_like(p_logits).scatter_(-1, shuffle, s_logits.add_(s_shift_logits))
+
+
+def step_entropy(logits: torch.FloatTensor) -> torch.FloatTensor:
+    """Shannon entropy (nats) of the next-token distribution of every row."""
+    return torch.special.entr(F.softmax(logits.float(), dim=-1)).sum(dim=-1)
+
+
+_compiled_fused_reweight = None
+
+
+def compiled_fused_reweight(p_logits: torch.FloatTensor, shuffle: torch.LongTensor, alpha: float) -> torch.FloatTensor:
+    """``fused_reweight`` wrapped with ``torch.compile`` on first use."""
+    global _compiled_fused_reweight
+    if _compiled_fused_reweight is None:
+        _compiled_fused_reweight = torch.compile(fused_reweight, dynamic=True)
+    return _compiled_fused_reweight(p_logits, shuffle, alpha)
+
+
+# (key, context_code) -> seed and (cipher_version, seed, vocab_size, device) -> (shuffle, unshuffle).
+# Shared by every DIPWatermark of the process (pooled instances included) and by generation and
+# detection, so the configured byte budgets bound the whole process rather than each instance.
+_SEED_CACHE = LRUCache(
+    cfg.DIP_SEED_CACHE_BYTES, lambda cache_key, seed: len(cache_key[0]) + len(cache_key[1]) + 128
+)
+_PERMUTATION_CACHE = LRUCache(
+    cfg.DIP_PERMUTATION_CACHE_BYTES,
+    lambda cache_key, perms: sum(t.element_size() * t.nelement() for t in perms) + 128
+)
+
+
+def _host_ids(input_ids) -> np.ndarray:
+    """Token ids as an int64 host array, from a tensor or any sequence of ids."""
+    if isinstance(input_ids, torch.Tensor):
+        return input_ids.detach().cpu().numpy()
+    return np.asarray(input_ids, dtype=np.int64)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss counters of the process-wide seed and permutation caches."""
+    return {
+        "seed": _SEED_CACHE.stats(),
+        "permutation": _PERMUTATION_CACHE.stats(),
+    }
+
+
+class DipState:
+    """Request-scoped DiP state: the mode and context-code histories of one embed/detect call.
+
+    Rows of a batch are split into groups of ``rows_per_group`` consecutive rows (the rows
+    generated for one prompt); each group keeps its own history. 0 puts every row in one group.
+    ``pad_lengths`` holds the left padding of every row of a padded batch. ``timer`` collects
+    the per-stage timings of a profiled call; the default one records nothing.
+    """
+    GENERATION = 0
+    DETECTION = 1
+
+    def __init__(self, mode: int, rows_per_group: int = 0, pad_lengths: np.ndarray = None,
+                 timer: StageTimer = NULL_TIMER):
+        self.mode = mode
+        self.timer = timer
+        self.rows_per_group = rows_per_group
+        self.pad_lengths = pad_lengths
+        self.histories: Dict[int, set] = {}
+        # scratch tensors reused by the fused reweighting across decoding steps
+        self.buffers: Dict[Tuple, Tuple[torch.Tensor, ...]] = {}
+        # rolling context coding: batch row -> (number of unpadded context tokens, their digest)
+        self.digests: Dict[int, Tuple[int, bytes]] = {}
+        # beam search only: (rows, ids) of the previous step, to find the row each row continues
+        self.previous_ids: Optional[Tuple[np.ndarray, torch.Tensor]] = None
+
+    @property
+    def cc_history(self) -> set:
+        """History of the first (or only) group."""
+        return self.history(0)
+
+    def history(self, group: int) -> set:
+        return self.histories.setdefault(group, set())
+
+    def reweight_buffers(self, like: torch.Tensor, count: int = 4) -> Tuple[torch.Tensor, ...]:
+        """``count`` scratch tensors shaped like ``like``, allocated once per shape for this call."""
+        key = (tuple(like.shape), like.dtype, like.device, count)
+        buffers = self.buffers.get(key)
+        if buffers is None:
+            buffers = tuple(torch.empty_like(like) for _ in range(count))
+            self.buffers[key] = buffers
+        return buffers
+
+    def context_digests(self, input_ids: torch.LongTensor, rows: np.ndarray, reorders: bool = False) -> List[bytes]:
+        """Rolling digests of the unpadded contexts of ``input_ids``, whose batch rows are ``rows``.
+
+        Each row's cached digest is extended by the tokens it does not cover yet, normally just
+        the newest one, so only the last columns of input_ids are copied to the host. Beam search
+        (``reorders``) moves rows between steps: each row then takes the cached digest of the
+        previous-step row its ids continue, matched on device. Rows without one start over.
+        """
+        lengths = input_ids.shape[-1] - self.row_pad_lengths(rows)
+        if reorders:
+            cached = self._previous_digests(input_ids)
+        else:
+            cached = [self.digests.get(int(row)) for row in rows]
+        covered = np.array([
+            entry[0] if entry is not None and entry[0] <= length else 0 for entry, length in zip(cached, lengths)
+        ], dtype=np.int64)
+        missing = int((lengths - covered).max()) if len(rows) else 0
+        tails = input_ids[:, input_ids.shape[-1] - missing:].detach().cpu().numpy()
+
+        digests = []
+        for i, row in enumerate(rows):
+            new_tokens = tails[i, missing - (lengths[i] - covered[i]):]
+            digest = rolling_digest(new_tokens, cached[i][1] if covered[i] else ROLLING_DIGEST_INIT)
+            self.digests[int(row)] = (int(lengths[i]), digest)
+            digests.append(digest)
+        if reorders:
+            self.previous_ids = (rows, input_ids)
+        return digests
+
+    def _previous_digests(self, input_ids: torch.LongTensor) -> List[Optional[Tuple[int, bytes]]]:
+        """Cached digest of the previous-step row that each row of ``input_ids`` continues."""
+        if self.previous_ids is None or self.previous_ids[1].shape[-1] > input_ids.shape[-1]:
+            return [None] * input_ids.shape[0]
+        previous_rows, previous_ids = self.previous_ids
+        # row i continues previous row j when it starts with all of row j's ids (padding included)
+        matches = (input_ids[:, None, :previous_ids.shape[-1]] == previous_ids[None]).all(dim=-1).cpu().numpy()
+        parents = [previous_rows[row_matches] for row_matches in matches]
+        return [self.digests.get(int(candidates[0])) if len(candidates) else None for candidates in parents]
+
+    def row_groups(self, rows: np.ndarray) -> np.ndarray:
+        """Group index of the given batch rows."""
+        if self.rows_per_group <= 0:
+            return np.zeros(len(rows), dtype=np.int64)
+        return rows // self.rows_per_group
+
+    def row_pad_lengths(self, rows: np.ndarray) -> np.ndarray:
+        """Left padding of the given batch rows."""
+        if self.pad_lengths is None:
+            return np.zeros(len(rows), dtype=np.int64)
+        return self.pad_lengths[rows]
 
 
 class DipProcessor(LogitsProcessor):
     """Logits processor for watermarking"""
 
-    def __init__(self, watermark_instance):
+    def __init__(self, watermark_instance, state: DipState = None):
         self.watermark = watermark_instance
+        # one processor (and state) per generate call, so concurrent calls never share history
+        self.state = state or DipState(DipState.GENERATION)
 
-    def _apply_watermark(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> Tuple[
+    def _apply_watermark(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, rows: np.ndarray = None,
+                         candidate_ids: torch.LongTensor = None, vocab_size: int = None) -> Tuple[
         torch.FloatTensor, torch.FloatTensor]:
-        """Apply watermark to the scores."""
-        mask, seeds = self.watermark.get_seed_for_cipher(input_ids)
-
-        rng = [
-            torch.Generator(device=scores.device).manual_seed(seed) for seed in seeds
-        ]
-        mask = torch.tensor(mask, device=scores.device)
-        shuffle = self.watermark.from_random(
-            rng, scores.size(1)
-        )
+        """Apply watermark to the scores.
+
+        With ``candidate_ids`` the scores are the logits of those candidate tokens only, and they
+        are reweighted in the order the candidates take in each row's permutation of the vocab.
+        """
+        timer = self.state.timer
+        mask, seeds = self.watermark.get_seed_for_cipher(input_ids, self.state, rows)
 
-        reweighted_scores = self.watermark.reweight_logits(shuffle, scores)
+        if candidate_ids is not None:
+            with timer.stage("permutations"):
+                order = torch.argsort(self.watermark.get_ranks(seeds, candidate_ids, vocab_size), dim=-1)
+            with timer.stage("reweight"):
+                return mask, fused_reweight(scores, order, self.watermark.alpha)
+
+        with timer.stage("permutations"):
+            shuffle, unshuffle = self.watermark.get_permutations(seeds, scores.size(1), scores.device, timer)
+
+        with timer.stage("reweight"):
+            reweight_impl = self.watermark.reweight_impl
+            if reweight_impl == REWEIGHT_FUSED:
+                reweighted_scores = fused_reweight(
+                    scores, shuffle, self.watermark.alpha, self.state.reweight_buffers(scores)
+                )
+            elif reweight_impl == REWEIGHT_COMPILED:
+                reweighted_scores = compiled_fused_reweight(scores, shuffle, self.watermark.alpha)
+            else:
+                reweighted_scores = self.watermark.reweight_logits(shuffle, scores, unshuffle)
 
         return mask, reweighted_scores
 
     def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
         """Process logits to add watermark."""
+        with self.state.timer.stage("processor"):
+            return self._watermark_step(input_ids, scores)
+
+    def _watermark_step(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        timer = self.state.timer
+        eligible = None
+        if self.watermark.entropy_threshold > 0:
+            # near-deterministic steps are neither hashed nor reweighted, and stay out of the history
+            with timer.stage("entropy_gate"):
+                eligible = (step_entropy(scores) >= self.watermark.entropy_threshold).cpu().numpy()
+
+        if not self.watermark.candidate_reweight:
+            return self._process_rows(input_ids, scores, eligible=eligible)
+
+        # sampling can only pick the candidates left by temperature/top-k/top-p: reweight just those
+        with timer.stage("candidates"):
+            candidate_ids, candidate_scores = self.watermark.get_candidates(scores)
+        candidate_scores = self._process_rows(input_ids, candidate_scores, candidate_ids, scores.size(1), eligible)
+        return torch.full_like(scores, -float("inf")).scatter_(-1, candidate_ids, candidate_scores)
+
+    def _process_rows(self, input_ids: torch.LongTensor, scores: torch.FloatTensor,
+                      candidate_ids: torch.LongTensor = None, vocab_size: int = None,
+                      eligible: np.ndarray = None) -> torch.FloatTensor:
         if input_ids.shape[-1] < self.watermark.prefix_length:
             return scores
 
-        mask, reweighted_scores = self._apply_watermark(input_ids, scores)
+        # rows whose unpadded context is still shorter than prefix_length are left untouched
+        batch_rows = np.arange(input_ids.shape[0])
+        active = input_ids.shape[-1] - self.state.row_pad_lengths(batch_rows) >= self.watermark.prefix_length
+        rows = batch_rows[active if eligible is None else active & eligible]
+        if len(rows) == 0:
+            return scores
+        if len(rows) == len(batch_rows):
+            return self._process(input_ids, scores, rows, candidate_ids, vocab_size)
+
+        index = torch.as_tensor(rows, device=scores.device)
+        processed_scores = scores.clone()
+        processed_scores[index] = self._process(
+            input_ids[index], scores[index], rows, None if candidate_ids is None else candidate_ids[index], vocab_size
+        )
+        return processed_scores
+
+    def _process(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, rows: np.ndarray,
+                 candidate_ids: torch.LongTensor = None, vocab_size: int = None) -> torch.FloatTensor:
+        mask, reweighted_scores = self._apply_watermark(input_ids, scores, rows, candidate_ids, vocab_size)
 
         if self.watermark.ignore_history_generation:
             return reweighted_scores
@@ -48,6 +291,39 @@ class DipProcessor(LogitsProcessor):
             return torch.where(mask[:, None], scores, reweighted_scores)
 
 
+class RowMinNewTokens(LogitsProcessor):
+    """Forbid EOS in every row until it has generated its own minimum number of new tokens.
+
+    ``min_length`` counts the prompt, and in a left-padded batch the padding too, so a batch
+    needs one minimum per row to match generating each prompt alone.
+    """
+
+    def __init__(self, prompt_width: int, min_new_tokens: np.ndarray, eos_token_ids: List[int]):
+        self.prompt_width = prompt_width
+        self.min_new_tokens = torch.as_tensor(min_new_tokens)
+        self.eos_token_ids = torch.as_tensor(eos_token_ids)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        short = (input_ids.shape[-1] - self.prompt_width < self.min_new_tokens).to(scores.device)
+        if not short.any():
+            return scores
+        scores = scores.clone()
+        eos = self.eos_token_ids.to(scores.device)
+        scores[:, eos] = torch.where(short[:, None], -float("inf"), scores[:, eos])
+        return scores
+
+
+class RowMaxNewTokens(StoppingCriteria):
+    """Finish every row once it has generated its own maximum number of new tokens (see RowMinNewTokens)."""
+
+    def __init__(self, prompt_width: int, max_new_tokens: np.ndarray):
+        self.prompt_width = prompt_width
+        self.max_new_tokens = torch.as_tensor(max_new_tokens)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return (input_ids.shape[-1] - self.prompt_width >= self.max_new_tokens).to(input_ids.device)
+
+
 class DIPWatermark(LogitsWatermark):
     """DiP watermarking algorithm implementation"""
     key = ConfigField()
@@ -57,102 +333,403 @@ class DIPWatermark(LogitsWatermark):
     ignore_history_detection = ConfigField()
     z_threshold = ConfigField()
     prefix_length = ConfigField()
+    cipher_version = ConfigField()
+    candidate_reweight = ConfigField()
+    entropy_threshold = ConfigField()
+    entropy_scorer = ConfigField()
+    context_coding = ConfigField()
+    sequential_detection = ConfigField()
+    sequential_chunk_size = ConfigField()
+    sprt_alpha = ConfigField()
+    sprt_beta = ConfigField()
+    sprt_green_rate = ConfigField()
     def __init__(self, key="your key", gamma=0.5, alpha=0.45, ignore_history_generation=False,
-                 ignore_history_detection=False, z_threshold=1.513, prefix_length=5,*args, **kwargs):
+                 ignore_history_detection=False, z_threshold=1.513, prefix_length=5, cipher_version="v1",
+                 candidate_reweight=False, entropy_threshold=0.0, entropy_scorer="model", context_coding="full",
+                 sequential_detection=False, sequential_chunk_size=64, sprt_alpha=0.01, sprt_beta=0.01,
+                 sprt_green_rate=None, *args, **kwargs):
         """Initialize the DiP watermark parameters"""
 
         super().__init__(*args, **kwargs)
+        if cipher_version not in cipher.CIPHER_VERSIONS:
+            raise ValueError(f"Unknown DiP cipher version: {cipher_version}")
+        # v1: torch.randperm permutation, v2: keyed Feistel permutation (see app.watermarks.cipher)
+        self.cipher_version = cipher_version
+        # reweight only the candidates left by temperature/top-k/top-p instead of the whole vocab
+        self.candidate_reweight = candidate_reweight
+        if entropy_scorer not in ENTROPY_SCORERS:
+            raise ValueError(f"Unknown DiP entropy scorer: {entropy_scorer}")
+        # steps whose entropy (nats) is below the threshold are skipped, 0 disables the gate;
+        # detection re-derives the entropy with the loaded model ("model") or scores every token ("none")
+        self.entropy_threshold = entropy_threshold
+        self.entropy_scorer = entropy_scorer
+        if context_coding not in CONTEXT_CODINGS:
+            raise ValueError(f"Unknown DiP context coding: {context_coding}")
+        # prefix_length=0 only: "full" serializes the whole context, "rolling" extends a digest per token
+        self.context_coding = context_coding
+        # sequential (SPRT) detection: score chunk by chunk and stop once the evidence decides;
+        # sprt_alpha / sprt_beta bound the false positive / false negative rates, sprt_green_rate is
+        # the green token rate expected under the watermark (default: 0.1 above the 1 - gamma null rate)
+        if not 0 < sprt_alpha < 1 or not 0 < sprt_beta < 1:
+            raise ValueError("DiP sprt_alpha and sprt_beta must lie in (0, 1)")
+        if sprt_green_rate is not None and not 1 - gamma < sprt_green_rate < 1:
+            raise ValueError("DiP sprt_green_rate must lie in (1 - gamma, 1)")
+        if sequential_chunk_size < 1:
+            raise ValueError("DiP sequential_chunk_size must be positive")
+        self.sequential_detection = sequential_detection
+        self.sequential_chunk_size = sequential_chunk_size
+        self.sprt_alpha = sprt_alpha
+        self.sprt_beta = sprt_beta
+        self.sprt_green_rate = sprt_green_rate
         self.gamma = gamma
         self.alpha = alpha
         self.ignore_history_generation = ignore_history_generation
         self.ignore_history_detection = ignore_history_detection
         self.z_threshold = z_threshold
         self.prefix_length = prefix_length
-        self.cc_history = set()
-        self.state_indicator = 1  # 0 for generation, 1 for detection
         self.key = key
-        llm_service.clear_processors()
-        llm_service.add_processor(DipProcessor(self))
-    def embed(self, prompt: str) -> str:
-        """Embed watermark into logits"""
-        # 生成模式
-        self.state_indicator = 0
+        if cfg.DIP_REWEIGHT_IMPL not in REWEIGHT_IMPLS:
+            raise ValueError(f"Unknown DiP reweight implementation: {cfg.DIP_REWEIGHT_IMPL}")
+        # reference / fused / compiled, a server setting: every implementation gives the same distribution
+        self.reweight_impl = cfg.DIP_REWEIGHT_IMPL
+
+    def embed(self, prompt: str, streamer: BaseStreamer = None,
+              stopping_criteria: StoppingCriteriaList = None) -> str:
+        """Embed watermark into logits, optionally pushing tokens to a streamer as they are produced.
+
+        ``stopping_criteria`` can end the generation early, e.g. when a streaming client disconnects.
+        """
+        if streamer is not None and self._rows_per_prompt() > 1:
+            raise ValueError("Streaming only supports num_beams=1 and num_return_sequences=1")
+        return self._generate([prompt], streamer=streamer, stopping_criteria=stopping_criteria)[0]
+
+    def embed_profiled(self, prompt: str, timer: StageTimer) -> str:
+        """Embed watermark into logits, recording the time of every generation stage into timer"""
+        return self._generate([prompt], timer=timer)[0]
+
+    def embed_batch(self, prompts: List[str], token_budget: int = None) -> List[str]:
+        """Embed watermarks into many prompts, one left-padded generate call per batch.
+
+        Batches are sized so that rows * expected sequence length stays within token_budget
+        (cfg.EMBED_TOKEN_BUDGET by default); every prompt keeps its own DiP history.
+        """
+        if not prompts:
+            return []
+        lengths = [len(ids) for ids in llm_service.tokenizer(prompts, add_special_tokens=True)["input_ids"]]
+        watermarked_texts = [None] * len(prompts)
+        for batch in self._plan_batches(lengths, token_budget or cfg.EMBED_TOKEN_BUDGET):
+            for index, text in zip(batch, self._generate([prompts[i] for i in batch])):
+                watermarked_texts[index] = text
+        return watermarked_texts
+
+    def _rows_per_prompt(self) -> int:
+        """Number of rows generate expands every prompt into (beams or returned sequences)."""
+        if self.num_beams and self.num_beams > 1:
+            return self.num_beams
+        return self.num_return_sequences or 1
+
+    def _plan_batches(self, lengths: List[int], token_budget: int) -> List[List[int]]:
+        """Group prompt indices by length into batches whose padded token count fits the budget."""
+        rows_per_prompt = self._rows_per_prompt()
+        batches, current = [], []
+        for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+            # prompts are visited shortest first, so the newest one is the longest of the batch
+            sequence_length = max(self.max_length or 20, lengths[index])
+            if current and (len(current) + 1) * rows_per_prompt * sequence_length > token_budget:
+                batches.append(current)
+                current = []
+            current.append(index)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _generate(self, prompts: List[str], streamer: BaseStreamer = None, timer: StageTimer = NULL_TIMER,
+                  stopping_criteria: StoppingCriteriaList = None) -> List[str]:
+        """Run one watermarked generate call over a left-padded batch of prompts."""
+        tokenizer = llm_service.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
         # encode prompt
-        encoded_prompt = llm_service.tokenizer(prompt, return_tensors="pt", add_special_tokens=True).to(
-            llm_service.device)
+        with timer.stage("tokenize"):
+            encoded_prompt = tokenizer(
+                prompts, return_tensors="pt", add_special_tokens=True, padding=True, padding_side="left"
+            ).to(llm_service.device)
+        # 每次生成使用独立的状态和处理器列表，不修改全局处理器；每个prompt的行拥有独立的历史
+        rows_per_prompt = self._rows_per_prompt()
+        pad_lengths = (encoded_prompt["attention_mask"] == 0).sum(dim=-1).cpu().numpy()
+        state = DipState(
+            DipState.GENERATION, rows_per_group=rows_per_prompt, pad_lengths=np.repeat(pad_lengths, rows_per_prompt),
+            timer=timer
+        )
+        generation_kwargs = self.generation_config.to_dict()
+        prompt_width = encoded_prompt["input_ids"].shape[-1]
+        budgets = self._row_new_token_budgets(generation_kwargs, prompt_width, pad_lengths, rows_per_prompt)
+        processors = LogitsProcessorList([DipProcessor(self, state)])
+        stopping_criteria = StoppingCriteriaList(stopping_criteria or [])
+        if budgets is not None:
+            max_new_tokens, min_new_tokens = budgets
+            if min_new_tokens.any():
+                eos_token_ids = llm_service.model.generation_config.eos_token_id
+                if eos_token_ids is None:
+                    eos_token_ids = tokenizer.eos_token_id
+                processors.insert(0, RowMinNewTokens(prompt_width, min_new_tokens, np.atleast_1d(eos_token_ids).tolist()))
+            stopping_criteria.append(RowMaxNewTokens(prompt_width, max_new_tokens))
+        if self.candidate_reweight:
+            # the processor already applied temperature/top-k/top-p before reweighting the candidates
+            generation_kwargs.update(temperature=1.0, top_k=0, top_p=1.0)
         # 生成水印文本
-        encoded_watermarked_text = llm_service.model.generate(**encoded_prompt,**self.generation_config.to_dict())
-        # 解码
-        watermarked_text = llm_service.tokenizer.batch_decode(encoded_watermarked_text, skip_special_tokens=True)[0]
-        # 清除记录
-        self.cc_history.clear()
-        return watermarked_text
-
-    def detect(self, text: str,  **kwargs) -> Dict[str, Any]:
-        """Detect watermark in text"""
-        self.state_indicator = 1  # Set to detection mode
-
-        # Get tokenizer from kwargs
-
-        encoded_text = llm_service.tokenizer(text, return_tensors="pt", add_special_tokens=False)["input_ids"][0].to(llm_service.device)
-        # Compute z-score using a utility method
-        z_score, _ = self.score_sequence(encoded_text)
-        is_watermarked = z_score > self.z_threshold
-        # Clear the history
-        self.cc_history.clear()
+        generate_before, processor_before = timer.total("generate"), timer.total("processor")
+        with timer.stage("generate"):
+            encoded_watermarked_text = llm_service.model_generate(
+                **encoded_prompt, **generation_kwargs, logits_processor=processors,
+                pad_token_id=tokenizer.pad_token_id, streamer=streamer, stopping_criteria=stopping_criteria
+            )
+        # what generate spent outside the watermark processor: forward passes, sampling, bookkeeping
+        timer.record(
+            "model_forward",
+            (timer.total("generate") - generate_before) - (timer.total("processor") - processor_before)
+        )
+        # 解码，每个prompt取第一条返回序列
+        with timer.stage("decode"):
+            encoded_watermarked_text = encoded_watermarked_text[::self.num_return_sequences or 1]
+            if budgets is not None:
+                # beam search only stops once every row is done: cut each prompt back to its own budget
+                encoded_watermarked_text = [
+                    row[:prompt_width + budget]
+                    for row, budget in zip(encoded_watermarked_text, max_new_tokens[::rows_per_prompt])
+                ]
+            watermarked_texts = tokenizer.batch_decode(encoded_watermarked_text, skip_special_tokens=True)
+        return watermarked_texts
+
+    def _row_new_token_budgets(self, generation_kwargs: Dict[str, Any], prompt_width: int, pad_lengths: np.ndarray,
+                               rows_per_prompt: int):
+        """Turn max_length/min_length into per-row (max, min) new-token budgets of a left-padded batch.
+
+        Both lengths count the prompt, and generate measures the prompt with its padding, so a
+        short prompt in a batch would get fewer new tokens than alone. They are removed from
+        ``generation_kwargs`` and generate gets the largest budget as max_new_tokens instead.
+        Returns None when max_new_tokens is configured directly: it is the same for every row.
+        """
+        if "max_new_tokens" in generation_kwargs:
+            return None
+        max_length = generation_kwargs.pop("max_length", None) or llm_service.model.generation_config.max_length
+        min_length = generation_kwargs.pop("min_length", None) or 0
+        prompt_lengths = np.repeat(prompt_width - pad_lengths, rows_per_prompt)
+        # like generate, a prompt already at max_length still gets one new token
+        max_new_tokens = np.maximum(max_length - prompt_lengths, 1)
+        min_new_tokens = np.minimum(np.maximum(min_length - prompt_lengths, 0), max_new_tokens)
+        generation_kwargs["max_new_tokens"] = int(max_new_tokens.max())
+        return max_new_tokens, min_new_tokens
+
+    def detect(self, text: str, tokenizer=None, device=None, keep_quantiles=False, **kwargs) -> Dict[str, Any]:
+        """Detect watermark in text
+
+        Detection only needs a tokenizer, so the llm_service tokenizer and device can be
+        overridden (e.g. by a model-free detection worker). With ``keep_quantiles`` the
+        per-token quantiles are returned too, for threshold calibration.
+        """
+        tokenizer = tokenizer or llm_service.tokenizer
+        device = device or llm_service.device
+        # the ids stay on the host: the v2 cipher ranks them in NumPy, only v1 permutations use the device
+        input_ids = np.asarray(tokenizer(text, add_special_tokens=False)["input_ids"], dtype=np.int64)
+        return self._detect_ids(input_ids, keep_quantiles, device)
+
+    def _detect_ids(self, input_ids: np.ndarray, keep_quantiles: bool = False, device="cpu") -> Dict[str, Any]:
+        """Detection result of one encoded text, sequential when sequential_detection is set"""
+        if self.sequential_detection:
+            if not keep_quantiles:
+                return self.sequential_test(input_ids, device)
+            # calibration needs the whole text scored anyway, so the test walks those same scores
+            quantiles = self.token_quantiles(input_ids, device)
+            return {**self.sequential_test(input_ids, device, quantiles), "quantiles": quantiles}
+        # the z-score of score_sequence, computed from the per-token quantiles
+        quantiles = self.token_quantiles(input_ids, device)
+        z_score = float(quantile_z_scores(quantiles, [self.gamma])[0])
+        result = {
+            "detected": z_score > self.z_threshold,
+            "confidence": z_score,
+            "num_tokens": len(input_ids),
+        }
+        if keep_quantiles:
+            result["quantiles"] = quantiles
+        return result
+
+    def sequential_test(self, input_ids, device=None, quantiles: np.ndarray = None) -> Dict[str, Any]:
+        """Wald's sequential probability ratio test over the green token indicators.
+
+        Tokens are scored in chunks of sequential_chunk_size with the detection engine. Under
+        no watermark a scored token is green with probability 1 - gamma, under the watermark
+        with sprt_green_rate; scoring stops as soon as the log-likelihood ratio leaves
+        (log(beta / (1 - alpha)), log((1 - beta) / alpha)), which bounds the error rates by
+        sprt_alpha and sprt_beta. If the text ends first, the fixed z-score test decides.
+        The z-score is always reported over the consumed tokens. ``input_ids`` is a tensor or
+        a host array; ``device`` (by default the tensor's) is only used to build v1 permutations.
+        When the ``token_quantiles`` of the text are passed in, the test walks them instead of
+        scoring (and entropy-scoring) the text again.
+        """
+        null_rate = 1 - self.gamma
+        green_rate = self.sprt_green_rate if self.sprt_green_rate is not None else min(null_rate + 0.1, 0.99)
+        green_llr = np.log(green_rate / null_rate)
+        red_llr = np.log((1 - green_rate) / (1 - null_rate))
+        upper = np.log((1 - self.sprt_beta) / self.sprt_alpha)
+        lower = np.log(self.sprt_beta / (1 - self.sprt_alpha))
+
+        num_tokens = len(input_ids)
+        if quantiles is None:
+            engine = DipDetectionEngine(self, DETECTION_VOCAB_SIZE, mode="sequential")
+            ids = _host_ids(input_ids)
+            device = device or getattr(input_ids, "device", "cpu")
+            # the entropy gate needs model forwards: only run those for the chunks the test reads
+            skip_pieces = self.entropy_skip_pieces(input_ids)
+            skip = np.zeros(0, dtype=bool)
+            history = set()
+
+            def score_chunk(start: int, end: int) -> np.ndarray:
+                nonlocal skip
+                if skip_pieces is None:
+                    return engine.score_positions(ids, start, end, history, device=device)
+                while len(skip) < end:
+                    skip = np.concatenate([skip, next(skip_pieces)])
+                return engine.score_positions(ids, start, end, history, device=device, skip=skip[start:end])
+        else:
+            def score_chunk(start: int, end: int) -> np.ndarray:
+                return quantiles[start:end]
+
+        # position 0 has no context: it is consumed but never scored, like in score_sequence
+        consumed, green_tokens, ignored_tokens, llr = min(num_tokens, 1), 0, 0, 0.0
+        decision = None
+        while consumed < num_tokens and decision is None:
+            end = min(consumed + self.sequential_chunk_size, num_tokens)
+            scores = score_chunk(consumed, end)
+            scored = scores != -1
+            green = scores >= self.gamma
+            # walk the chunk token by token so the test stops at the exact crossing
+            steps = np.cumsum(np.where(green, green_llr, red_llr) * scored) + llr
+            crossed = np.flatnonzero((steps >= upper) | (steps <= lower))
+            if len(crossed):
+                stop = int(crossed[0]) + 1
+                decision = bool(steps[crossed[0]] >= upper)
+            else:
+                stop = len(scores)
+            llr = float(steps[stop - 1])
+            green_tokens += int(green[:stop].sum())
+            ignored_tokens += int((~scored[:stop]).sum())
+            consumed += stop
+
+        # z-score over the consumed tokens; like in score_sequence, positions ignored by the
+        # history or the entropy gate are left out of the length
+        sequence_length = consumed - ignored_tokens
+        z_score = float((green_tokens - null_rate * sequence_length) / sqrt(sequence_length)) if sequence_length > 0 else 0.0
         return {
-            "detected": is_watermarked,
+            "detected": decision if decision is not None else bool(z_score > self.z_threshold),
             "confidence": z_score,
+            "tokens_consumed": consumed,
+            "num_tokens": num_tokens,
+            "stopped_early": decision is not None and consumed < num_tokens,
+            "log_likelihood_ratio": llr,
         }
 
+    def detect_batch(self, texts: List[str], tokenizer=None, device=None, keep_quantiles=False,
+                     **kwargs) -> List[Dict[str, Any]]:
+        """Detect watermarks in many texts, tokenized together in one fast-tokenizer call"""
+        tokenizer = tokenizer or llm_service.tokenizer
+        device = device or llm_service.device
+        results = []
+        for input_ids in tokenizer(texts, add_special_tokens=False)["input_ids"]:
+            result = self._detect_ids(np.asarray(input_ids, dtype=np.int64), keep_quantiles, device)
+            results.append({**result, "num_tokens": len(input_ids)})
+        return results
+
     def visualize(self, text: str) -> Dict[str, Any]:
         """Visualize watermark detection results"""
-        # Set the state indicator to 1 for visualization
-        self.state_indicator = 1
+        return self.analyze(text)
+
+    def analyze(self, text: str, tokenizer=None, device=None) -> Dict[str, Any]:
+        """Detection result and per-token highlights of text from a single scoring pass.
 
-        # Encode text
-        encoded_text = \
-        llm_service.tokenizer(text, return_tensors="pt", add_special_tokens=False)["input_ids"][0].to(
-            llm_service.device)
+        Token strings are cut from the text with the fast tokenizer's character offsets, the
+        characters between two tokens (e.g. the leading space of a byte-level BPE token) going
+        to the next token, so the strings concatenate back to the text.
+        """
+        tokenizer = tokenizer or llm_service.tokenizer
+        device = device or llm_service.device
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=tokenizer.is_fast)
+        encoded_text = torch.tensor(encoding["input_ids"], dtype=torch.long, device=device)
 
-        # Compute the highlight values
-        _, highlight_values = self.score_sequence(encoded_text)
+        z_score, highlight_values = self.score_sequence(encoded_text)
 
-        # decode single tokens
-        decoded_tokens = []
-        for token_id in encoded_text:
-            token = llm_service.tokenizer.decode(token_id.item())
-            decoded_tokens.append(token)
+        if tokenizer.is_fast:
+            decoded_tokens = []
+            previous_end = 0
+            for _, end in encoding["offset_mapping"]:
+                # tokens sharing a character (split multi-byte characters) get the empty string
+                end = max(end, previous_end)
+                decoded_tokens.append(text[previous_end:end])
+                previous_end = end
+            if decoded_tokens:
+                decoded_tokens[-1] += text[previous_end:]
+        else:
+            decoded_tokens = [tokenizer.decode(token_id) for token_id in encoding["input_ids"]]
+
+        return {
+            "detected": z_score > self.z_threshold,
+            "confidence": z_score,
+            "num_tokens": len(decoded_tokens),
+            "decoded_tokens": decoded_tokens,
+            "highlight_values": highlight_values,
+        }
 
-        # Clear the history
-        self.cc_history.clear()
+    def create_detection_session(self) -> DipDetectionSession:
+        """Start an incremental detection session for a text that keeps growing"""
+        if self.detection_requires_model:
+            raise ValueError("Incremental detection does not support model-scored entropy gating")
+        return DipDetectionSession(self, DETECTION_VOCAB_SIZE, llm_service.device)
 
-        return {"decoded_tokens":decoded_tokens, "highlight_values":highlight_values}
+    def update_detection_session(self, session: DipDetectionSession, text: str) -> Dict[str, Any]:
+        """Detect the watermark in the session's latest text, rescoring only the tokens after
+        the longest prefix shared with the previous text"""
+        input_ids = llm_service.tokenizer(text, add_special_tokens=False)["input_ids"]
+        with session.lock:
+            return session.update(np.asarray(input_ids, dtype=np.int64))
 
     def get_processor(self, key: str) -> LogitsProcessor:
-        """Return a logits processor for this watermark"""
-        return DipProcessor(self)
+        """Return a fresh logits processor (with its own generation state) for this watermark"""
+        return DipProcessor(self, DipState(DipState.GENERATION))
 
     # Helper methods
-    def _get_rng_seed(self, context_code: any) -> int:
+    def _get_rng_seed(self, context_code: any, state: DipState) -> int:
         """Get the random seed from the given context code and private key."""
-        if (
-                (not self.ignore_history_generation and self.state_indicator == 0) or
-                (not self.ignore_history_detection and self.state_indicator == 1)
-        ):
-            self.cc_history.add(context_code)
-
-        m = hashlib.sha256()
-        m.update(context_code)
-        m.update(self.key.encode('utf-8'))
-
-        full_hash = m.digest()
-        seed = int.from_bytes(full_hash, "big") % (2 ** 32 - 1)
+        if self._records_history(state):
+            state.cc_history.add(context_code)
+
+        return self._hash_context(context_code)
+
+    def _records_history(self, state: DipState) -> bool:
+        """Whether context codes are recorded into the state's cc_history in its mode."""
+        return (
+                (not self.ignore_history_generation and state.mode == DipState.GENERATION) or
+                (not self.ignore_history_detection and state.mode == DipState.DETECTION)
+        )
+
+    def _hash_context(self, context_code: bytes) -> int:
+        """Hash the context code with the private key into a 32-bit seed, without touching the history."""
+        cache_key = (self.key, context_code)
+        seed = _SEED_CACHE.get(cache_key)
+        if seed is None:
+            m = hashlib.sha256()
+            m.update(context_code)
+            m.update(self.key.encode('utf-8'))
+
+            full_hash = m.digest()
+            seed = int.from_bytes(full_hash, "big") % (2 ** 32 - 1)
+            _SEED_CACHE.put(cache_key, seed)
         return seed
 
     def _extract_context_code(self, context: torch.LongTensor) -> bytes:
         """Extract context code from the given context."""
         if self.prefix_length == 0:
+            if self.context_coding == CONTEXT_CODING_ROLLING:
+                return rolling_digest(context.detach().cpu().numpy())
             return context.detach().cpu().numpy().tobytes()
         else:
             return context[-self.prefix_length:].detach().cpu().numpy().tobytes()
@@ -171,9 +748,76 @@ class DIPWatermark(LogitsWatermark):
             shuffle = torch.randperm(vocab_size, generator=rng, device=rng.device)
         return shuffle
 
-    def reweight_logits(self, shuffle: torch.LongTensor, p_logits: torch.FloatTensor) -> torch.FloatTensor:
+    def get_permutations(self, seeds, vocab_size: int, device,
+                         timer: StageTimer = NULL_TIMER) -> Tuple[torch.LongTensor, torch.LongTensor]:
+        """Return the stacked (shuffle, unshuffle) permutations of the seeds, served from the LRU cache.
+
+        Building a permutation on a cache miss is timed as the ``permutation_build`` stage of ``timer``.
+        """
+        unique_seeds = list(dict.fromkeys(seeds))
+        shuffles, unshuffles = [], []
+        for seed in unique_seeds:
+            cache_key = (self.cipher_version, seed, vocab_size, str(device))
+            perms = _PERMUTATION_CACHE.get(cache_key)
+            if perms is None:
+                with timer.stage("permutation_build"):
+                    tokens = torch.arange(vocab_size, device=device)
+                    if self.cipher_version == cipher.CIPHER_V2:
+                        # rank of every token in one vectorized pass, then invert with a scatter
+                        unshuffle = cipher.rank(tokens, cipher.round_keys(seed), vocab_size)
+                        shuffle = torch.empty_like(unshuffle).scatter_(-1, unshuffle, tokens)
+                    else:
+                        shuffle = self.from_random(torch.Generator(device=device).manual_seed(seed), vocab_size)
+                        unshuffle = torch.empty_like(shuffle).scatter_(-1, shuffle, tokens)
+                perms = (shuffle, unshuffle)
+                _PERMUTATION_CACHE.put(cache_key, perms)
+            shuffles.append(perms[0])
+            unshuffles.append(perms[1])
+        shuffle, unshuffle = torch.stack(shuffles), torch.stack(unshuffles)
+        if len(unique_seeds) != len(seeds):
+            # rows sharing a context (beams, num_return_sequences) share one permutation
+            row_of_seed = {seed: row for row, seed in enumerate(unique_seeds)}
+            rows = torch.tensor([row_of_seed[seed] for seed in seeds], device=shuffle.device)
+            shuffle, unshuffle = shuffle[rows], unshuffle[rows]
+        return shuffle, unshuffle
+
+    def get_candidates(self, scores: torch.FloatTensor) -> Tuple[torch.LongTensor, torch.FloatTensor]:
+        """Candidate tokens sampling can pick from, and their logits after temperature/top-k/top-p.
+
+        Mirrors the warpers generate would apply, which it only does when sampling: without
+        do_sample every token stays a candidate and the logits are returned unchanged.
+        Tokens cut by top-p keep a -inf logit inside the candidate set.
+        """
+        min_tokens_to_keep = 2 if self.num_beams and self.num_beams > 1 else 1
+        if self.do_sample and self.temperature is not None and self.temperature != 1.0:
+            scores = scores / self.temperature
+        if self.do_sample and self.top_k:
+            candidate_scores, candidate_ids = torch.topk(
+                scores, min(max(self.top_k, min_tokens_to_keep), scores.size(-1)), dim=-1
+            )
+        else:
+            candidate_scores = scores
+            candidate_ids = torch.arange(scores.size(-1), device=scores.device).expand_as(scores)
+        if self.do_sample and self.top_p is not None and self.top_p < 1.0:
+            candidate_scores = TopPLogitsWarper(self.top_p, min_tokens_to_keep=min_tokens_to_keep)(
+                None, candidate_scores
+            )
+        return candidate_ids, candidate_scores
+
+    def get_ranks(self, seeds: List[int], tokens: torch.LongTensor, vocab_size: int) -> torch.LongTensor:
+        """Rank of every token of row i inside the permutation keyed by ``seeds[i]``."""
+        if self.cipher_version == cipher.CIPHER_V2:
+            # O(1) per token, the permutations are never built
+            keys = torch.from_numpy(cipher.stack_round_keys(seeds)).to(tokens.device)
+            return cipher.rank(tokens, keys[:, :, None], vocab_size)
+        _, unshuffle = self.get_permutations(seeds, vocab_size, tokens.device)
+        return torch.gather(unshuffle, -1, tokens)
+
+    def reweight_logits(self, shuffle: torch.LongTensor, p_logits: torch.FloatTensor,
+                        unshuffle: torch.LongTensor = None) -> torch.FloatTensor:
         """Reweight the logits using the shuffle and alpha."""
-        unshuffle = torch.argsort(shuffle, dim=-1)
+        if unshuffle is None:
+            unshuffle = torch.argsort(shuffle, dim=-1)
 
         s_p_logits = torch.gather(p_logits, -1, shuffle)
         s_log_cumsum = torch.logcumsumexp(s_p_logits, dim=-1)
@@ -203,46 +847,89 @@ class DIPWatermark(LogitsWatermark):
 
         return p_logits + shift_logits
 
-    def get_seed_for_cipher(self, input_ids: torch.LongTensor) -> Tuple[torch.FloatTensor, torch.FloatTensor]:
-        """Get the mask and seeds for the cipher."""
-        batch_size = input_ids.size(0)
-        context_codes = [
-            self._extract_context_code(input_ids[i]) for i in range(batch_size)
-        ]
-
-        mask, seeds = zip(
-            *[
-                (context_code in self.cc_history, self._get_rng_seed(context_code))
-                for context_code in context_codes
-            ]
-        )
+    def get_seed_for_cipher(self, input_ids: torch.LongTensor, state: DipState,
+                            rows: np.ndarray = None) -> Tuple[torch.BoolTensor, list[int]]:
+        """Get the mask and seeds for the cipher.
 
-        return mask, seeds
+        The context windows of all rows are copied to the host in one transfer and
+        deduplicated, so identical contexts (beams, num_return_sequences) are hashed once.
+        ``rows`` are the batch rows of input_ids (all rows by default), used to look up their
+        history group and left padding in the state. The mask is a bool tensor on the device of input_ids.
+        """
+        rows = np.arange(input_ids.shape[0]) if rows is None else rows
+        with state.timer.stage("context_codes"):
+            context_codes, code_groups, first_rows, row_to_unique = self._batch_context_codes(input_ids, state, rows)
+        histories = [state.history(int(group)) for group in code_groups]
 
-    def _get_green_token_quantile(self, input_ids: torch.LongTensor, vocab_size, current_token):
-        """Get the vocab quantile of current token"""
-        mask, seeds = self.get_seed_for_cipher(input_ids.unsqueeze(0))
+        with state.timer.stage("seed_hashing"):
+            seed_of_code = {context_code: self._hash_context(context_code) for context_code in context_codes}
+        mask = np.array([
+            context_code in history for context_code, history in zip(context_codes, histories)
+        ], dtype=bool)[row_to_unique]
+        if self._records_history(state):
+            # like the row-by-row version, a context repeated inside a group is history for later rows
+            mask |= np.arange(len(row_to_unique)) != first_rows[row_to_unique]
+            for context_code, history in zip(context_codes, histories):
+                history.add(context_code)
 
-        rng = [
-            torch.Generator(device=input_ids.device).manual_seed(seed) for seed in seeds
-        ]
+        seeds = [seed_of_code[context_codes[i]] for i in row_to_unique]
+        return torch.from_numpy(mask).to(input_ids.device), seeds
 
-        mask = torch.tensor(mask, device=input_ids.device)
-        shuffle = self.from_random(
-            rng, vocab_size
+    def _batch_context_codes(self, input_ids: torch.LongTensor, state: DipState, rows: np.ndarray):
+        """Distinct (history group, context code) pairs of a batch.
+
+        Returns the codes, their groups, the first row of each pair and the pair index of every row.
+        """
+        groups = state.row_groups(rows)
+        if self.prefix_length == 0:
+            # full contexts have per-row lengths once the left padding is stripped
+            if self.context_coding == CONTEXT_CODING_ROLLING:
+                # beam search reorders rows between steps, sampling and greedy decoding never do
+                reorders = bool(self.num_beams and self.num_beams > 1)
+                row_codes = state.context_digests(input_ids, rows, reorders)
+            else:
+                ids = input_ids.detach().cpu().numpy()
+                row_codes = [
+                    ids[row, pad_length:].tobytes() for row, pad_length in enumerate(state.row_pad_lengths(rows))
+                ]
+            pair_index, context_codes, code_groups, first_rows, row_to_unique = {}, [], [], [], []
+            for row, (group, context_code) in enumerate(zip(groups, row_codes)):
+                index = pair_index.setdefault((group, context_code), len(context_codes))
+                if index == len(context_codes):
+                    context_codes.append(context_code)
+                    code_groups.append(group)
+                    first_rows.append(row)
+                row_to_unique.append(index)
+            return context_codes, code_groups, np.array(first_rows), np.array(row_to_unique)
+
+        windows = input_ids[:, -self.prefix_length:].detach().cpu().numpy()
+        # dedupe (history group, window) pairs; the group column is dropped again for the code
+        keyed_windows = np.concatenate([groups[:, None], windows], axis=1)
+        unique_windows, first_rows, row_to_unique = np.unique(
+            keyed_windows, axis=0, return_index=True, return_inverse=True
         )
+        context_codes = [window[1:].tobytes() for window in unique_windows]
+        return context_codes, unique_windows[:, 0], first_rows, row_to_unique.reshape(-1)
+
+    def _get_green_token_quantile(self, input_ids: torch.LongTensor, vocab_size, current_token, state: DipState):
+        """Get the vocab quantile of current token"""
+        mask, seeds = self.get_seed_for_cipher(input_ids.unsqueeze(0), state)
+
+        # the permutation of the configured cipher version (v1 is torch.randperm)
+        shuffle, _ = self.get_permutations(seeds, vocab_size, input_ids.device)
 
         token_quantile = [(torch.where(shuffle[0] == current_token)[0] + 1) / vocab_size]
         return token_quantile, mask
 
     def _get_dip_score(self, input_ids: torch.LongTensor, vocab_size):
         """Get the DiP score of the input_ids"""
+        state = DipState(DipState.DETECTION)
         scores = torch.zeros(input_ids.shape, device=input_ids.device)
 
         for i in range(input_ids.shape[-1] - 1):
             pre = input_ids[: i + 1]
             cur = input_ids[i + 1]
-            token_quantile, mask = self._get_green_token_quantile(pre, vocab_size, cur)
+            token_quantile, mask = self._get_green_token_quantile(pre, vocab_size, cur, state)
             # if the current token is in the history and ignore_history_detection is False, set the score to -1
             if not self.ignore_history_detection and mask[0]:
                 scores[i + 1] = -1
@@ -253,7 +940,9 @@ class DIPWatermark(LogitsWatermark):
 
     def score_sequence(self, input_ids: torch.LongTensor) -> tuple[float, list[int]]:
         """Score the input_ids and return z_score and green_token_flags."""
-        score = self._get_dip_score(input_ids, 50272)
+        # the engine is score-for-score identical to the per-position reference _get_dip_score
+        skip = self.entropy_skip_mask(input_ids)
+        score = DipDetectionEngine(self, DETECTION_VOCAB_SIZE).score(input_ids, skip)
 
         green_tokens = torch.sum(score >= self.gamma, dim=-1, keepdim=False)
         green_token_flags = torch.zeros_like(score)
@@ -273,7 +962,70 @@ class DIPWatermark(LogitsWatermark):
             z_score = (green_tokens - (1 - self.gamma) * sequence_length_for_calculation) / sqrt(
                 sequence_length_for_calculation)
         else:
-            z_score = (green_tokens - (1 - self.gamma) * input_ids.size(-1)) / sqrt(input_ids.size(-1))
+            # entropy-gated positions (scored -1) were never watermarked and are left out
+            sequence_length_for_calculation = input_ids.size(-1)
+            if skip is not None:
+                green_token_flags[torch.from_numpy(skip).to(score.device)] = -1
+                sequence_length_for_calculation -= int(skip.sum())
+            z_score = (green_tokens - (1 - self.gamma) * sequence_length_for_calculation) / sqrt(
+                sequence_length_for_calculation)
 
         return z_score.item(), green_token_flags.tolist()
 
+    def token_quantiles(self, input_ids, device=None) -> np.ndarray:
+        """Per-token quantiles as scored by detection: 0 at position 0, -1 for ignored positions.
+
+        They do not depend on gamma or z_threshold, see ``quantile_z_scores``. ``input_ids`` is a
+        tensor or a host array; ``device`` (by default the tensor's) only builds v1 permutations.
+        """
+        skip = self.entropy_skip_mask(input_ids)
+        engine = DipDetectionEngine(self, DETECTION_VOCAB_SIZE)
+        return engine.score_ids(_host_ids(input_ids), skip, device or getattr(input_ids, "device", "cpu"))
+
+    @property
+    def provides_token_quantiles(self) -> bool:
+        return True
+
+    @property
+    def detection_requires_model(self) -> bool:
+        """Entropy-gated detection re-derives the gate with a forward pass of the loaded model."""
+        return self.entropy_threshold > 0 and self.entropy_scorer == ENTROPY_SCORER_MODEL
+
+    def entropy_skip_mask(self, input_ids) -> Union[np.ndarray, None]:
+        """Positions the entropy gate skipped during generation, or None without a gate.
+
+        The prompt is not part of the detected text, so the entropies come from the model
+        conditioned on the text alone, an approximation of the generation-time gate.
+        """
+        pieces = self.entropy_skip_pieces(input_ids)
+        if pieces is None:
+            return None
+        return np.concatenate(list(pieces))
+
+    def entropy_skip_pieces(self, input_ids) -> Union[Iterator[np.ndarray], None]:
+        """The entropy skip mask in consecutive pieces, one model forward each, or None without a gate.
+
+        A forward covers at most the model's max_position_embeddings tokens; every window after
+        the first starts half a window back, so each entropy is conditioned on at least that much
+        of the text before it. Consumers like sequential_test only pay for the pieces they read.
+        """
+        if not self.detection_requires_model or input_ids.shape[-1] < 2:
+            return None
+        if llm_service.model is None:
+            raise RuntimeError("Entropy-gated detection needs the scorer model to be loaded")
+        return self._entropy_skip_pieces(_host_ids(input_ids))
+
+    def _entropy_skip_pieces(self, ids: np.ndarray) -> Iterator[np.ndarray]:
+        window = getattr(llm_service.model.config, "max_position_embeddings", None) or len(ids)
+        overlap = window // 2
+        # the logits at position j predict token j + 1; position 0 has no logits and is never skipped
+        predicted = 0
+        yield np.zeros(1, dtype=bool)
+        while predicted < len(ids) - 1:
+            start = max(0, predicted - overlap)
+            end = min(start + window, len(ids) - 1)
+            with torch.no_grad():
+                logits = llm_service.model(torch.as_tensor(ids[start:end])[None].to(llm_service.device)).logits[0]
+            yield (step_entropy(logits[predicted - start:]) < self.entropy_threshold).cpu().numpy()
+            predicted = end
+
@@ -0,0 +1,261 @@
+import hashlib
+import time
+from math import sqrt
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.metrics import record_detection
+from app.watermarks import cipher
+
+
+# context coding of unbounded (prefix_length=0) contexts
+CONTEXT_CODING_FULL = "full"  # the serialized context itself, O(n) per step
+CONTEXT_CODING_ROLLING = "rolling"  # rolling SHA-256 digest, extended by one token per step
+CONTEXT_CODINGS = (CONTEXT_CODING_FULL, CONTEXT_CODING_ROLLING)
+
+# digest of the empty context; the tag versions the rolling coding, change it for a new scheme
+ROLLING_DIGEST_INIT = hashlib.sha256(b"dip-rolling-context-v1").digest()
+_TOKEN_BYTES = 8
+
+
+def rolling_digests(tokens: np.ndarray, digest: bytes = ROLLING_DIGEST_INIT) -> List[bytes]:
+    """Digests after each of ``tokens``, chained from ``digest``: d' = SHA-256(d || int64le(token))."""
+    token_bytes = np.asarray(tokens, dtype="<i8").tobytes()
+    digests = []
+    for i in range(0, len(token_bytes), _TOKEN_BYTES):
+        digest = hashlib.sha256(digest + token_bytes[i:i + _TOKEN_BYTES]).digest()
+        digests.append(digest)
+    return digests
+
+
+def rolling_digest(tokens: np.ndarray, digest: bytes = ROLLING_DIGEST_INIT) -> bytes:
+    """Rolling digest of a whole context."""
+    digests = rolling_digests(tokens, digest)
+    return digests[-1] if digests else digest
+
+
+def quantile_z_scores(quantiles: np.ndarray, gammas) -> np.ndarray:
+    """z-scores of one text for every gamma in ``gammas``, from its per-token quantiles alone.
+
+    Same statistic as ``score_sequence``: a token is green when its quantile is >= gamma and
+    positions scored -1 (repeated or entropy-gated contexts) are left out of the length, so
+    re-thresholding stored quantiles never needs the model or the key again.
+    """
+    gammas = np.asarray(gammas, dtype=np.float64)
+    scored = np.sort(quantiles[quantiles != -1]).astype(np.float32)
+    length = len(scored)
+    if length == 0:
+        return np.zeros_like(gammas)
+    # compared in float32 like the torch reference
+    green = length - np.searchsorted(scored, gammas.astype(np.float32), side="left")
+    return (green - (1 - gammas) * length) / sqrt(length)
+
+
+class DipDetectionEngine:
+    """Vectorized single-pass detection engine for DiP.
+
+    Produces exactly the same per-token scores as ``DIPWatermark._get_dip_score``,
+    but derives all context codes in one pass over a host copy of the sequence,
+    builds the permutations in chunks and looks the ranks up with one gather per chunk.
+    Seeds and inverse permutations go through the process-wide DiP LRU caches.
+    Every detection path scores through ``score_positions``, which records the detection
+    throughput under ``mode`` ("full", "sequential" or "incremental").
+    """
+
+    def __init__(self, watermark, vocab_size: int, chunk_size: int = 64, mode: str = "full"):
+        self.watermark = watermark
+        self.vocab_size = vocab_size
+        self.chunk_size = chunk_size
+        self.mode = mode
+
+    def context_codes(self, ids: np.ndarray, start: int, end: int) -> List[bytes]:
+        """Context codes of positions ``start..end-1``, the context of position j being ``ids[:j]``."""
+        prefix_length = self.watermark.prefix_length
+        if prefix_length == 0:
+            if self.watermark.context_coding == CONTEXT_CODING_ROLLING:
+                # one pass: the digest of ids[:j + 1] extends the digest of ids[:j]
+                first = rolling_digest(ids[:start])
+                return [first] + rolling_digests(ids[start:end - 1], first) if end > start else []
+            return [ids[:j].tobytes() for j in range(start, end)]
+        return [ids[max(j - prefix_length, 0):j].tobytes() for j in range(start, end)]
+
+    def score(self, input_ids: "torch.LongTensor", skip: Optional[np.ndarray] = None) -> "torch.FloatTensor":
+        """Score every position of ``input_ids``; drop-in replacement for ``_get_dip_score``."""
+        import torch
+
+        scores = self.score_ids(input_ids.detach().cpu().numpy(), skip, input_ids.device)
+        return torch.from_numpy(scores).to(input_ids.device)
+
+    def score_ids(self, ids: np.ndarray, skip: Optional[np.ndarray] = None, device="cpu") -> np.ndarray:
+        """Score every position of the host token ids ``ids``.
+
+        Positions flagged in ``skip`` (entropy-gated during generation) score -1 and never
+        enter the history. ``device`` is only used to build v1 permutations.
+        """
+        scores = np.zeros(len(ids), dtype=np.float32)
+        if len(ids) > 1:
+            scores[1:] = self.score_positions(
+                ids, 1, len(ids), set(), device=device, skip=None if skip is None else skip[1:]
+            )
+        return scores
+
+    def score_positions(self, ids: np.ndarray, start: int, end: int, history: Set[bytes],
+                        device="cpu", recorded: Optional[List[Tuple[int, bytes]]] = None,
+                        skip: Optional[np.ndarray] = None,
+                        context_codes: Optional[List[bytes]] = None) -> np.ndarray:
+        """Score positions ``start..end-1`` of ``ids``, recording seen context codes into ``history``.
+
+        When ``recorded`` is given, every (position, context code) newly added to the history
+        is appended to it, so the history can be rolled back later. ``skip`` flags positions
+        (relative to ``start``) that are scored -1 without being hashed or recorded.
+        ``context_codes`` of the positions can be passed in when the caller already has them.
+        """
+        started = time.perf_counter()
+        record_history = not self.watermark.ignore_history_detection
+        scores = np.empty(end - start, dtype=np.float32)
+        if context_codes is None:
+            context_codes = self.context_codes(ids, start, end)
+
+        offsets, seeds = [], []
+        for offset, context_code in enumerate(context_codes):
+            if skip is not None and skip[offset]:
+                scores[offset] = -1
+                continue
+            if record_history:
+                # a repeated context is ignored, exactly like the mask of get_seed_for_cipher
+                if context_code in history:
+                    scores[offset] = -1
+                    continue
+                history.add(context_code)
+                if recorded is not None:
+                    recorded.append((start + offset, context_code))
+            offsets.append(offset)
+            seeds.append(self.watermark._hash_context(context_code))
+
+        tokens = ids[start:end]
+        for i in range(0, len(offsets), self.chunk_size):
+            chunk_offsets = np.asarray(offsets[i:i + self.chunk_size])
+            ranks = self._get_ranks(seeds[i:i + self.chunk_size], tokens[chunk_offsets], device)
+            # same float32 rounding as the reference's (long rank + 1) / int
+            scores[chunk_offsets] = (ranks + 1).astype(np.float32) / np.float32(self.vocab_size)
+        record_detection(self.mode, end - start, time.perf_counter() - started)
+        return scores
+
+    def _get_ranks(self, seeds: List[int], tokens: np.ndarray, device) -> np.ndarray:
+        """Rank of each token inside the permutation keyed by its seed."""
+        if self.watermark.cipher_version == cipher.CIPHER_V2:
+            # pure NumPy, O(1) per token: no permutation is ever built
+            return cipher.rank(tokens.astype(np.int64), cipher.stack_round_keys(seeds), self.vocab_size)
+
+        # v1 permutations are torch.randperm draws, the only part of detection that needs torch
+        import torch
+
+        unique_seeds = list(dict.fromkeys(seeds))
+        row_of_seed = {seed: row for row, seed in enumerate(unique_seeds)}
+        rows = torch.tensor([row_of_seed[seed] for seed in seeds], device=device)
+        # the inverse permutation maps a token to its rank, served from the shared LRU cache
+        _, inverse = self.watermark.get_permutations(unique_seeds, self.vocab_size, device)
+        tokens = torch.as_tensor(tokens, dtype=torch.long, device=device)
+        return inverse[rows, tokens].cpu().numpy()
+
+
+class DipDetectionSession:
+    """Incremental DiP detection over a growing token sequence.
+
+    Keeps the per-token scores, the green/ignored counts and the detection history of the
+    sequence seen so far. ``update`` rolls the state back to the longest common prefix with
+    the new sequence and scores only the positions after it, so a text that grows by a few
+    tokens costs time proportional to the delta. The z-score equals ``score_sequence``'s.
+    """
+
+    def __init__(self, watermark, vocab_size: int, device="cpu"):
+        self.engine = DipDetectionEngine(watermark, vocab_size, mode="incremental")
+        self.device = device
+        self.ids = np.empty(0, dtype=np.int64)
+        self.scores = np.empty(0, dtype=np.float32)
+        self.green_tokens = 0
+        self.ignored_tokens = 0
+        self.history: Set[bytes] = set()
+        # (position, context code) in the order codes entered the history, for rollbacks
+        self._recorded: List[Tuple[int, bytes]] = []
+        # rolling coding: digests of ids[:j] for j = 0..len(ids), extended with the text
+        self._digests: Optional[List[bytes]] = None
+        if watermark.prefix_length == 0 and watermark.context_coding == CONTEXT_CODING_ROLLING:
+            self._digests = [ROLLING_DIGEST_INIT]
+        self.lock = Lock()
+
+    @property
+    def watermark(self):
+        return self.engine.watermark
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def update(self, ids: np.ndarray) -> Dict[str, Any]:
+        """Move the session to the token sequence ``ids`` and return the updated statistics."""
+        ids = np.asarray(ids, dtype=np.int64)
+        common = self._common_prefix_length(ids)
+        self._truncate(common)
+
+        end = len(ids)
+        scores = np.zeros(end - common, dtype=np.float32)
+        # position 0 has no context and keeps a score of 0, like score_sequence
+        start = max(common, 1)
+        context_codes = None
+        if self._digests is not None:
+            self._digests.extend(rolling_digests(ids[common:], self._digests[-1]))
+            context_codes = self._digests[start:end]
+        if end > start:
+            scores[start - common:] = self.engine.score_positions(
+                ids, start, end, self.history, self.device, self._recorded, context_codes=context_codes
+            )
+        self.ids = ids
+        self.scores = np.concatenate([self.scores, scores])
+        self.green_tokens += int(np.count_nonzero(scores >= self.watermark.gamma))
+        self.ignored_tokens += int(np.count_nonzero(scores == -1))
+        return {
+            **self.result(),
+            "reused_tokens": common,
+            "scored_tokens": end - common,
+        }
+
+    def result(self) -> Dict[str, Any]:
+        """Detection result of the current sequence."""
+        z_score = self.z_score()
+        return {
+            "detected": z_score > self.watermark.z_threshold,
+            "confidence": z_score,
+            "num_tokens": len(self.ids),
+        }
+
+    def z_score(self) -> float:
+        gamma = self.watermark.gamma
+        if self.watermark.ignore_history_detection:
+            sequence_length = len(self.ids)
+        else:
+            sequence_length = len(self.ids) - self.ignored_tokens
+        if sequence_length <= 0:
+            return 0.0
+        return (self.green_tokens - (1 - gamma) * sequence_length) / sqrt(sequence_length)
+
+    def _common_prefix_length(self, ids: np.ndarray) -> int:
+        length = min(len(ids), len(self.ids))
+        mismatches = np.flatnonzero(self.ids[:length] != ids[:length])
+        return int(mismatches[0]) if len(mismatches) else length
+
+    def _truncate(self, length: int):
+        """Roll the scores, counts and history back to the first ``length`` tokens."""
+        if length >= len(self.ids):
+            return
+        dropped = self.scores[length:]
+        self.green_tokens -= int(np.count_nonzero(dropped >= self.watermark.gamma))
+        self.ignored_tokens -= int(np.count_nonzero(dropped == -1))
+        self.scores = self.scores[:length]
+        self.ids = self.ids[:length]
+        if self._digests is not None:
+            del self._digests[length + 1:]
+        while self._recorded and self._recorded[-1][0] >= length:
+            _, context_code = self._recorded.pop()
+            self.history.discard(context_code)
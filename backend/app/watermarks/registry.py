@@ -0,0 +1,111 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.cache import TieredCache
+from app.core.config import cfg
+from app.core.Configurable import thaw_config
+from app.models.llm import llm_service
+from .base import WatermarkBase
+
+
+def normalize_params(name: str, params: Dict[str, Any]) -> str:
+	"""将水印参数与算法默认参数合并后规范化为稳定的字符串（键排序），用作实例池的键"""
+	from . import WATERMARK_METADATA
+
+	metadata = WATERMARK_METADATA.get(name)
+	defaults = thaw_config(metadata["params"]) if metadata else {}
+	return json.dumps({**defaults, **params}, sort_keys=True, default=str)
+
+
+def detection_cache_key(kind: str, text: str, name: str, params: Dict[str, Any]) -> Optional[str]:
+	"""
+	检测结果缓存的内容寻址键：(结果类型, 文本哈希, 算法名称, 规范化参数, 分词器标识)
+	Args:
+		kind: 结果类型，如"detect"、"analyze"
+		text: 待检测文本
+		name: 算法名称
+		params: 算法参数
+	Returns:
+		缓存键，未加载分词器时返回None（不缓存）
+	"""
+	tokenizer = llm_service.tokenizer
+	if tokenizer is None:
+		return None
+	text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+	tokenizer_identity = f"{tokenizer.name_or_path}:{len(tokenizer)}"
+	key = json.dumps([kind, text_hash, name, normalize_params(name, params), tokenizer_identity])
+	return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class WatermarkPool:
+	"""
+	水印实例池
+	按(算法名称, 规范化参数, 当前模型版本)缓存长生命周期、线程安全的水印实例，
+	复用其生成配置与缓存；超出容量时按LRU淘汰，模型切换时整体失效
+	"""
+
+	def __init__(self, max_instances: int):
+		self.max_instances = max_instances
+		self._instances: "OrderedDict[Tuple[Hashable, ...], WatermarkBase]" = OrderedDict()
+		self._lock = Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, name: str, **params) -> WatermarkBase:
+		"""
+		获取水印算法实例，不存在时创建
+		Args:
+			name: 算法名称
+			**params: 算法参数
+		Returns:
+			水印算法实例
+		Raises:
+			ValueError: 如果算法不存在
+		"""
+		# 延迟导入，避免与包初始化循环依赖
+		from . import get_watermark_algorithm
+
+		key = (name, normalize_params(name, params), llm_service.model_version)
+		with self._lock:
+			instance = self._instances.get(key)
+			if instance is not None:
+				self._instances.move_to_end(key)
+				self.hits += 1
+				return instance
+
+			self.misses += 1
+			instance = get_watermark_algorithm(name, **params)
+			self._instances[key] = instance
+			while len(self._instances) > self.max_instances:
+				self._instances.popitem(last=False)
+			return instance
+
+	def invalidate(self):
+		"""清空实例池（模型切换时调用）"""
+		with self._lock:
+			self._instances.clear()
+
+	def stats(self) -> Dict[str, Any]:
+		"""返回实例池命中情况"""
+		with self._lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"instances": len(self._instances),
+				"max_instances": self.max_instances
+			}
+
+
+# 全局水印实例池，模型切换时自动失效
+watermark_pool = WatermarkPool(cfg.WATERMARK_POOL_SIZE)
+llm_service.add_model_listener(watermark_pool.invalidate)
+
+# 全局检测结果缓存，键中包含分词器标识，因此模型切换后无需清空
+detection_cache = TieredCache(
+	cfg.DETECTION_CACHE_BYTES, cfg.DETECTION_CACHE_DB, max_entries=cfg.DETECTION_CACHE_DB_MAX_ENTRIES,
+	ttl_seconds=cfg.DETECTION_CACHE_DB_TTL_SECONDS, commit_size=cfg.DETECTION_CACHE_DB_COMMIT_SIZE,
+	commit_seconds=cfg.DETECTION_CACHE_DB_COMMIT_SECONDS
+)
@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Tuple
+from uuid import uuid4
+
+from app.core.config import cfg
+
+
+class DetectionSessionStore:
+	"""
+	增量检测会话存储
+	会话按最近访问时间排列，空闲超过ttl秒的会话在下次访问存储时被清除，
+	超出容量时淘汰最久未访问的会话
+	"""
+	
+	def __init__(self, ttl_seconds: float, max_sessions: int):
+		self.ttl_seconds = ttl_seconds
+		self.max_sessions = max_sessions
+		# 会话ID -> (最近访问时间, 会话)
+		self._sessions: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+		self._lock = Lock()
+		self.expired = 0
+	
+	def create(self, session: Any) -> str:
+		"""保存会话并返回会话ID"""
+		session_id = str(uuid4())
+		with self._lock:
+			self._evict_expired()
+			self._sessions[session_id] = (time.monotonic(), session)
+			while len(self._sessions) > self.max_sessions:
+				self._sessions.popitem(last=False)
+		return session_id
+	
+	def get(self, session_id: str) -> Any:
+		"""
+		获取会话并刷新其访问时间
+		Raises:
+			KeyError: 如果会话不存在或已过期
+		"""
+		with self._lock:
+			self._evict_expired()
+			_, session = self._sessions.pop(session_id)
+			self._sessions[session_id] = (time.monotonic(), session)
+			return session
+	
+	def delete(self, session_id: str) -> bool:
+		"""删除会话，返回会话是否存在"""
+		with self._lock:
+			return self._sessions.pop(session_id, None) is not None
+	
+	def _evict_expired(self):
+		deadline = time.monotonic() - self.ttl_seconds
+		while self._sessions:
+			session_id, (last_access, _) = next(iter(self._sessions.items()))
+			if last_access > deadline:
+				break
+			del self._sessions[session_id]
+			self.expired += 1
+	
+	def stats(self) -> Dict[str, Any]:
+		"""返回会话数量信息"""
+		with self._lock:
+			self._evict_expired()
+			return {
+				"sessions": len(self._sessions),
+				"max_sessions": self.max_sessions,
+				"expired": self.expired,
+				"ttl_seconds": self.ttl_seconds
+			}
+
+
+# 全局增量检测会话存储
+detection_sessions = DetectionSessionStore(cfg.DETECTION_SESSION_TTL_SECONDS, cfg.DETECTION_SESSION_MAX)
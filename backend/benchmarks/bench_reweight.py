@@ -0,0 +1,74 @@
+"""Micro-benchmark of the DiP reweight_logits implementations.
+
+Times one decoding step of the reference ``DIPWatermark.reweight_logits`` against the
+fused implementation (with buffers reused across steps, as ``DipProcessor`` does) and its
+``torch.compile`` variant, on random logits over an OPT-sized vocabulary.
+
+Run from ``backend/`` with the usual environment (.env) available:
+
+    python -m benchmarks.bench_reweight --batch-sizes 1 4 8 --device cpu
+"""
+import argparse
+import time
+
+import torch
+
+from app.watermarks.dip import DIPWatermark, DipState, compiled_fused_reweight, fused_reweight
+
+
+def _time(step, repeats: int, device: str) -> float:
+    """Median latency of ``step`` in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        if device == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        step()
+        if device == "cuda":
+            torch.cuda.synchronize()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocab-size", type=int, default=50272)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--no-compile", action="store_true", help="skip the torch.compile variant")
+    args = parser.parse_args()
+
+    watermark = DIPWatermark()
+    generator = torch.Generator().manual_seed(0)
+    print(f"vocab={args.vocab_size} device={args.device} repeats={args.repeats}")
+    print(f"{'batch':>5} {'reference ms':>13} {'fused ms':>9} {'compiled ms':>12} {'max |dp|':>9}")
+    for batch_size in args.batch_sizes:
+        logits = torch.randn(batch_size, args.vocab_size, generator=generator).to(args.device) * 4
+        shuffle = torch.stack([
+            torch.randperm(args.vocab_size, generator=generator) for _ in range(batch_size)
+        ]).to(args.device)
+        state = DipState(DipState.GENERATION)
+
+        # the fused variants never need the inverse permutation, so the reference computes it itself
+        reference = lambda: watermark.reweight_logits(shuffle, logits)
+        fused = lambda: fused_reweight(logits, shuffle, watermark.alpha, state.reweight_buffers(logits))
+        compiled = lambda: compiled_fused_reweight(logits, shuffle, watermark.alpha)
+
+        steps = {"reference": reference, "fused": fused}
+        if not args.no_compile:
+            steps["compiled"] = compiled
+        latencies = {}
+        for name, step in steps.items():
+            step()  # warm up (and compile)
+            latencies[name] = _time(step, args.repeats, args.device)
+
+        # agreement of the resulting distributions
+        max_diff = (reference().softmax(-1) - fused().softmax(-1)).abs().max().item()
+        compiled_ms = f"{latencies['compiled']:12.3f}" if "compiled" in latencies else f"{'-':>12}"
+        print(f"{batch_size:>5} {latencies['reference']:13.3f} {latencies['fused']:9.3f} {compiled_ms} {max_diff:9.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,11 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1 import api_router, init_db
 from app.core import cfg, tasks
+from app.core.system_metrics import system_metrics
 from app.api.v1.endpoints.model import init_models
+from app.models.detection_pool import detection_executor
+from app.models.llm import llm_service
+from app.watermarks import detection_cache
 
 
 @asynccontextmanager
@@ -13,9 +17,14 @@ async def lifespan(app: FastAPI):
 	print('\033[7;37m启动！\033[0m')
 	# 初始化模型状态
 	await init_models()
+	system_metrics.start()
 	
 	yield
 	
+	await system_metrics.stop()
+	llm_service.scheduler.stop()
+	detection_executor.shutdown()
+	detection_cache.flush()
 	print('\033[7;37m关闭！\033[0m')
 
 
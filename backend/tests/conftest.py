@@ -0,0 +1,15 @@
+import os
+import sys
+
+# app.core.config在导入时读取这些必填环境变量，测试不连接数据库，给出占位值即可
+for name, value in {
+	"JWT_SECRET_KEY": "test-secret",
+	"SQL_HOST": "localhost",
+	"SQL_PORT": "3306",
+	"SQL_USER": "test",
+	"SQL_PASSWORD": "test",
+	"SQL_DBNAME": "test",
+}.items():
+	os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,31 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import watermark
+from app.watermarks import watermark_pool
+
+
+@pytest.fixture(scope="module")
+def advertised_algorithms():
+	app = FastAPI()
+	app.include_router(watermark.router)
+	with TestClient(app) as client:
+		response = client.get("/algorithms")
+	assert response.status_code == 200
+	return response.json()
+
+
+def test_algorithms_advertise_only_constructor_params(advertised_algorithms):
+	assert advertised_algorithms
+	for algorithm in advertised_algorithms:
+		# 只读能力标记是property，不是构造参数
+		for capability in ("detection_requires_model", "provides_token_quantiles"):
+			assert capability not in algorithm["params"]
+
+
+def test_advertised_params_round_trip_into_pool(advertised_algorithms):
+	# 前端会把/algorithms返回的参数原样提交回来，这些参数必须能直接构造算法实例
+	for algorithm in advertised_algorithms:
+		instance = watermark_pool.get(algorithm["name"], **algorithm["params"])
+		assert instance is watermark_pool.get(algorithm["name"], **algorithm["params"])
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from datasets import Dataset as HFDataset
+from fastapi import BackgroundTasks, HTTPException
+from tortoise import Tortoise
+
+from app.api.v1.endpoints import watermark as watermark_endpoint
+from app.core import cfg, tasks
+from app.dbModels import Dataset
+
+
+class _Watermark:
+	"""文本以"wm"开头即判定为含水印"""
+	provides_token_quantiles = False
+	
+	def detect_batch(self, texts, **kwargs):
+		return [
+			{"detected": text.startswith("wm"), "confidence": 1.0, "num_tokens": len(text.split())}
+			for text in texts
+		]
+
+
+@pytest.fixture
+def bulk_detection(tmp_path, monkeypatch):
+	monkeypatch.setattr(watermark_endpoint.watermark_pool, "get", lambda name, **params: _Watermark())
+	monkeypatch.setattr(cfg, "ARTIFACT_DIR", str(tmp_path / "artifacts"))
+	monkeypatch.setattr(cfg, "BULK_DETECTION_CHUNK_SIZE", 2)
+	storage_path = str(tmp_path / "dataset")
+	HFDataset.from_dict({"text": ["wm one", "plain two", "wm three", "plain four", "wm five"]}).save_to_disk(
+		storage_path
+	)
+	
+	async def run(make_request, status="completed"):
+		"""在内存SQLite中创建数据集记录后执行make_request(数据集ID)"""
+		await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.dbModels"]})
+		try:
+			await Tortoise.generate_schemas()
+			dataset = await Dataset.create(
+				name="texts", source="uploaded", storage_path=storage_path, status=status
+			)
+			return await make_request(dataset.id)
+		finally:
+			await Tortoise.close_connections()
+	
+	return lambda make_request, **kwargs: asyncio.run(run(make_request, **kwargs))
+
+
+async def _submit(dataset_id):
+	request = watermark_endpoint.BulkDetectionRequest(algorithm="dip", dataset_id=dataset_id)
+	return await watermark_endpoint.detect_watermark_bulk(request, BackgroundTasks(), SimpleNamespace(id=1))
+
+
+def test_bulk_detect_over_a_dataset_column(bulk_detection):
+	async def detect(dataset_id):
+		task_id = (await _submit(dataset_id))["task_id"]
+		await watermark_endpoint.process_bulk_detect_watermark_task(task_id)
+		return tasks.tasks[task_id]
+	
+	task = bulk_detection(detect)
+	assert task["status"] == tasks.TaskStatus.COMPLETED, task["error"]
+	assert (task["result"]["count"], task["result"]["detected_count"]) == (5, 3)
+	with open(task["result"]["artifact_path"]) as file:
+		rows = [json.loads(line) for line in file]
+	assert [row["index"] for row in rows] == list(range(5))
+	assert [row["detected"] for row in rows] == [True, False, True, False, True]
+
+
+def test_bulk_detect_rejects_a_missing_dataset(bulk_detection):
+	with pytest.raises(HTTPException) as error:
+		bulk_detection(lambda dataset_id: _submit(uuid.uuid4()))
+	assert error.value.status_code == 404
+
+
+def test_bulk_detect_rejects_a_dataset_still_processing(bulk_detection):
+	with pytest.raises(HTTPException) as error:
+		bulk_detection(_submit, status="processing")
+	assert error.value.status_code == 400
@@ -0,0 +1,106 @@
+import time
+
+from app.core.cache import LRUCache, TieredCache
+
+
+def test_lru_evicts_least_recently_used_within_budget():
+	cache = LRUCache(30, lambda key, value: 10)
+	for key in "abc":
+		cache.put(key, key.upper())
+	# 读取a使其成为最近使用，写入d时淘汰的是b
+	assert cache.get("a") == "A"
+	cache.put("d", "D")
+	assert cache.get("b") is None
+	assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+	assert cache.current_bytes == 30
+	assert cache.evictions == 1
+
+
+def test_lru_replacing_a_key_keeps_the_byte_count():
+	cache = LRUCache(100, lambda key, value: len(value))
+	cache.put("a", "x" * 10)
+	cache.put("a", "x" * 40)
+	assert len(cache) == 1
+	assert cache.current_bytes == 40
+
+
+def test_lru_skips_entries_larger_than_the_budget():
+	cache = LRUCache(10, lambda key, value: len(value))
+	cache.put("small", "x" * 5)
+	cache.put("large", "x" * 11)
+	assert cache.get("large") is None
+	assert cache.get("small") == "x" * 5
+	assert LRUCache(0).get("anything") is None
+
+
+def test_lru_stats_count_hits_and_misses():
+	cache = LRUCache(100)
+	cache.put("a", 1)
+	cache.get("a")
+	cache.get("b")
+	stats = cache.stats()
+	assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+	cache.clear()
+	assert len(cache) == 0 and cache.stats()["hits"] == 1
+
+
+def test_tiered_cache_refills_memory_from_disk(tmp_path):
+	db_path = str(tmp_path / "results.db")
+	cache = TieredCache(1024, db_path)
+	cache.put("key", {"detected": True, "confidence": 2.5})
+	cache.flush()
+	# 模拟重启：新实例的内存层为空，结果从磁盘层读出并回填内存层
+	restarted = TieredCache(1024, db_path)
+	assert restarted.get("key") == {"detected": True, "confidence": 2.5}
+	assert restarted.get("key") == {"detected": True, "confidence": 2.5}
+	stats = restarted.stats()
+	assert stats["disk"]["hits"] == 1
+	assert stats["memory"]["hits"] == 1
+	assert stats["hit_rate"] == 1.0
+	assert restarted.get("missing", "default") == "default"
+
+
+def test_tiered_cache_memory_layer_evicts_within_budget():
+	cache = TieredCache(40)
+	for index in range(5):
+		cache.put(f"k{index}", "x" * 10)
+	# 每个条目占2字节的键加12字节的JSON，预算只够保留最近的两个
+	assert [cache.get(f"k{index}") for index in range(5)] == [None, None, None, "x" * 10, "x" * 10]
+	assert cache.memory.current_bytes <= 40
+	assert not cache.stats()["disk"]["enabled"]
+
+
+def test_tiered_cache_commits_disk_writes_in_batches(tmp_path):
+	db_path = str(tmp_path / "results.db")
+	cache = TieredCache(1024, db_path, commit_size=3, commit_seconds=3600)
+	cache.put("a", 1)
+	cache.put("b", 2)
+	# 未提交的写入对其他连接不可见，但本实例的磁盘层仍可命中
+	assert TieredCache(1024, db_path).stats()["disk"]["entries"] == 0
+	cache.memory.clear()
+	assert cache.get("a") == 1
+	cache.put("c", 3)
+	assert TieredCache(1024, db_path).stats()["disk"]["entries"] == 3
+	assert cache.stats()["disk"]["pending"] == 0
+
+
+def test_tiered_cache_disk_keeps_the_newest_entries(tmp_path):
+	cache = TieredCache(1024, str(tmp_path / "results.db"), max_entries=2, commit_size=1)
+	for key in "abcd":
+		cache.put(key, key)
+		time.sleep(0.01)
+	cache.memory.clear()
+	assert [cache.get(key) for key in "abcd"] == [None, None, "c", "d"]
+	assert cache.stats()["disk"]["evictions"] == 2
+
+
+def test_tiered_cache_disk_entries_expire(tmp_path):
+	cache = TieredCache(1024, str(tmp_path / "results.db"), ttl_seconds=0.05, commit_size=1)
+	cache.put("old", 1)
+	time.sleep(0.1)
+	cache.memory.clear()
+	assert cache.get("old") is None
+	# 下一次提交时删除过期条目
+	cache.put("new", 2)
+	stats = cache.stats()["disk"]
+	assert (stats["entries"], stats["evictions"]) == (1, 1)
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pytest
+import torch
+from pydantic import ValidationError
+
+from app.api.v1.endpoints.evaluate import CalibrationRequest
+from app.evaluation.calibration import calibrate, roc_curve
+from app.watermarks.dip import DIPWatermark
+from app.watermarks.dip_engine import quantile_z_scores
+
+
+def test_quantile_z_scores_match_score_sequence_for_every_gamma():
+    rng = np.random.default_rng(0)
+    head = rng.integers(0, 50272, size=40)
+    input_ids = np.concatenate([head, head[:20]])
+    quantiles = DIPWatermark(cipher_version="v2").token_quantiles(input_ids)
+    gammas = [0.25, 0.5, 0.75]
+    z_scores = quantile_z_scores(quantiles, gammas)
+    for gamma, z_score in zip(gammas, z_scores):
+        expected = DIPWatermark(cipher_version="v2", gamma=gamma).score_sequence(torch.from_numpy(input_ids))[0]
+        assert z_score == pytest.approx(expected, abs=1e-5)
+
+
+def test_quantile_z_scores_leave_ignored_positions_out():
+    quantiles = np.array([0, 0.9, -1, 0.2, -1, 0.6], dtype=np.float32)
+    # 4 scored positions, 2 of them >= 0.5
+    assert quantile_z_scores(quantiles, [0.5])[0] == pytest.approx((2 - 0.5 * 4) / math.sqrt(4))
+    # a quantile equal to gamma is green
+    assert quantile_z_scores(quantiles, [0.6])[0] == pytest.approx((2 - 0.4 * 4) / 2)
+    assert quantile_z_scores(np.array([-1, -1], dtype=np.float32), [0.5, 0.7]).tolist() == [0, 0]
+
+
+def test_roc_curve_of_known_scores():
+    roc = roc_curve(np.array([3.0, 2.0]), np.array([1.0, 2.0]))
+    assert roc["thresholds"].tolist() == [3.0, 2.0, 1.0, -np.inf]
+    assert roc["tpr"].tolist() == [0.0, 0.5, 1.0, 1.0]
+    assert roc["fpr"].tolist() == [0.0, 0.0, 0.5, 1.0]
+
+
+def _texts(green_share: float, count: int, length: int = 50) -> list:
+    rng = np.random.default_rng(int(green_share * 100))
+    return [
+        np.where(rng.random(length) < green_share, rng.uniform(0.5, 1, length), rng.uniform(0, 0.5, length))
+        .astype(np.float32)
+        for _ in range(count)
+    ]
+
+
+def test_calibrate_separates_watermarked_from_natural_texts():
+    quantiles = _texts(0.95, 10) + _texts(0.5, 10)
+    labels = [True] * 10 + [False] * 10
+    result = calibrate(quantiles, labels, gammas=[0.5], z_thresholds=[0.0, 2.0, 100.0], target_fprs=[0.05])
+    report = result["gammas"][0]
+    assert report["auc"] == pytest.approx(1.0)
+    assert report["tpr_at_fpr"][0]["tpr"] == 1.0
+    assert report["youden"]["tpr"] - report["youden"]["fpr"] == 1.0
+    assert [point["tpr"] for point in report["grid"]] == [1.0, 1.0, 0.0]
+    assert result["best"]["accuracy"] == 1.0 and result["best"]["z_threshold"] == 2.0
+    assert (result["num_watermarked"], result["num_natural"]) == (10, 10)
+
+
+def test_calibrate_auc_of_indistinguishable_texts_is_chance():
+    quantiles = _texts(0.5, 2)
+    result = calibrate(quantiles + quantiles, [True, True, False, False], gammas=[0.5])
+    assert result["gammas"][0]["auc"] == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize("labels,gammas", [([True, True], [0.5]), ([True, False], [1.0]), ([True], [0.5])])
+def test_calibrate_rejects_invalid_input(labels, gammas):
+    with pytest.raises(ValueError):
+        calibrate(_texts(0.5, 2), labels, gammas)
+
+
+@pytest.mark.parametrize("target_fpr", [-0.1, 1.5])
+def test_calibrate_rejects_target_fprs_outside_the_unit_interval(target_fpr):
+    quantiles = _texts(0.95, 2) + _texts(0.5, 2)
+    with pytest.raises(ValueError):
+        calibrate(quantiles, [True, True, False, False], gammas=[0.5], target_fprs=[target_fpr])
+
+
+def test_calibration_request_validates_target_fprs():
+    assert CalibrationRequest(task_id="t", gammas=[0.5], target_fprs=[0, 1]).target_fprs == [0, 1]
+    with pytest.raises(ValidationError):
+        CalibrationRequest(task_id="t", gammas=[0.5], target_fprs=[-0.01])
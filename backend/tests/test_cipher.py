@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import torch
+
+from app.watermarks import cipher
+from app.watermarks.dip import DIPWatermark
+
+
+@pytest.mark.parametrize("domain_size", [2, 5, 1000, 50272])
+def test_rank_is_a_permutation_of_the_domain(domain_size):
+    tokens = np.arange(domain_size, dtype=np.int64)
+    ranks = cipher.rank(tokens, cipher.round_keys(1234), domain_size)
+    assert np.array_equal(np.sort(ranks), tokens)
+
+
+def test_rank_depends_on_the_seed():
+    tokens = np.arange(1000, dtype=np.int64)
+    assert not np.array_equal(
+        cipher.rank(tokens, cipher.round_keys(1), 1000), cipher.rank(tokens, cipher.round_keys(2), 1000)
+    )
+
+
+def test_numpy_and_torch_ranks_agree():
+    tokens = np.arange(50272, dtype=np.int64)
+    keys = cipher.round_keys(2 ** 32 - 2)
+    assert np.array_equal(
+        cipher.rank(tokens, keys, 50272), cipher.rank(torch.from_numpy(tokens), keys, 50272).numpy()
+    )
+
+
+def test_stacked_keys_rank_each_token_under_its_own_seed():
+    seeds = [0, 7, 2 ** 31, 2 ** 32 - 2]
+    tokens = np.array([3, 50000, 17, 42], dtype=np.int64)
+    ranks = cipher.rank(tokens, cipher.stack_round_keys(seeds), 50272)
+    expected = [cipher.rank(np.array([token]), cipher.round_keys(seed), 50272)[0] for seed, token in zip(seeds, tokens)]
+    assert ranks.tolist() == expected
+
+
+def test_v2_permutations_match_the_ranks():
+    watermark = DIPWatermark(cipher_version="v2")
+    shuffle, unshuffle = watermark.get_permutations([11, 12], 1000, "cpu")
+    tokens = torch.arange(1000)
+    for row, seed in enumerate([11, 12]):
+        assert torch.equal(unshuffle[row], cipher.rank(tokens, cipher.round_keys(seed), 1000))
+        # shuffle lists the tokens in rank order
+        assert torch.equal(unshuffle[row][shuffle[row]], tokens)
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+from datasets import Dataset as HFDataset
+from pydantic import ValidationError
+
+from app.api.v1.endpoints.dataset import WatermarkDatasetRequest
+from app.dataset.dataset import shard_checkpoint_dir, watermark_dataset
+
+
+class _Watermark:
+	"""记录每次embed_batch的提示，可在指定次数的调用时失败以模拟中断"""
+	
+	def __init__(self, fail_on_call: int = None):
+		self.calls = []
+		self.fail_on_call = fail_on_call
+	
+	def embed_batch(self, prompts):
+		if len(self.calls) == self.fail_on_call:
+			raise RuntimeError("interrupted")
+		self.calls.append(list(prompts))
+		return [prompt.upper() for prompt in prompts]
+
+
+@pytest.fixture
+def source_path(tmp_path):
+	path = str(tmp_path / "source")
+	HFDataset.from_dict({"text": [f"row {index}" for index in range(5)]}).save_to_disk(path)
+	return path
+
+
+def _run(source_path, output_path, watermark, shard_size=2):
+	return asyncio.run(watermark_dataset(source_path, output_path, "text", "watermarked", watermark, shard_size))
+
+
+def test_watermark_dataset_resumes_from_completed_shards(source_path, tmp_path):
+	output_path = str(tmp_path / "output")
+	interrupted = _Watermark(fail_on_call=1)
+	with pytest.raises(RuntimeError):
+		_run(source_path, output_path, interrupted)
+	assert os.listdir(shard_checkpoint_dir(output_path)) == ["shard-00000"]
+	# 重新执行时只处理未完成的分片
+	resumed = _Watermark()
+	dataset = _run(source_path, output_path, resumed)
+	assert resumed.calls == [["row 2", "row 3"], ["row 4"]]
+	assert dataset["watermarked"] == [f"ROW {index}" for index in range(5)]
+	assert not os.path.exists(shard_checkpoint_dir(output_path))
+
+
+def test_watermark_dataset_replaces_a_stale_temporary_shard(source_path, tmp_path):
+	output_path = str(tmp_path / "output")
+	# 上次在保存分片时中断，残留了不完整的临时目录
+	stale = os.path.join(shard_checkpoint_dir(output_path), "shard-00000.tmp")
+	os.makedirs(stale)
+	with open(os.path.join(stale, "garbage.arrow"), "w") as file:
+		file.write("partial")
+	with pytest.raises(RuntimeError):
+		_run(source_path, output_path, _Watermark(fail_on_call=1))
+	# 检查点只包含本次保存的文件
+	shard_path = os.path.join(shard_checkpoint_dir(output_path), "shard-00000")
+	assert "garbage.arrow" not in os.listdir(shard_path)
+	dataset = _run(source_path, output_path, _Watermark())
+	assert dataset["watermarked"] == [f"ROW {index}" for index in range(5)]
+
+
+@pytest.mark.parametrize("shard_size", [0, -1])
+def test_shard_size_must_be_positive(source_path, tmp_path, shard_size):
+	with pytest.raises(ValidationError):
+		WatermarkDatasetRequest(algorithm="dip", shard_size=shard_size)
+	with pytest.raises(ValueError):
+		_run(source_path, str(tmp_path / "output"), _Watermark(), shard_size=shard_size)
@@ -0,0 +1,37 @@
+import pytest
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
+
+from app.models.detection_pool import DetectionExecutor, to_detection_result
+from app.models.llm import llm_service
+from app.watermarks import watermark_pool
+
+TEXTS = ["The quick brown fox jumps over the lazy dog.", "the lazy dog jumps over the quick brown fox"]
+
+
+@pytest.fixture
+def tokenizer(tmp_path, monkeypatch):
+	"""保存到磁盘的小分词器，工作进程按路径加载同一个分词器"""
+	tokenizer = Tokenizer(models.BPE())
+	tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+	tokenizer.decoder = decoders.ByteLevel()
+	trainer = trainers.BpeTrainer(
+		vocab_size=300, special_tokens=["<pad>", "</s>"], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+	)
+	tokenizer.train_from_iterator(TEXTS * 10, trainer)
+	PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>").save_pretrained(tmp_path)
+	loaded = PreTrainedTokenizerFast.from_pretrained(str(tmp_path))
+	monkeypatch.setattr(llm_service, "tokenizer", loaded)
+	return loaded
+
+
+def test_worker_detects_like_the_api_process(tokenizer):
+	params = {"cipher_version": "v2"}
+	watermark = watermark_pool.get("dip", **params)
+	expected = [to_detection_result(watermark.detect(text, tokenizer=tokenizer, device="cpu")) for text in TEXTS]
+	executor = DetectionExecutor(1)
+	try:
+		assert executor.submit("dip", params, TEXTS[0]).result(timeout=120) == expected[0]
+		assert executor.submit_batch("dip", params, TEXTS).result(timeout=120) == expected
+	finally:
+		executor.shutdown()
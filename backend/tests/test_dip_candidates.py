@@ -0,0 +1,68 @@
+import pytest
+import torch
+from transformers import (
+    LogitsProcessorList, OPTConfig, OPTForCausalLM, TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper
+)
+
+from app.watermarks.dip import DETECTION_VOCAB_SIZE, DipProcessor, DipState, DIPWatermark
+
+SAMPLING = {"do_sample": True, "temperature": 0.7, "top_k": 40, "top_p": 0.9}
+
+
+def _warp(logits: torch.FloatTensor) -> torch.FloatTensor:
+    """The warpers generate applies when sampling with SAMPLING."""
+    for warper in (
+        TemperatureLogitsWarper(SAMPLING["temperature"]),
+        TopKLogitsWarper(SAMPLING["top_k"]),
+        TopPLogitsWarper(SAMPLING["top_p"]),
+    ):
+        logits = warper(None, logits)
+    return logits
+
+
+@pytest.mark.parametrize("cipher_version", ["v1", "v2"])
+def test_candidate_reweight_matches_full_vocab_reweight(cipher_version):
+    torch.manual_seed(0)
+    vocab_size = 1000
+    input_ids = torch.randint(0, vocab_size, (4, 8))
+    logits = torch.randn(4, vocab_size) * 3
+
+    candidate = DIPWatermark(key="candidates", cipher_version=cipher_version, candidate_reweight=True, **SAMPLING)
+    full = DIPWatermark(key="candidates", cipher_version=cipher_version, **SAMPLING)
+    candidate_probs = DipProcessor(candidate)(input_ids, logits.clone()).softmax(-1)
+    full_probs = DipProcessor(full)(input_ids, _warp(logits.clone())).softmax(-1)
+
+    torch.testing.assert_close(candidate_probs, full_probs, rtol=0, atol=1e-6)
+
+
+def test_greedy_candidates_keep_the_whole_vocab():
+    # generate applies no warper without sampling, so neither may the candidate set
+    watermark = DIPWatermark(candidate_reweight=True, do_sample=False, top_k=40, top_p=0.9, temperature=0.7)
+    logits = torch.randn(2, 100)
+    candidate_ids, candidate_scores = watermark.get_candidates(logits)
+    assert candidate_ids.shape == logits.shape
+    assert torch.equal(torch.gather(logits, -1, candidate_ids), candidate_scores)
+
+
+def test_candidate_reweight_is_detectable():
+    torch.manual_seed(0)
+    config = OPTConfig(
+        vocab_size=DETECTION_VOCAB_SIZE, hidden_size=32, num_hidden_layers=2, ffn_dim=64, num_attention_heads=2,
+        max_position_embeddings=256, word_embed_proj_dim=32, pad_token_id=0, bos_token_id=2, eos_token_id=2
+    )
+    model = OPTForCausalLM(config).eval()
+    prompt = torch.randint(3, DETECTION_VOCAB_SIZE, (1, 4))
+    watermark = DIPWatermark(key="candidates", candidate_reweight=True, cipher_version="v2", **SAMPLING)
+
+    def z_score(logits_processor):
+        # the processor applies the warpers itself, like DIPWatermark._generate
+        output = model.generate(
+            prompt, attention_mask=torch.ones_like(prompt), do_sample=True, temperature=1.0, top_k=0, top_p=1.0,
+            max_new_tokens=120, min_new_tokens=120, logits_processor=logits_processor, pad_token_id=0
+        )
+        return watermark.score_sequence(output[0])[0]
+
+    watermarked = z_score(LogitsProcessorList([DipProcessor(watermark, DipState(DipState.GENERATION, 1))]))
+    natural = z_score(LogitsProcessorList([]))
+    assert watermarked > watermark.z_threshold
+    assert natural < watermarked
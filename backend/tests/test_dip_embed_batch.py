@@ -0,0 +1,60 @@
+import pytest
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import OPTConfig, OPTForCausalLM, PreTrainedTokenizerFast
+
+from app.models.llm import llm_service
+from app.watermarks.dip import DIPWatermark
+
+VOCAB_SIZE = 600
+
+
+def _tokenizer():
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=VOCAB_SIZE, special_tokens=["<pad>", "</s>", "<unk>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(["The quick brown fox jumps over the lazy dog."] * 20, trainer)
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>",
+        model_input_names=["input_ids", "attention_mask"]
+    )
+
+
+def _model(vocab_size):
+    torch.manual_seed(0)
+    config = OPTConfig(
+        vocab_size=50272, hidden_size=32, num_hidden_layers=2, ffn_dim=64, num_attention_heads=2,
+        max_position_embeddings=256, word_embed_proj_dim=32, pad_token_id=0, bos_token_id=1, eos_token_id=1,
+        tie_word_embeddings=False
+    )
+    model = OPTForCausalLM(config).eval()
+    # keep generated ids inside the tokenizer vocab, so every text re-tokenizes the same way
+    with torch.no_grad():
+        model.model.decoder.final_layer_norm.weight.fill_(0.01)
+        model.model.decoder.final_layer_norm.bias.fill_(1.0)
+        model.lm_head.weight.zero_()
+        model.lm_head.weight[:vocab_size] = 10.0 / 32 + torch.randn(vocab_size, 32) * 0.3
+    return model
+
+
+@pytest.fixture
+def tiny_llm(monkeypatch):
+    tokenizer = _tokenizer()
+    monkeypatch.setattr(llm_service, "tokenizer", tokenizer)
+    monkeypatch.setattr(llm_service, "model", _model(len(tokenizer)))
+    monkeypatch.setattr(llm_service, "device", "cpu")
+
+
+PROMPTS = ["The", "The quick brown fox jumps", "lazy dog", "The quick brown fox jumps over the lazy"]
+
+
+@pytest.mark.parametrize("min_length", [None, 12])
+def test_embed_batch_matches_embedding_each_prompt_alone(tiny_llm, min_length):
+    watermark = DIPWatermark(max_length=16, min_length=min_length, do_sample=False)
+    alone = [watermark.embed(prompt) for prompt in PROMPTS]
+    # short prompts get padded up to the longest one, and must still get their full token budget
+    assert watermark.embed_batch(PROMPTS) == alone
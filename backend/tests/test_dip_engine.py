@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import torch
+
+from app.watermarks.dip import DETECTION_VOCAB_SIZE, DIPWatermark
+from app.watermarks.dip_engine import DipDetectionEngine
+
+
+def _ids_with_repeats(seed: int) -> torch.LongTensor:
+    """Random ids whose second half repeats the first, so bounded prefixes see repeated contexts"""
+    rng = np.random.default_rng(seed)
+    head = rng.integers(0, DETECTION_VOCAB_SIZE, size=12)
+    return torch.from_numpy(np.concatenate([head, head, rng.integers(0, DETECTION_VOCAB_SIZE, size=6)]))
+
+
+# context coding only applies to unbounded (prefix_length=0) contexts
+@pytest.mark.parametrize("prefix_length,context_coding", [(0, "full"), (0, "rolling"), (1, "full"), (5, "full")])
+@pytest.mark.parametrize("ignore_history_detection", [False, True])
+@pytest.mark.parametrize("cipher_version", ["v1", "v2"])
+def test_engine_matches_reference_scores(prefix_length, context_coding, ignore_history_detection, cipher_version):
+    watermark = DIPWatermark(
+        key="parity", prefix_length=prefix_length, ignore_history_detection=ignore_history_detection,
+        cipher_version=cipher_version, context_coding=context_coding
+    )
+    input_ids = _ids_with_repeats(prefix_length)
+
+    reference = watermark._get_dip_score(input_ids, DETECTION_VOCAB_SIZE)
+    scores = DipDetectionEngine(watermark, DETECTION_VOCAB_SIZE).score(input_ids)
+
+    assert torch.equal(scores, reference)
+    if not ignore_history_detection and prefix_length:
+        # the repeated half must actually exercise the history
+        assert (scores == -1).any()
+
+
+
+def test_instances_share_one_cache_budget():
+    from app.watermarks import dip
+
+    first = DIPWatermark(key="shared", gamma=0.5)
+    second = DIPWatermark(key="shared", gamma=0.4)
+    first._hash_context(b"shared context")
+    hits = dip._SEED_CACHE.hits
+    # differently configured instances with the same key reuse the seeds already hashed
+    assert second._hash_context(b"shared context") == first._hash_context(b"shared context")
+    assert dip._SEED_CACHE.hits == hits + 2
+
+
+@pytest.mark.parametrize("cipher_version", ["v1", "v2"])
+def test_host_id_detection_matches_score_sequence(cipher_version):
+    watermark = DIPWatermark(key="parity", cipher_version=cipher_version)
+    input_ids = _ids_with_repeats(5)
+    result = watermark._detect_ids(input_ids.numpy())
+    assert result["confidence"] == pytest.approx(watermark.score_sequence(input_ids)[0], abs=1e-6)
+    assert result["num_tokens"] == len(input_ids)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import torch
+from transformers import OPTConfig, OPTForCausalLM
+
+from app.models.llm import llm_service
+from app.watermarks.dip import DIPWatermark, step_entropy
+
+MAX_POSITIONS = 32
+
+
+class _CountingModel:
+    """Wraps the scorer model, recording the length of every forward"""
+
+    def __init__(self, model):
+        self.model = model
+        self.config = model.config
+        self.lengths = []
+
+    def __call__(self, input_ids):
+        self.lengths.append(input_ids.shape[-1])
+        return self.model(input_ids)
+
+
+@pytest.fixture
+def scorer(monkeypatch):
+    torch.manual_seed(0)
+    config = OPTConfig(
+        vocab_size=50272, hidden_size=32, num_hidden_layers=2, ffn_dim=64, num_attention_heads=2,
+        max_position_embeddings=MAX_POSITIONS, word_embed_proj_dim=32
+    )
+    model = _CountingModel(OPTForCausalLM(config).eval())
+    monkeypatch.setattr(llm_service, "model", model)
+    monkeypatch.setattr(llm_service, "device", "cpu")
+    return model
+
+
+def _median_entropy(model, ids):
+    with torch.no_grad():
+        return float(step_entropy(model.model(torch.as_tensor(ids)[None]).logits[0]).median())
+
+
+def test_skip_mask_of_a_text_longer_than_the_model_uses_bounded_windows(scorer):
+    ids = np.random.default_rng(0).integers(3, 50272, size=10 * MAX_POSITIONS)
+    watermark = DIPWatermark(entropy_threshold=_median_entropy(scorer, ids[:MAX_POSITIONS]))
+    scorer.lengths.clear()
+    skip = watermark.entropy_skip_mask(ids)
+    assert skip.shape == ids.shape
+    assert not skip[0]
+    assert max(scorer.lengths) <= MAX_POSITIONS
+    # the first window sees the same context as a single forward over the start of the text
+    with torch.no_grad():
+        logits = scorer.model(torch.as_tensor(ids[:MAX_POSITIONS])[None]).logits[0]
+    expected = (step_entropy(logits[:-1]) < watermark.entropy_threshold).numpy()
+    assert np.array_equal(skip[1:MAX_POSITIONS], expected)
+    assert 0 < skip.sum() < len(ids) - 1
+
+
+def test_sequential_test_only_scores_the_entropies_it_reads(scorer):
+    ids = np.random.default_rng(1).integers(3, 50272, size=40 * MAX_POSITIONS)
+    watermark = DIPWatermark(
+        entropy_threshold=_median_entropy(scorer, ids[:MAX_POSITIONS]), sequential_detection=True,
+        sequential_chunk_size=8
+    )
+    scorer.lengths.clear()
+    watermark.entropy_skip_mask(ids)
+    full_mask_forwards = len(scorer.lengths)
+    scorer.lengths.clear()
+    result = watermark.sequential_test(ids)
+    assert result["stopped_early"]
+    # every window after the first predicts half a window of new positions
+    assert len(scorer.lengths) <= 1 + result["tokens_consumed"] // (MAX_POSITIONS // 2) < full_mask_forwards
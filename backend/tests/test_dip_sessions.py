@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import torch
+
+from app.watermarks.dip import DETECTION_VOCAB_SIZE, DIPWatermark
+from app.watermarks.dip_engine import DipDetectionSession
+
+
+@pytest.mark.parametrize("prefix_length,context_coding", [(0, "full"), (0, "rolling"), (5, "full")])
+@pytest.mark.parametrize("ignore_history_detection", [False, True])
+def test_session_matches_a_fresh_detection_after_every_update(prefix_length, context_coding,
+                                                              ignore_history_detection):
+    watermark = DIPWatermark(
+        cipher_version="v2", prefix_length=prefix_length, context_coding=context_coding,
+        ignore_history_detection=ignore_history_detection
+    )
+    session = DipDetectionSession(watermark, DETECTION_VOCAB_SIZE)
+    rng = np.random.default_rng(0)
+    head = rng.integers(0, DETECTION_VOCAB_SIZE, size=30)
+    text = np.concatenate([head, head[:10]])
+    edited = np.concatenate([text[:25], rng.integers(0, DETECTION_VOCAB_SIZE, size=8)])
+    # grow, grow again, edit the middle (rolls the history back), shrink
+    for ids, reused in ((text[:20], 0), (text, 20), (edited, 25), (edited[:12], 12)):
+        result = session.update(ids)
+        assert result["reused_tokens"] == reused
+        assert result["scored_tokens"] == len(ids) - reused
+        assert result["confidence"] == pytest.approx(watermark.score_sequence(torch.from_numpy(ids))[0], abs=1e-5)
+        assert np.array_equal(session.scores, watermark.token_quantiles(ids))
@@ -0,0 +1,34 @@
+import numpy as np
+import torch
+
+from app.watermarks.dip import DipState
+from app.watermarks.dip_engine import rolling_digest
+
+
+def _expected(ids: torch.LongTensor, pad_lengths: np.ndarray, rows: np.ndarray):
+    return [rolling_digest(ids[i, pad_lengths[row]:].numpy()) for i, row in enumerate(rows)]
+
+
+def test_context_digests_extend_rows_step_by_step():
+    torch.manual_seed(0)
+    pad_lengths = np.array([0, 2, 0])
+    state = DipState(DipState.GENERATION, rows_per_group=1, pad_lengths=pad_lengths)
+    ids = torch.randint(3, 1000, (3, 4))
+    ids[1, :2] = 0
+    rows = np.arange(3)
+    for step in range(6):
+        # row 2 is skipped (e.g. entropy-gated) every other step and catches up with two tokens
+        active = rows if step % 2 else rows[:2]
+        assert state.context_digests(ids[active], active) == _expected(ids[active], pad_lengths, active)
+        ids = torch.cat([ids, torch.randint(3, 1000, (3, 1))], dim=-1)
+
+
+def test_context_digests_follow_beam_reordering():
+    torch.manual_seed(1)
+    state = DipState(DipState.GENERATION, rows_per_group=4)
+    ids = torch.randint(3, 1000, (4, 5))
+    rows = np.arange(4)
+    for beam_order in ([0, 1, 2, 3], [1, 1, 3, 0], [2, 0, 0, 1], [3, 2, 1, 0]):
+        # each beam continues the beam it was reordered from, like beam search does
+        ids = torch.cat([ids[beam_order], torch.randint(3, 1000, (4, 1))], dim=-1)
+        assert state.context_digests(ids, rows, reorders=True) == _expected(ids, np.zeros(4, dtype=int), rows)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import torch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import metrics, system
+from app.core.metrics import DETECTED_TOKENS, MetricsRegistry
+from app.watermarks.dip import DETECTION_VOCAB_SIZE, DIPWatermark
+from app.watermarks.dip_engine import DipDetectionSession
+
+
+def _client(router) -> TestClient:
+	app = FastAPI()
+	app.include_router(router)
+	return TestClient(app)
+
+
+def test_metrics_export_dip_cache_hit_rates():
+	body = _client(metrics.router).get("/metrics").text
+	for cache in ("detection", "watermark_pool", "dip_seed", "dip_permutation"):
+		assert f'watermark_cache_hit_rate{{cache="{cache}"}}' in body
+
+
+def test_system_cache_reports_dip_caches():
+	stats = _client(system.router).get("/system/cache").json()
+	assert set(stats["dip"]) == {"seed", "permutation"}
+	assert "hit_rate" in stats["dip"]["seed"]
+
+
+def test_registry_renders_prometheus_text():
+	registry = MetricsRegistry()
+	requests = registry.counter("requests_total", "Requests served", ("route",))
+	latency = registry.histogram("latency_seconds", "Request latency", buckets=(0.1, 1))
+	registry.gauge("queue_size", "Queued items", (), lambda: {(): 3})
+	requests.inc(route='/a"b')
+	requests.inc(2, route='/a"b')
+	for value in (0.05, 0.5, 5):
+		latency.observe(value)
+
+	assert registry.render().splitlines() == [
+		"# HELP requests_total Requests served",
+		"# TYPE requests_total counter",
+		'requests_total{route="/a\\"b"} 3.0',
+		"# HELP latency_seconds Request latency",
+		"# TYPE latency_seconds histogram",
+		'latency_seconds_bucket{le="0.1"} 1',
+		'latency_seconds_bucket{le="1.0"} 2',
+		'latency_seconds_bucket{le="+Inf"} 3',
+		"latency_seconds_sum 5.55",
+		"latency_seconds_count 3",
+		"# HELP queue_size Queued items",
+		"# TYPE queue_size gauge",
+		"queue_size 3.0",
+	]
+
+
+def test_registry_rejects_duplicates_and_wrong_labels():
+	registry = MetricsRegistry()
+	counter = registry.counter("events_total", "Events", ("kind",))
+	with pytest.raises(ValueError):
+		registry.counter("events_total", "Events again")
+	with pytest.raises(ValueError):
+		counter.inc(other="x")
+
+
+def _detected_tokens(mode: str) -> float:
+	return DETECTED_TOKENS._values.get((mode,), 0)
+
+
+def test_every_detection_path_records_scored_tokens():
+	watermark = DIPWatermark(cipher_version="v2")
+	input_ids = np.random.default_rng(0).integers(0, 50272, size=100)
+	# 整段打分：detect/bulk/stream经由token_quantiles，visualize经由score_sequence
+	before = _detected_tokens("full")
+	watermark.token_quantiles(input_ids)
+	watermark.score_sequence(torch.from_numpy(input_ids))
+	assert _detected_tokens("full") - before == 2 * 99
+	
+	before = _detected_tokens("incremental")
+	DipDetectionSession(watermark, DETECTION_VOCAB_SIZE).update(input_ids)
+	assert _detected_tokens("incremental") - before == 99
+	
+	sequential = DIPWatermark(cipher_version="v2", sequential_detection=True)
+	before = _detected_tokens("sequential")
+	sequential.sequential_test(input_ids)
+	assert _detected_tokens("sequential") - before == 99
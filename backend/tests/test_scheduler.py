@@ -0,0 +1,58 @@
+import time
+from threading import Event
+
+from app.models.scheduler import GenerationScheduler
+
+
+def _recording_runner(calls, name, gate: Event = None):
+	"""记录每个批次的输入，gate未打开前第一次调用阻塞"""
+	def runner(items):
+		calls.append((name, list(items)))
+		if gate is not None:
+			gate.wait(timeout=5)
+		return [f"{name}:{item}" for item in items]
+	return runner
+
+
+def test_requests_of_a_group_are_batched_together():
+	scheduler = GenerationScheduler(max_batch_size=3, max_wait_ms=10_000)
+	calls = []
+	runner = _recording_runner(calls, "a")
+	futures = [scheduler.submit("a", runner, item) for item in range(3)]
+	assert [future.result(timeout=5) for future in futures] == ["a:0", "a:1", "a:2"]
+	assert calls == [("a", [0, 1, 2])]
+	scheduler.stop()
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+	scheduler = GenerationScheduler(max_batch_size=8, max_wait_ms=50)
+	calls = []
+	runner = _recording_runner(calls, "a")
+	start = time.monotonic()
+	futures = [scheduler.submit("a", runner, item) for item in range(2)]
+	assert [future.result(timeout=5) for future in futures] == ["a:0", "a:1"]
+	assert time.monotonic() - start >= 0.05
+	assert calls == [("a", [0, 1])]
+	scheduler.stop()
+
+
+def test_busy_group_does_not_starve_other_groups():
+	scheduler = GenerationScheduler(max_batch_size=2, max_wait_ms=0)
+	calls = []
+	gate = Event()
+	runner_a = _recording_runner(calls, "a", gate)
+	runner_b = _recording_runner(calls, "b")
+	futures = [scheduler.submit("a", runner_a, 1)]
+	# 工作线程阻塞在第一个批次时，a组持续有请求到达，b组的请求排在a组后两个请求之间
+	while not calls:
+		time.sleep(0.001)
+	for group_key, runner, item in [("a", runner_a, 2), ("a", runner_a, 3), ("b", runner_b, 1),
+									("a", runner_a, 4), ("a", runner_a, 5)]:
+		futures.append(scheduler.submit(group_key, runner, item))
+		time.sleep(0.002)
+	gate.set()
+	for future in futures:
+		future.result(timeout=5)
+	# 按最早请求的等待时间轮转：b组的请求早于a组的第4、5个请求
+	assert calls == [("a", [1]), ("a", [2, 3]), ("b", [1]), ("a", [4, 5])]
+	scheduler.stop()
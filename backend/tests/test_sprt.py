@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.watermarks.dip import DIPWatermark
+
+
+def _quantiles(*values) -> np.ndarray:
+    # position 0 has no context and is scored 0
+    return np.array([0, *values], dtype=np.float32)
+
+
+def test_all_green_text_stops_at_the_upper_bound():
+    watermark = DIPWatermark(gamma=0.5, sequential_detection=True)
+    quantiles = _quantiles(*[0.9] * 200)
+    result = watermark.sequential_test(quantiles, quantiles=quantiles)
+    # log(0.99 / 0.01) / log(0.6 / 0.5) green tokens are needed to cross the upper bound
+    assert result["detected"] is True
+    assert result["tokens_consumed"] == 1 + math.ceil(math.log(99) / math.log(1.2))
+    assert result["stopped_early"]
+    assert result["log_likelihood_ratio"] >= math.log(99)
+
+
+def test_all_red_text_stops_at_the_lower_bound():
+    watermark = DIPWatermark(gamma=0.5, sequential_detection=True)
+    quantiles = _quantiles(*[0.1] * 200)
+    result = watermark.sequential_test(quantiles, quantiles=quantiles)
+    assert result["detected"] is False
+    assert result["tokens_consumed"] == 1 + math.ceil(math.log(99) / math.log(0.5 / 0.4))
+    assert result["log_likelihood_ratio"] <= math.log(1 / 99)
+
+
+def test_ignored_positions_neither_move_the_ratio_nor_count_in_the_length():
+    watermark = DIPWatermark(gamma=0.5, sequential_detection=True)
+    plain = watermark.sequential_test(_quantiles(0.9, 0.1, 0.9), quantiles=_quantiles(0.9, 0.1, 0.9))
+    with_ignored = _quantiles(0.9, -1, 0.1, -1, 0.9)
+    result = watermark.sequential_test(with_ignored, quantiles=with_ignored)
+    assert result["log_likelihood_ratio"] == pytest.approx(plain["log_likelihood_ratio"])
+    assert result["confidence"] == pytest.approx(plain["confidence"])
+
+
+def test_undecided_text_falls_back_to_the_z_score():
+    watermark = DIPWatermark(gamma=0.5, sequential_detection=True, z_threshold=0.5)
+    quantiles = _quantiles(*[0.9] * 4)
+    result = watermark.sequential_test(quantiles, quantiles=quantiles)
+    assert not result["stopped_early"]
+    assert result["tokens_consumed"] == result["num_tokens"] == 5
+    # 5 tokens, 4 green: z = (4 - 0.5 * 5) / sqrt(5)
+    assert result["confidence"] == pytest.approx(1.5 / math.sqrt(5))
+    assert result["detected"] is True
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+def test_precomputed_quantiles_match_chunked_scoring(chunk_size):
+    watermark = DIPWatermark(cipher_version="v2", sequential_detection=True, sequential_chunk_size=chunk_size)
+    rng = np.random.default_rng(0)
+    head = rng.integers(0, 50272, size=60)
+    input_ids = np.concatenate([head, head])
+    scored = watermark.sequential_test(input_ids)
+    walked = watermark.sequential_test(input_ids, quantiles=watermark.token_quantiles(input_ids))
+    assert walked == scored
+    # sequential detection with quantiles scores the text once and keeps the test's decision
+    result = watermark._detect_ids(input_ids, keep_quantiles=True)
+    assert {key: result[key] for key in scored} == scored
+    assert len(result["quantiles"]) == len(input_ids)
+
+
+def test_sequential_detection_with_quantiles_scores_the_text_once(monkeypatch):
+    watermark = DIPWatermark(cipher_version="v2", sequential_detection=True)
+    calls = []
+    original = watermark.entropy_skip_mask
+    monkeypatch.setattr(watermark, "entropy_skip_mask", lambda input_ids: calls.append(1) or original(input_ids))
+    watermark._detect_ids(np.arange(100, 300), keep_quantiles=True)
+    assert len(calls) == 1
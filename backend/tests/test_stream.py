@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import torch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import watermark as watermark_endpoint
+from app.models.llm import llm_service
+from app.watermarks import LogitsWatermark, watermark_pool
+
+
+class _Tokenizer:
+	def decode(self, ids, **kwargs):
+		return "t " * len(ids)
+
+
+class _EndlessWatermark(LogitsWatermark):
+	"""不断推送token、直到停止条件成立的水印"""
+
+	def __init__(self):
+		super().__init__()
+		self.stopped = threading.Event()
+
+	def embed(self, prompt, streamer=None, stopping_criteria=None):
+		ids = torch.zeros((1, 1), dtype=torch.long)
+		streamer.put(ids)  # prompt部分，skip_prompt时被跳过
+		while not stopping_criteria(ids, None).all():
+			streamer.put(torch.tensor([1]))
+			self.stopped.wait(0.01)
+		self.stopped.set()
+		streamer.end()
+		return "t"
+
+	def detect(self, text, **kwargs):
+		return {"detected": False, "confidence": 0.0}
+
+	def visualize(self, text):
+		return {}
+
+	def get_processor(self, key):
+		return None
+
+
+class _DisconnectingRequest:
+	"""第一次检查时仍连接，之后即断开"""
+
+	def __init__(self):
+		self.checks = 0
+
+	async def is_disconnected(self):
+		self.checks += 1
+		return self.checks > 1
+
+
+def test_stream_rejects_unknown_params_with_400():
+	app = FastAPI()
+	app.include_router(watermark_endpoint.router)
+	response = TestClient(app).post(
+		"/embed/stream", json={"text": "hi", "algorithm": "dip", "params": {"unknown_param": 1}}
+	)
+	assert response.status_code == 400
+
+
+def test_stream_stops_generation_when_client_disconnects(monkeypatch):
+	fake = _EndlessWatermark()
+	monkeypatch.setattr(watermark_pool, "get", lambda name, **params: fake)
+	monkeypatch.setattr(llm_service, "tokenizer", _Tokenizer())
+
+	async def consume():
+		response = await watermark_endpoint.embed_watermark_stream(
+			watermark_endpoint.WatermarkRequest(text="hi", algorithm="fake"), _DisconnectingRequest()
+		)
+		return [event async for event in response.body_iterator]
+
+	events = asyncio.run(consume())
+	assert len(events) == 1 and events[0].startswith("event: token")
+	# 断开后generate在下一步即结束，而不是一直生成下去
+	assert fake.stopped.wait(5)